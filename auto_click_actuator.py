@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+
+from auto_click_metrics import StageMetrics
+
+try:
+    import win32gui
+    import win32con
+except ImportError:  # 非 Windows 平台只能使用记录型点击
+    win32gui = None
+    win32con = None
+
+
+class ClickSink:
+    """点击执行接口"""
+
+    def activate(self, hwnd):
+        """点击前激活窗口"""
+
+    def click(self, hwnd, x, y, press_enter=False):
+        """在屏幕坐标 (x, y) 点击，可选随后回车"""
+        raise NotImplementedError
+
+
+class PyAutoGuiClickSink(ClickSink):
+    """使用 pyautogui 执行真实点击"""
+
+    def __init__(self, log=None):
+        import pyautogui  # 需要显示环境，延迟导入
+
+        self.pyautogui = pyautogui
+        self.log = log or (lambda message, level="info": None)
+
+    def activate(self, hwnd):
+        self.bring_window_to_front(hwnd)
+
+    def bring_window_to_front(self, hwnd):
+        """将窗口切换到前台"""
+        try:
+            if win32gui.IsIconic(hwnd):
+                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+            win32gui.SetForegroundWindow(hwnd)
+            win32gui.SetActiveWindow(hwnd)
+            time.sleep(0.2)
+        except Exception as e:
+            self.log(f"切换窗口失败: {e}")
+
+    def click(self, hwnd, x, y, press_enter=False):
+        self.pyautogui.moveTo(x, y)
+        self.pyautogui.click()
+        if press_enter:
+            time.sleep(0.05)
+            self.pyautogui.press("enter")
+            self.log("已在点击后发送回车", "debug")
+
+
+class RecordingClickSink(ClickSink):
+    """只记录点击而不操作鼠标，用于测试与压测"""
+
+    def __init__(self):
+        self.activations = []
+        self.clicks = []  # [(timestamp, hwnd, x, y, press_enter), ...]
+
+    def activate(self, hwnd):
+        self.activations.append(hwnd)
+
+    def click(self, hwnd, x, y, press_enter=False):
+        self.clicks.append((time.time(), hwnd, x, y, press_enter))
+
+
+class AsyncActuator:
+    """点击执行线程：检测结果进入队列，由单独线程依次激活窗口并点击
+
+    只有刚被点击的窗口进入冷却期，其他窗口的检测不受点击和等待影响。
+    """
+
+    def __init__(self, sink, get_rect, log=None, cooldown=1.0, metrics=None):
+        self.sink = sink
+        self.get_rect = get_rect
+        self.log = log or (lambda message, level="info": None)
+        self.metrics = metrics or StageMetrics()
+        self.cooldown = cooldown
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()  # 已入队或正在点击的窗口
+        self._cooldown_until = {}  # hwnd -> 冷却结束时间
+        self._thread = None
+        self._running = False
+
+        # 统计
+        self.executed = 0
+        self.clicks = 0  # 实际完成的点击次数（一次提交可包含多处点击）
+        self.dropped = 0  # 停止时仍在队列中、未执行的提交
+        self.max_depth = 0
+        self.action_time = 0.0  # 激活加点击的总耗时
+        self.delay_time = 0.0  # 从检测到点击完成的总耗时
+        self.last_delay = 0.0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="actuator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        with self._lock:
+            self._pending.clear()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self.dropped += 1
+
+    def is_busy(self, hwnd):
+        """窗口有待执行的点击或仍在冷却期内"""
+        with self._lock:
+            if hwnd in self._pending:
+                return True
+            return time.perf_counter() < self._cooldown_until.get(hwnd, 0.0)
+
+    def submit(self, hwnd, points, press_enter=False, detected_at=None):
+        """提交一帧中的点击（窗口内坐标 [(x, y), ...]）；窗口忙时忽略并返回 False
+
+        激活窗口一次后依次点击所有位置。
+        """
+        with self._lock:
+            if hwnd in self._pending:
+                return False
+            self._pending.add(hwnd)
+        detected_at = detected_at if detected_at is not None else time.perf_counter()
+        self.queue.put((hwnd, points, press_enter, detected_at))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _run(self):
+        while self._running:
+            try:
+                hwnd, points, press_enter, detected_at = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            clicked = 0
+            try:
+                with self.metrics.time("activate", hwnd):
+                    self.sink.activate(hwnd)
+                rect = self.get_rect(hwnd)
+                for x, y in points:
+                    screen_x = rect[0] + x
+                    screen_y = rect[1] + y
+                    with self.metrics.time("click", hwnd):
+                        self.sink.click(hwnd, screen_x, screen_y, press_enter)
+                    clicked += 1
+                    self.log(f"点击位置: ({screen_x}, {screen_y})")
+            except Exception as e:
+                self.log(f"点击失败: {e}")
+            finished = time.perf_counter()
+            with self._lock:
+                self._pending.discard(hwnd)
+                self._cooldown_until[hwnd] = finished + self.cooldown
+                self.executed += 1
+                self.clicks += clicked
+                self.action_time += finished - start
+                self.last_delay = finished - detected_at
+                self.delay_time += self.last_delay
+
+    def stats(self):
+        with self._lock:
+            executed = self.executed
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+                "executed": executed,
+                "clicks": self.clicks,
+                "dropped": self.dropped,
+                "avg_action_ms": self.action_time / executed * 1000 if executed else 0.0,
+                "avg_delay_ms": self.delay_time / executed * 1000 if executed else 0.0,
+                "last_delay_ms": self.last_delay * 1000,
+            }
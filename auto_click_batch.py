@@ -0,0 +1,242 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from auto_click_capture import convert_frame
+from auto_click_matching import SharedSpectrumMatcher, best_match
+from auto_click_session import SessionReplaySource
+from auto_click_templates import TemplateStore
+
+
+class BatchResult:
+    """批量匹配结果
+
+    scores[i, j] 为第 i 帧中模板 j 的最高分（模板大于画面时为 -1），
+    locations[i, j] 为对应的左上角坐标 (x, y)（画面坐标），
+    centers[i, j] 为命中位置的中心（窗口坐标，与 find_template 的返回值一致）。
+    """
+
+    def __init__(self, names, scores, locations, centers):
+        self.names = names
+        self.scores = scores
+        self.locations = locations
+        self.centers = centers
+
+    def __len__(self):
+        return len(self.scores)
+
+    def hits(self, threshold):
+        """(帧数, 模板数) 的布尔矩阵；threshold 可为单个值或每个模板一个值"""
+        return self.scores >= np.asarray(threshold, dtype=np.float32)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            names=np.array(self.names),
+            scores=self.scores,
+            locations=self.locations,
+            centers=self.centers,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                [str(name) for name in data["names"]],
+                data["scores"],
+                data["locations"],
+                data["centers"],
+            )
+
+
+class BatchMatcher:
+    """对大量画面批量匹配一组模板，用于离线调参和回归检查
+
+    画面按 chunk_size 分块交给线程池（OpenCV 匹配时释放 GIL，可利用多核）。
+    与逐次调用 find_template 相比，模板只查找和预处理一次，不做 ROI 与
+    文件变化检查；mode 为 'fft' 时每帧只做一次 DFT，所有模板共享画面频谱。
+    """
+
+    def __init__(
+        self,
+        templates,
+        template_store=None,
+        gray=False,
+        scale=1.0,
+        mode="full",
+        chunk_size=16,
+        workers=None,
+    ):
+        self.template_store = template_store or TemplateStore()
+        self.gray = gray
+        self.scale = scale
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self._local = threading.local()
+
+        self.names = []
+        # [({是否灰度: 预处理后的模板}, 文件路径, mtime, 半宽, 半高), ...]
+        # 彩色与灰度模板都预先生成：gray 为 False 时画面也可能是单通道，按帧选择
+        self._templates = []
+        for template in templates:
+            path = template["path"] if isinstance(template, dict) else template
+            entry = self.template_store.get(path)
+            if entry is None:
+                raise ValueError(f"无法加载模板: {path}")
+            self.names.append(template.get("name", path) if isinstance(template, dict) else path)
+            self._templates.append(
+                (
+                    {False: entry.variant(False, scale), True: entry.variant(True, scale)},
+                    entry.path,
+                    entry.mtime,
+                    entry.width // 2,
+                    entry.height // 2,
+                )
+            )
+
+    def _matcher(self):
+        matcher = getattr(self._local, "matcher", None)
+        if matcher is None:
+            matcher = SharedSpectrumMatcher(template_count=len(self._templates))
+            self._local.matcher = matcher
+        return matcher
+
+    def _match_chunk(self, frames):
+        """匹配一块画面，返回 (scores, locations)"""
+        count = len(self._templates)
+        scores = np.full((len(frames), count), -1.0, dtype=np.float32)
+        locations = np.full((len(frames), count, 2), -1, dtype=np.int32)
+        matcher = self._matcher() if self.mode == "fft" else None
+        for i, frame in enumerate(frames):
+            screen = convert_frame(frame, self.gray, self.scale)
+            screen_h, screen_w = screen.shape[:2]
+            gray = screen.ndim == 2
+            for j, (variants, path, mtime, _, _) in enumerate(self._templates):
+                template = variants[gray]
+                key = (path, mtime, gray, self.scale)
+                if template.shape[0] > screen_h or template.shape[1] > screen_w:
+                    continue
+                if matcher is not None:
+                    # 同一帧的各模板共用画面频谱
+                    max_val, max_loc = matcher.match(screen, template, key, frame=i)
+                else:
+                    max_val, max_loc = best_match(screen, template)
+                scores[i, j] = max_val
+                locations[i, j] = max_loc
+            if matcher is not None:
+                matcher.release()
+        return scores, locations
+
+    def _chunks(self, frames):
+        if isinstance(frames, np.ndarray):
+            for start in range(0, len(frames), self.chunk_size):
+                yield frames[start : start + self.chunk_size]
+            return
+        chunk = []
+        for frame in frames:
+            chunk.append(frame)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def match(self, frames):
+        """匹配一组画面，返回 BatchResult
+
+        frames 为 (N, H, W) 或 (N, H, W, 3) 数组，或逐帧产生画面的可迭代对象
+        （如 SessionReplaySource.iter_frames()）。与 find_template 一致，单通道画面
+        与灰度模板匹配，彩色画面与 BGR 模板匹配。同时处理的块数不超过线程数的两倍，
+        迭代器中的画面不会被一次性全部读入内存。
+        """
+        results = []
+        if self.workers <= 1:
+            results = [self._match_chunk(chunk) for chunk in self._chunks(frames)]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="batch"
+            ) as executor:
+                pending = []
+                for chunk in self._chunks(frames):
+                    pending.append(executor.submit(self._match_chunk, chunk))
+                    if len(pending) >= self.workers * 2:
+                        results.append(pending.pop(0).result())
+                results.extend(future.result() for future in pending)
+
+        count = len(self._templates)
+        if results:
+            scores = np.concatenate([scores for scores, _ in results])
+            locations = np.concatenate([locations for _, locations in results])
+        else:
+            scores = np.zeros((0, count), dtype=np.float32)
+            locations = np.zeros((0, count, 2), dtype=np.int32)
+
+        # 中心坐标换算为窗口坐标
+        half = np.array([[w, h] for *_, w, h in self._templates], dtype=np.int32)
+        centers = np.rint(locations / self.scale).astype(np.int32) + half
+        centers[scores < 0] = -1
+        return BatchResult(self.names, scores, locations, centers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量匹配录制的会话或图像，输出分数矩阵")
+    parser.add_argument("--session", help="会话录制文件 (.acs)")
+    parser.add_argument("--images", nargs="+", help="图像文件")
+    parser.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    parser.add_argument("--mode", choices=["full", "fft"], default="full")
+    parser.add_argument("--fast", action="store_true", help="快速模式（灰度）")
+    parser.add_argument("--fast-scale", type=float, default=1.0)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, help="线程数，默认为 CPU 核数")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--output", help="将分数矩阵保存为 .npz")
+    args = parser.parse_args()
+
+    if not args.session and not args.images:
+        parser.error("需要 --session 或 --images")
+
+    matcher = BatchMatcher(
+        args.templates,
+        gray=args.fast,
+        scale=args.fast_scale if args.fast else 1.0,
+        mode=args.mode,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    source = None
+    if args.session:
+        source = SessionReplaySource(args.session, loop=False)
+        frames = (frame for _, frame in source.iter_frames())
+    else:
+        frames = (cv2.imread(path) for path in args.images)
+
+    start = time.perf_counter()
+    result = matcher.match(frames)
+    elapsed = time.perf_counter() - start
+    if source is not None:
+        source.close()
+
+    print(
+        f"{len(result)} 帧 x {len(result.names)} 个模板, 耗时 {elapsed:.2f}s, "
+        f"每秒 {len(result) / elapsed if elapsed else 0.0:.1f} 帧"
+    )
+    hits = result.hits(args.threshold)
+    for j, name in enumerate(result.names):
+        column = result.scores[:, j]
+        print(
+            f"  {name}: 命中 {int(hits[:, j].sum())} 帧, "
+            f"最高分 {column.max() if len(column) else 0.0:.3f}"
+        )
+    if args.output:
+        result.save(args.output)
+        print(f"已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from auto_click_batch import BatchMatcher
+from auto_click_capture import FakeBitmapProvider, PooledCaptureSource, convert_frame
+from auto_click_engine import DetectionEngine
+from auto_click_matching import SharedSpectrumMatcher, best_match
+from auto_click_session import SessionReplaySource
+from auto_click_templates import TemplateStore
+
+
+def ui_background(width, height, rng):
+    """生成类似界面的背景：纯色块加文字"""
+    frame = np.full((height, width, 3), 30, dtype=np.uint8)
+    for _ in range(30):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(20, width // 3)), int(rng.integers(10, height // 3))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+    for _ in range(60):
+        text = "".join(chr(c) for c in rng.integers(65, 122, 20))
+        origin = (int(rng.integers(0, width - 100)), int(rng.integers(15, height)))
+        cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (220, 220, 220), 1)
+    return frame
+
+
+def synthetic_frames(templates, width, height, count, hit_ratio=0.7, seed=0):
+    """生成带已知目标的画面，返回 [(frame, (模板序号, 中心x, 中心y) 或 None), ...]"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = ui_background(width, height, rng)
+        planted = None
+        if templates and rng.random() < hit_ratio:
+            index = int(rng.integers(len(templates)))
+            h, w = templates[index].shape[:2]
+            x = int(rng.integers(0, width - w + 1))
+            y = int(rng.integers(0, height - h + 1))
+            frame[y : y + h, x : x + w] = templates[index]
+            planted = (index, x + w // 2, y + h // 2)
+        frames.append((frame, planted))
+    return frames
+
+
+def evaluate(engine, frames, template_paths, threshold, gray=False, scale=1.0):
+    """对每帧匹配全部模板，返回吞吐量与准确率统计"""
+    detected = 0
+    planted_count = 0
+    false_positives = 0
+    errors = []
+    elapsed = 0.0
+    for frame, planted in frames:
+        screen = convert_frame(frame, gray, scale)
+        start = time.perf_counter()
+        results = [
+            engine.find_template(screen, path, threshold, scale=scale)
+            for path in template_paths
+        ]
+        elapsed += time.perf_counter() - start
+        if planted is not None:
+            planted_count += 1
+        for index, (found, x, y) in enumerate(results):
+            if planted is not None and planted[0] == index:
+                if found:
+                    detected += 1
+                    errors.append(max(abs(x - planted[1]), abs(y - planted[2])))
+            elif found:
+                false_positives += 1
+    return {
+        "fps": len(frames) / elapsed if elapsed else 0.0,
+        "ms_per_frame": elapsed / len(frames) * 1000 if frames else 0.0,
+        "recall": detected / planted_count if planted_count else 1.0,
+        "false_positives": false_positives,
+        "max_error_px": max(errors) if errors else 0,
+        "mean_error_px": float(np.mean(errors)) if errors else 0.0,
+    }
+
+
+def bench_fast_mode(args):
+    """比较 BGR 路径与快速模式（灰度、可选缩小）的吞吐量和准确率"""
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    engine = DetectionEngine(None, None, log=lambda message, level="info": None)
+    templates = [cv2.imread(path) for path in args.templates]
+    frames = synthetic_frames(templates, width, height, args.frames, seed=args.seed)
+
+    modes = [("bgr", False, 1.0), ("gray", True, 1.0)]
+    for scale in args.scales:
+        modes.append((f"gray@{scale}", True, scale))
+
+    print(f"画面 {width}x{height}, {args.frames} 帧, {len(templates)} 个模板")
+    for name, gray, scale in modes:
+        stats = evaluate(engine, frames, args.templates, args.threshold, gray, scale)
+        print(
+            f"{name:>10}: {stats['fps']:7.2f} 帧/秒 ({stats['ms_per_frame']:.1f} ms), "
+            f"召回率 {stats['recall']:.1%}, 误检 {stats['false_positives']}, "
+            f"坐标误差 平均 {stats['mean_error_px']:.2f}px / 最大 {stats['max_error_px']}px"
+        )
+
+
+def template_variants(templates, count):
+    """由已有模板缩放出 count 个不同尺寸的模板"""
+    variants = []
+    factor = 1.0
+    while len(variants) < count:
+        for template in templates:
+            if len(variants) == count:
+                break
+            variants.append(cv2.resize(template, None, fx=factor, fy=factor))
+        factor += 0.1
+    return variants
+
+
+def bench_template_count(args):
+    """比较逐个 matchTemplate 与共享频谱匹配在不同模板数量下的单帧耗时"""
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    base = [cv2.imread(path) for path in args.templates]
+    frames = [frame for frame, _ in synthetic_frames(base, width, height, args.frames)]
+    if args.gray:
+        frames = [convert_frame(frame, gray=True) for frame in frames]
+        base = [convert_frame(template, gray=True) for template in base]
+
+    print(f"画面 {width}x{height}, {'灰度' if args.gray else 'BGR'}, {args.frames} 帧")
+    for count in args.counts:
+        templates = template_variants(base, count)
+        keys = list(range(count))
+        matcher = SharedSpectrumMatcher()
+        matcher.match_all(frames[0], templates, keys)  # 预热模板频谱缓存
+
+        start = time.perf_counter()
+        for frame in frames:
+            for template in templates:
+                best_match(frame, template)
+        full_ms = (time.perf_counter() - start) / len(frames) * 1000
+
+        start = time.perf_counter()
+        for frame in frames:
+            matcher.match_all(frame, templates, keys)
+        fft_ms = (time.perf_counter() - start) / len(frames) * 1000
+
+        print(
+            f"{count:3d} 个模板: 逐个匹配 {full_ms:8.1f} ms/帧, "
+            f"共享频谱 {fft_ms:8.1f} ms/帧 ({full_ms / fft_ms:.2f}x)"
+        )
+
+
+def legacy_capture(bgrx_bits, width, height):
+    """原截图路径：位图字节 -> PIL -> ndarray -> cvtColor，每步一次整帧分配"""
+    img = Image.frombuffer("RGB", (width, height), bgrx_bits, "raw", "BGRX", 0, 1)
+    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+
+
+def bench_capture(args):
+    """比较原截图转换路径与复用缓冲区路径的耗时、分配次数和复制字节数"""
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    rng = np.random.default_rng(args.seed)
+    frame = ui_background(width, height, rng)
+    provider = FakeBitmapProvider({hwnd: frame for hwnd in range(1, args.windows + 1)})
+    frame_count = args.frames * args.windows
+
+    # 原路径：GetBitmapBits 返回新的字节串，随后 PIL 解码、转为数组、转换颜色
+    source = PooledCaptureSource(provider)
+    bgrx = source.pool.bgrx(1, width, height)
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        provider.render(1)
+        legacy_capture(bgrx.tobytes(), width, height)
+    legacy_ms = (time.perf_counter() - start) / frame_count * 1000
+    legacy_bytes = width * height * (4 + 3 + 3 + 3)
+    source.close()
+
+    source = PooledCaptureSource(provider)
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        for hwnd in provider.frames:
+            source.capture(hwnd, gray=args.gray)
+    pooled_ms = (time.perf_counter() - start) / frame_count * 1000
+    stats = source.stats()
+
+    print(f"画面 {width}x{height}, {args.windows} 个窗口, 每窗口 {args.frames} 帧")
+    print(
+        f"  原路径: {legacy_ms:7.2f} ms/帧, 每帧分配 4 次, "
+        f"每帧复制 {legacy_bytes / 1048576:.2f} MB"
+    )
+    print(
+        f"复用缓冲: {pooled_ms:7.2f} ms/帧, 共分配 {stats['allocations']} 次 "
+        f"({stats['allocated_bytes'] / 1048576:.1f} MB), "
+        f"每帧复制 {stats['bytes_copied_per_frame'] / 1048576:.2f} MB"
+    )
+
+
+def bench_pack(args):
+    """比较逐个解码模板图像与从模板包载入的启动耗时（含金字塔预处理）"""
+    base = [cv2.imread(path) for path in args.templates]
+    base = [image for image in base if image is not None]
+    directory = tempfile.mkdtemp(prefix="auto_click_pack_")
+    try:
+        templates = []
+        for i, image in enumerate(template_variants(base, args.count)):
+            path = os.path.join(directory, f"template_{i}.png")
+            cv2.imwrite(path, image)
+            templates.append({"name": path, "path": path})
+        pack_path = os.path.join(directory, "templates.pack")
+
+        def prepare(store):
+            store.sync(templates)
+            for template in templates:
+                entry = store.get(template["path"])
+                entry.pyramid(args.pyramid_scale, args.pyramid_levels)
+                entry.pyramid(args.pyramid_scale, args.pyramid_levels, gray=True)
+            return store
+
+        start = time.perf_counter()
+        store = prepare(TemplateStore())
+        decode_ms = (time.perf_counter() - start) * 1000
+        size = store.save_pack(pack_path, args.pyramid_scale, args.pyramid_levels)
+
+        start = time.perf_counter()
+        store = TemplateStore()
+        store.load_pack(pack_path, args.pyramid_scale, args.pyramid_levels)
+        prepare(store)
+        pack_ms = (time.perf_counter() - start) * 1000
+        stats = store.stats()
+
+        print(f"{len(templates)} 个模板, 模板包 {size / 1048576:.1f} MB")
+        print(f"逐个解码: {decode_ms:8.1f} ms")
+        print(
+            f"  模板包: {pack_ms:8.1f} ms (载入 {stats['pack_loaded']} 个, "
+            f"重新解码 {stats['misses']} 个), 加速 {decode_ms / pack_ms:.1f}x"
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_batch(args):
+    """比较逐帧调用 find_template 与 BatchMatcher 批量匹配一组画面的吞吐量"""
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    base = [cv2.imread(path) for path in args.templates]
+    frames = np.stack(
+        [frame for frame, _ in synthetic_frames(base, width, height, args.frames, seed=args.seed)]
+    )
+    engine = DetectionEngine(None, None, log=lambda message, level="info": None)
+
+    start = time.perf_counter()
+    for frame in frames:
+        for path in args.templates:
+            engine.find_template(frame, path, args.threshold)
+    loop_s = time.perf_counter() - start
+    print(f"{len(frames)} 帧 {width}x{height}, {len(args.templates)} 个模板")
+    print(f"  逐帧循环: {len(frames) / loop_s:7.2f} 帧/秒")
+
+    for mode in ("full", "fft"):
+        matcher = BatchMatcher(
+            args.templates, mode=mode, chunk_size=args.chunk_size, workers=args.workers
+        )
+        start = time.perf_counter()
+        result = matcher.match(frames)
+        batch_s = time.perf_counter() - start
+        print(
+            f"  批量 {mode:>4}: {len(result) / batch_s:7.2f} 帧/秒 "
+            f"({loop_s / batch_s:.2f}x, 线程 {matcher.workers})"
+        )
+
+
+# 基准套件中的匹配模式：名称 -> (match_mode, fast_mode)
+SUITE_MODES = {
+    "full": ("full", False),
+    "pyramid": ("pyramid", False),
+    "fft": ("fft", False),
+    "fast": ("full", True),
+    "fast-fft": ("fft", True),
+}
+
+
+def session_frames(directory):
+    """读取目录中所有会话录制文件的画面，返回 {文件名: [BGR 画面, ...]}"""
+    sessions = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.acs"))):
+        source = SessionReplaySource(path, loop=False)
+        frames = []
+        for hwnd in source.hwnds:
+            while True:
+                frame = source.capture(hwnd)
+                if frame is None:
+                    break
+                frames.append(np.array(frame))
+        source.close()
+        if frames:
+            sessions[os.path.basename(path)] = frames
+    return sessions
+
+
+def run_suite_case(frames, template_paths, mode, planted=None):
+    """用检测引擎逐帧截图（复用缓冲区转换）并匹配全部模板，返回统计结果"""
+    provider = FakeBitmapProvider({1: frames[0]})
+    source = PooledCaptureSource(provider)
+    engine = DetectionEngine(source, None, log=lambda message, level="info": None)
+    engine.templates = [{"name": os.path.basename(p), "path": p} for p in template_paths]
+    engine.match_mode, engine.fast_mode = SUITE_MODES[mode]
+    engine.template_store.sync(engine.templates)
+
+    def scan(frame):
+        provider.set_frame(1, frame)
+        start = time.perf_counter()
+        hit = engine.scan_window(1, "bench")
+        return time.perf_counter() - start, hit
+
+    scan(frames[0])  # 预热：模板变体、金字塔和频谱缓存
+    engine.frame_tracker.forget(1)
+
+    latencies = []
+    detected = 0
+    for index, frame in enumerate(frames):
+        engine.frame_tracker.forget(1)  # 每帧都按全新画面计时
+        elapsed, hit = scan(frame)
+        latencies.append(elapsed)
+        if planted is not None and planted[index] is not None and hit is not None:
+            detected += hit[0]["path"] == template_paths[planted[index][0]]
+
+    capture_times = []
+    for frame in frames:
+        provider.set_frame(1, frame)
+        start = time.perf_counter()
+        source.capture(1, gray=engine.fast_mode)
+        capture_times.append(time.perf_counter() - start)
+
+    # 内存峰值单独测量，避免 tracemalloc 影响计时。tracemalloc 只跟踪经 Python
+    # 分配器的内存（含 numpy 数组），不含 OpenCV 内部分配的缓冲区；进程整体峰值见 max_rss_mb
+    tracemalloc.start()
+    for frame in frames[:3]:
+        engine.frame_tracker.forget(1)
+        scan(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    planted_count = sum(p is not None for p in planted) if planted is not None else 0
+    return {
+        "fps": len(latencies) / sum(latencies),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "capture_p50_ms": float(np.percentile(capture_times, 50) * 1000),
+        "py_peak_mb": peak / 1048576,
+        "recall": detected / planted_count if planted_count else None,
+    }
+
+
+def suite_key(result):
+    return (result["frames"], result["templates"], result["template_scale"], result["mode"])
+
+
+def compare_results(results, baseline_path, max_regression, max_recall_drop=0.0):
+    """与基线结果比较，返回退化项 [(结果, 基线, 指标, 变化), ...]
+
+    p50/p99 延迟按相对增幅与 max_regression 比较；召回率按绝对降幅与
+    max_recall_drop 比较（变化为负数）。基线中没有的指标不比较。
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {suite_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(suite_key(result))
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if old.get(metric):
+                change = result[metric] / old[metric] - 1
+                if change > max_regression:
+                    regressions.append((result, old, metric, change))
+        if old.get("recall") is not None and result["recall"] is not None:
+            change = result["recall"] - old["recall"]
+            if -change > max_recall_drop:
+                regressions.append((result, old, "recall", change))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def peak_rss_mb():
+    """进程内存峰值（MB），无法获取时返回 None"""
+    if sys.platform != "win32":
+        import resource  # 仅 Unix 提供
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 为单位，macOS 以字节为单位
+        return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().peak_wset / 1048576
+
+
+def bench_suite(args):
+    """扫描画面尺寸、模板数量、模板尺寸和匹配模式，输出吞吐量、延迟分位数与内存峰值"""
+    base = [cv2.imread(path) for path in args.templates]
+    workdir = tempfile.mkdtemp(prefix="auto_click_bench_")
+    results = []
+
+    cases = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        cases.append((size, width, height, None))
+    if args.sessions:
+        for name, frames in session_frames(args.sessions).items():
+            cases.append((f"session:{name}", None, None, frames[: args.frames]))
+
+    print(f"{'画面':>22} {'模板':>4} {'尺寸':>5} {'模式':>9} {'帧/秒':>8} {'p50':>9} {'p99':>9} {'截图':>7} {'Py内存':>8} {'召回':>6}")
+    for count in args.counts:
+        for template_scale in args.template_scales:
+            templates = [
+                cv2.resize(t, None, fx=template_scale, fy=template_scale)
+                for t in template_variants(base, count)
+            ]
+            paths = []
+            for index, template in enumerate(templates):
+                path = os.path.join(workdir, f"t{count}_{template_scale}_{index}.png")
+                cv2.imwrite(path, template)
+                paths.append(path)
+
+            for name, width, height, frames in cases:
+                planted = None
+                if frames is None:
+                    generated = synthetic_frames(templates, width, height, args.frames, seed=args.seed)
+                    frames = [frame for frame, _ in generated]
+                    planted = [p for _, p in generated]
+                for mode in args.modes:
+                    stats = run_suite_case(frames, paths, mode, planted)
+                    result = {
+                        "frames": name,
+                        "templates": count,
+                        "template_scale": template_scale,
+                        "mode": mode,
+                        **stats,
+                    }
+                    results.append(result)
+                    recall = f"{stats['recall']:.0%}" if stats["recall"] is not None else "-"
+                    print(
+                        f"{name:>22} {count:4d} {template_scale:5.2f} {mode:>9} "
+                        f"{stats['fps']:8.2f} {stats['p50_ms']:7.1f}ms {stats['p99_ms']:7.1f}ms "
+                        f"{stats['capture_p50_ms']:5.1f}ms {stats['py_peak_mb']:6.1f}MB {recall:>6}"
+                    )
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "max_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if args.baseline:
+        regressions = compare_results(
+            results, args.baseline, args.max_regression, args.max_recall_drop
+        )
+        for result, old, metric, change in regressions:
+            if metric == "recall":
+                detail = f"召回率 {old['recall']:.0%} -> {result['recall']:.0%}"
+            else:
+                detail = (
+                    f"{metric[:-3]} {old[metric]:.1f} -> {result[metric]:.1f} ms (+{change:.0%})"
+                )
+            print(
+                f"性能退化: {result['frames']} {result['templates']} 个模板 "
+                f"x{result['template_scale']} {result['mode']}: {detail}"
+            )
+        if regressions:
+            sys.exit(1)
+        print(
+            f"与基线 {args.baseline} 相比延迟无超过 {args.max_regression:.0%} 的退化，"
+            f"召回率无超过 {args.max_recall_drop:.0%} 的下降"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测热路径基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fast = subparsers.add_parser("fast-mode", help="BGR 与快速模式对比")
+    fast.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    fast.add_argument("--size", default="1920x1080")
+    fast.add_argument("--frames", type=int, default=20)
+    fast.add_argument("--threshold", type=float, default=0.8)
+    fast.add_argument("--scales", type=float, nargs="*", default=[0.5])
+    fast.add_argument("--seed", type=int, default=0)
+    fast.set_defaults(func=bench_fast_mode)
+
+    count = subparsers.add_parser("templates", help="模板数量与共享频谱匹配")
+    count.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    count.add_argument("--size", default="1920x1080")
+    count.add_argument("--frames", type=int, default=3)
+    count.add_argument("--counts", type=int, nargs="+", default=[1, 5, 10, 20])
+    count.add_argument("--gray", action="store_true")
+    count.set_defaults(func=bench_template_count)
+
+    capture = subparsers.add_parser("capture", help="截图缓冲区复用")
+    capture.add_argument("--size", default="1920x1080")
+    capture.add_argument("--windows", type=int, default=4)
+    capture.add_argument("--frames", type=int, default=50)
+    capture.add_argument("--gray", action="store_true")
+    capture.add_argument("--seed", type=int, default=0)
+    capture.set_defaults(func=bench_capture)
+
+    pack = subparsers.add_parser("pack", help="模板包与逐个解码的启动耗时")
+    pack.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    pack.add_argument("--count", type=int, default=200)
+    pack.add_argument("--pyramid-scale", type=float, default=0.5)
+    pack.add_argument("--pyramid-levels", type=int, default=1)
+    pack.set_defaults(func=bench_pack)
+
+    batch = subparsers.add_parser("batch", help="逐帧循环与批量匹配对比")
+    batch.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    batch.add_argument("--size", default="1920x1080")
+    batch.add_argument("--frames", type=int, default=32)
+    batch.add_argument("--threshold", type=float, default=0.8)
+    batch.add_argument("--chunk-size", type=int, default=16)
+    batch.add_argument("--workers", type=int)
+    batch.add_argument("--seed", type=int, default=0)
+    batch.set_defaults(func=bench_batch)
+
+    suite = subparsers.add_parser("suite", help="检测热路径完整基准套件")
+    suite.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    suite.add_argument(
+        "--sizes", nargs="+", default=["1920x1080", "2560x1440", "3840x2160", "5120x2880"]
+    )
+    suite.add_argument("--counts", type=int, nargs="+", default=[1, 10, 50])
+    suite.add_argument("--template-scales", type=float, nargs="+", default=[1.0])
+    suite.add_argument("--modes", nargs="+", choices=list(SUITE_MODES), default=list(SUITE_MODES))
+    suite.add_argument("--frames", type=int, default=5)
+    suite.add_argument("--sessions", help="包含会话录制文件 (*.acs) 的目录")
+    suite.add_argument("--output", help="保存 JSON 结果的路径")
+    suite.add_argument("--baseline", help="用于比较的 JSON 结果")
+    suite.add_argument(
+        "--max-regression", type=float, default=0.1, help="p50/p99 延迟允许的最大退化比例"
+    )
+    suite.add_argument(
+        "--max-recall-drop", type=float, default=0.0, help="召回率允许的最大下降（绝对值）"
+    )
+    suite.add_argument("--seed", type=int, default=0)
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
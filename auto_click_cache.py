@@ -0,0 +1,373 @@
+import threading
+import zlib
+
+import cv2
+import numpy as np
+
+
+class RoiCache:
+    """记录每个 (hwnd, 模板) 上次命中的位置（窗口内坐标），下次优先在其附近搜索"""
+
+    def __init__(self, padding=20):
+        self.padding = padding
+        self._locations = {}  # (hwnd, template_path) -> 上次命中的左上角坐标
+        self._window_sizes = {}  # hwnd -> (width, height)
+        self._lock = threading.Lock()
+        self.hits = 0  # 在 ROI 内命中
+        self.misses = 0  # ROI 内未命中，需要全图搜索
+        self.invalidations = 0  # 因窗口尺寸变化而丢弃的条目数
+
+    def update_window(self, hwnd, rect):
+        """窗口尺寸变化时丢弃该窗口的所有 ROI"""
+        size = (rect[2] - rect[0], rect[3] - rect[1])
+        with self._lock:
+            previous = self._window_sizes.get(hwnd)
+            self._window_sizes[hwnd] = size
+            if previous is None or previous == size:
+                return
+            for key in [k for k in self._locations if k[0] == hwnd]:
+                del self._locations[key]
+                self.invalidations += 1
+
+    def roi(self, hwnd, template_path, template_w, template_h, screen_w, screen_h):
+        """返回上次命中位置加边距后的区域 (x0, y0, x1, y1)，没有记录时返回 None"""
+        with self._lock:
+            location = self._locations.get((hwnd, template_path))
+        if location is None:
+            return None
+        x, y = location
+        x0 = max(0, x - self.padding)
+        y0 = max(0, y - self.padding)
+        x1 = min(screen_w, x + template_w + self.padding)
+        y1 = min(screen_h, y + template_h + self.padding)
+        if x1 - x0 < template_w or y1 - y0 < template_h:
+            return None
+        return x0, y0, x1, y1
+
+    def record(self, hwnd, template_path, location, in_roi=False):
+        """记录命中位置；in_roi 表示是在 ROI 内直接命中"""
+        with self._lock:
+            self._locations[(hwnd, template_path)] = location
+            if in_roi:
+                self.hits += 1
+
+    def record_miss(self):
+        """ROI 内未命中，将回退到全图搜索"""
+        with self._lock:
+            self.misses += 1
+
+    def clear(self):
+        """匹配参数变化（如切换快速模式）后坐标系不同，清除全部记录"""
+        with self._lock:
+            self._locations.clear()
+
+    def forget(self, hwnd):
+        """窗口不再监控时清除其记录"""
+        with self._lock:
+            for key in [k for k in self._locations if k[0] == hwnd]:
+                del self._locations[key]
+            self._window_sizes.pop(hwnd, None)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._locations),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hit_rate(),
+            }
+
+
+def frame_fingerprint(screen):
+    """画面指纹：尺寸加整帧 CRC32（直接读取数组内存，不复制）"""
+    return screen.shape, zlib.crc32(np.ascontiguousarray(screen))
+
+
+def dirty_tile_regions(previous, screen, tile_size):
+    """按块比较两帧，返回变化块连通区域的外接矩形 [(x0, y0, x1, y1), ...]"""
+    height, width = screen.shape[:2]
+    channels = screen.shape[2] if screen.ndim == 3 else 1
+    # 按 (H, W*C) 视图处理，避免逐像素跨通道归约
+    diff = cv2.absdiff(previous, screen).reshape(height, width * channels)
+    rows = -(-height // tile_size)
+    cols = -(-width // tile_size)
+    tile_w = tile_size * channels
+    padded = np.zeros((rows * tile_size, cols * tile_w), dtype=diff.dtype)
+    padded[:height, : width * channels] = diff
+    row_max = padded.reshape(rows, tile_size, cols * tile_w).max(axis=1)
+    tiles = row_max.reshape(rows, cols, tile_w).max(axis=2)
+    mask = (tiles > 0).astype(np.uint8)
+    if not mask.any():
+        return []
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    regions = []
+    for label in range(1, count):
+        col, row, cols_span, rows_span = stats[label][:4]
+        regions.append(
+            (
+                int(col * tile_size),
+                int(row * tile_size),
+                int(min(width, (col + cols_span) * tile_size)),
+                int(min(height, (row + rows_span) * tile_size)),
+            )
+        )
+    return regions
+
+
+class FrameDelta:
+    """一帧相对上一帧的变化情况"""
+
+    def __init__(self, missed_before, regions):
+        # 上一帧（相同匹配参数下）已确认未命中的模板键
+        self.missed_before = missed_before
+        # None: 需要全图搜索；[]: 画面未变化；否则为变化区域列表
+        self.regions = regions
+        # 本帧未命中的模板键，由调用方填写
+        self.missed = set()
+
+
+class FrameChangeTracker:
+    """记录每个窗口的上一帧，以及在该帧上已确认未命中的模板
+
+    模板在某位置的匹配分数只取决于其覆盖的像素。上一帧未命中的模板，
+    在本帧中只可能在覆盖了变化块的位置命中，因此只需搜索变化区域
+    （按模板尺寸外扩）；画面完全未变化时可直接跳过。
+    阈值或匹配模式变化时重新全图匹配。
+    """
+
+    def __init__(self, tile_size=64, max_dirty_ratio=0.5):
+        self.tile_size = tile_size
+        self.max_dirty_ratio = max_dirty_ratio  # 变化面积超过该比例时直接全图搜索
+        self._states = {}  # hwnd -> [指纹, 匹配参数, 上一帧, 未命中模板键集合]
+        self._lock = threading.Lock()
+        self.frames_checked = 0
+        self.frames_unchanged = 0
+        self.frames_partial = 0  # 只需搜索变化区域的帧
+        self.templates_skipped = 0
+        self.dirty_area = 0.0  # 部分变化帧的变化面积比例之和
+
+    def begin(self, hwnd, screen, params):
+        """开始处理一帧，返回 FrameDelta"""
+        fingerprint = frame_fingerprint(screen)
+        with self._lock:
+            self.frames_checked += 1
+            state = self._states.get(hwnd)
+        if state is None or state[0][0] != fingerprint[0] or state[1] != params:
+            delta = FrameDelta(set(), None)
+        elif state[0] == fingerprint:
+            delta = FrameDelta(state[3], [])
+            with self._lock:
+                self.frames_unchanged += 1
+        else:
+            regions = dirty_tile_regions(state[2], screen, self.tile_size)
+            height, width = screen.shape[:2]
+            ratio = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions) / (
+                width * height
+            )
+            if ratio > self.max_dirty_ratio:
+                delta = FrameDelta(set(), None)
+            else:
+                delta = FrameDelta(state[3], regions)
+                with self._lock:
+                    self.frames_partial += 1
+                    self.dirty_area += ratio
+
+        # 保存本帧，复用上一帧的缓冲区
+        if state is not None and state[2].shape == screen.shape:
+            previous = state[2]
+            if state[0] != fingerprint:
+                np.copyto(previous, screen)
+        else:
+            previous = screen.copy()
+        with self._lock:
+            self._states[hwnd] = [fingerprint, params, previous, delta.missed]
+        return delta
+
+    def skip(self):
+        with self._lock:
+            self.templates_skipped += 1
+
+    def forget(self, hwnd):
+        with self._lock:
+            self._states.pop(hwnd, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames_checked": self.frames_checked,
+                "frames_unchanged": self.frames_unchanged,
+                "frames_partial": self.frames_partial,
+                "templates_skipped": self.templates_skipped,
+                "dirty_area": (
+                    self.dirty_area / self.frames_partial if self.frames_partial else 0.0
+                ),
+            }
+
+
+class TemplateOrder:
+    """按窗口统计各模板的命中情况，命中越频繁的模板越先匹配
+
+    某窗口每命中一次，该窗口所有模板的得分乘以 decay，命中的模板再加 1 - decay，
+    得分近似最近各次命中中该模板所占的比例，工作流程变化后排序会随之调整。
+    sample_after 大于 0 时，在某窗口中从未命中且已匹配 sample_after 次的模板
+    只在该窗口每 sample_every 次检测中尝试一次。
+    """
+
+    def __init__(self, decay=0.8, sample_after=0, sample_every=10):
+        self.decay = decay
+        self.sample_after = sample_after
+        self.sample_every = sample_every
+        self._windows = {}  # hwnd -> {模板路径: [得分, 匹配次数, 命中次数]}
+        self._scans = {}  # hwnd -> 检测次数
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.tries = 0  # 实际执行的模板匹配次数
+        self.hits = 0
+        self.first_hits = 0  # 第一个匹配的模板即命中
+        self.sampled_out = 0  # 因从未命中而跳过的模板次数
+
+    def order(self, hwnd, templates):
+        """返回本次检测的模板顺序：得分高的在前，得分相同时保持配置顺序"""
+        with self._lock:
+            stats = self._windows.setdefault(hwnd, {})
+            scan = self._scans.get(hwnd, 0) + 1
+            self._scans[hwnd] = scan
+            self.scans += 1
+            ranked = []
+            for index, template_info in enumerate(templates):
+                entry = stats.get(template_info["path"])
+                if entry is None:
+                    ranked.append((0.0, index, template_info))
+                    continue
+                if (
+                    self.sample_after > 0
+                    and entry[2] == 0
+                    and entry[1] >= self.sample_after
+                    and (scan + index) % self.sample_every != 0
+                ):
+                    self.sampled_out += 1
+                    continue
+                ranked.append((-entry[0], index, template_info))
+        ranked.sort(key=lambda item: item[:2])
+        return [template_info for _, _, template_info in ranked]
+
+    def record(self, hwnd, template_path, hit, position=0):
+        """记录一次模板匹配；position 为本次检测中该模板之前已匹配的模板数"""
+        with self._lock:
+            stats = self._windows.setdefault(hwnd, {})
+            entry = stats.setdefault(template_path, [0.0, 0, 0])
+            entry[1] += 1
+            self.tries += 1
+            if not hit:
+                return
+            entry[2] += 1
+            for other in stats.values():
+                other[0] *= self.decay
+            entry[0] += 1 - self.decay
+            self.hits += 1
+            if position == 0:
+                self.first_hits += 1
+
+    def window_stats(self, hwnd):
+        """[(模板路径, 得分, 匹配次数, 命中次数), ...]，按得分从高到低"""
+        with self._lock:
+            stats = self._windows.get(hwnd, {})
+            items = [(path, *entry) for path, entry in stats.items()]
+        items.sort(key=lambda item: -item[1])
+        return items
+
+    def forget(self, hwnd):
+        with self._lock:
+            self._windows.pop(hwnd, None)
+            self._scans.pop(hwnd, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scans": self.scans,
+                "tries": self.tries,
+                "hits": self.hits,
+                "first_hit_rate": self.first_hits / self.hits if self.hits else 0.0,
+                "tries_per_scan": self.tries / self.scans if self.scans else 0.0,
+                "sampled_out": self.sampled_out,
+            }
+
+
+class ScaleCache:
+    """按窗口缓存窗口画面相对模板的缩放比例
+
+    窗口尺寸或 DPI 变化后丢弃缓存的比例重新估计；丢弃的比例作为下次估计时首先尝试的比例。
+    """
+
+    def __init__(self):
+        self._states = {}  # hwnd -> [(尺寸, DPI), 缩放比例或 None, 首先尝试的比例]
+        self._lock = threading.Lock()
+        self.estimates = 0
+        self.invalidations = 0
+
+    def update_window(self, hwnd, size, dpi, prefer=None):
+        """记录窗口尺寸与 DPI；变化时丢弃缓存的比例并返回 True
+
+        prefer 为按 DPI 推算的比例，首次估计时优先尝试。DPI 变化时
+        按新旧 DPI 之比换算原来的比例，作为重新估计时首先尝试的比例。
+        """
+        key = (size, dpi)
+        with self._lock:
+            state = self._states.get(hwnd)
+            if state is None or state[0] is None:
+                self._states[hwnd] = [key, state[1] if state else None, prefer]
+                return False
+            if state[0] == key:
+                return False
+            old_dpi = state[0][1]
+            state[0] = key
+            previous = state[1] if state[1] is not None else state[2]
+            if previous is not None and dpi and old_dpi and dpi != old_dpi:
+                previous = previous * dpi / old_dpi
+            state[2] = previous if previous is not None else prefer
+            if state[1] is None:
+                return False
+            state[1] = None
+            self.invalidations += 1
+            return True
+
+    def scale(self, hwnd):
+        """缓存的比例，尚未估计时返回 None"""
+        with self._lock:
+            state = self._states.get(hwnd)
+            return state[1] if state is not None else None
+
+    def prefer(self, hwnd):
+        with self._lock:
+            state = self._states.get(hwnd)
+            return state[2] if state is not None else None
+
+    def set(self, hwnd, scale):
+        with self._lock:
+            state = self._states.setdefault(hwnd, [None, None, None])
+            state[1] = scale
+            self.estimates += 1
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def forget(self, hwnd):
+        with self._lock:
+            self._states.pop(hwnd, None)
+
+    def stats(self):
+        with self._lock:
+            scales = [state[1] for state in self._states.values() if state[1] is not None]
+            return {
+                "windows": len(self._states),
+                "estimated": len(scales),
+                "estimates": self.estimates,
+                "invalidations": self.invalidations,
+            }
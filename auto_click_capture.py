@@ -0,0 +1,768 @@
+import ctypes
+import os
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import win32con
+    import win32gui
+    import win32ui
+    from ctypes import windll
+except ImportError:  # 非 Windows 平台（如 Linux 压测）只能使用文件/合成画面来源
+    win32con = None
+    win32gui = None
+    win32ui = None
+    windll = None
+
+try:
+    import mss
+except ImportError:  # 整屏截取需要 mss
+    mss = None
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+
+def convert_frame(frame, gray=False, scale=1.0):
+    """将 BGR 画面转换为快速模式所需的灰度和/或缩小画面"""
+    if frame is None:
+        return None
+    if gray and frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale != 1.0:
+        height, width = frame.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+class FrameSource:
+    """画面来源接口：按窗口句柄提供标题、位置和截图"""
+
+    def list_windows(self):
+        """列出可用窗口 [(hwnd, title), ...]"""
+        return []
+
+    def get_title(self, hwnd):
+        raise NotImplementedError
+
+    def get_rect(self, hwnd):
+        """返回窗口矩形 (left, top, right, bottom)"""
+        raise NotImplementedError
+
+    def get_dpi(self, hwnd):
+        """返回窗口所在显示器的 DPI，无法获取时返回 None"""
+        return None
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        """截取窗口画面，返回 BGR（gray 时为单通道）数组，失败返回 None
+
+        scale 小于 1 时返回缩小后的画面。
+        """
+        raise NotImplementedError
+
+    def begin_cycle(self):
+        """每轮检测开始时调用，可在此刷新整轮共用的数据"""
+
+    def forget(self, hwnd):
+        """窗口不再监控时释放其资源"""
+
+    def close(self):
+        pass
+
+
+class PrintWindowSource(FrameSource):
+    """基于 Windows PrintWindow API 的窗口截图"""
+
+    def __init__(self, log=None):
+        if win32gui is None:
+            raise RuntimeError("PrintWindow 截图仅支持 Windows")
+        self.log = log or (lambda message, level="info": None)
+
+    def list_windows(self):
+        def enum_windows_proc(hwnd, result_list):
+            if win32gui.IsWindowVisible(hwnd):
+                window_title = win32gui.GetWindowText(hwnd)
+                if window_title:
+                    result_list.append((hwnd, window_title))
+            return True
+
+        windows = []
+        win32gui.EnumWindows(enum_windows_proc, windows)
+        return windows
+
+    def get_title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+    def get_rect(self, hwnd):
+        return win32gui.GetWindowRect(hwnd)
+
+    def get_dpi(self, hwnd):
+        try:
+            return windll.user32.GetDpiForWindow(hwnd) or None
+        except AttributeError:  # Windows 10 1607 之前没有 GetDpiForWindow
+            return None
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        """截取窗口（基础PrintWindow方法）"""
+        try:
+            windll.user32.SetProcessDPIAware()
+
+            # 获取窗口尺寸
+            rect = win32gui.GetWindowRect(hwnd)
+            x, y, x1, y1 = rect
+            width = x1 - x
+            height = y1 - y
+
+            if width <= 0 or height <= 0:
+                return None
+
+            # 执行截图
+            hwndDC = win32gui.GetWindowDC(hwnd)
+            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
+            saveDC = mfcDC.CreateCompatibleDC()
+
+            saveBitMap = win32ui.CreateBitmap()
+            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
+            saveDC.SelectObject(saveBitMap)
+
+            result = windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 3)
+
+            if result and gray:
+                # 快速模式：直接从 BGRX 数据转为单通道，不经过彩色中间结果
+                bmpinfo = saveBitMap.GetInfo()
+                bmpstr = saveBitMap.GetBitmapBits(True)
+                bgrx = np.frombuffer(bmpstr, dtype=np.uint8).reshape(
+                    bmpinfo["bmHeight"], bmpinfo["bmWidth"], 4
+                )
+                img_bgr = convert_frame(
+                    cv2.cvtColor(bgrx, cv2.COLOR_BGRA2GRAY), scale=scale
+                )
+            elif result:
+                bmpinfo = saveBitMap.GetInfo()
+                bmpstr = saveBitMap.GetBitmapBits(True)
+                img = Image.frombuffer(
+                    "RGB",
+                    (bmpinfo["bmWidth"], bmpinfo["bmHeight"]),
+                    bmpstr,
+                    "raw",
+                    "BGRX",
+                    0,
+                    1,
+                )
+                img_np = np.array(img)
+                img_bgr = convert_frame(cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR), scale=scale)
+            else:
+                img_bgr = None
+
+            # 清理资源
+            win32gui.DeleteObject(saveBitMap.GetHandle())
+            saveDC.DeleteDC()
+            mfcDC.DeleteDC()
+            win32gui.ReleaseDC(hwnd, hwndDC)
+
+            return img_bgr
+
+        except Exception as e:
+            self.log(f"截图失败: {e}")
+            return None
+
+
+class BitmapProvider:
+    """窗口位图接口：在调用方持有的 (H, W, 4) BGRX 缓冲区上绘制窗口内容"""
+
+    def allocate(self, hwnd, width, height):
+        """为窗口分配绘制缓冲区，返回 (height, width, 4) 的 uint8 数组"""
+        raise NotImplementedError
+
+    def render(self, hwnd):
+        """将窗口当前内容绘制到已分配的缓冲区，成功返回 True"""
+        raise NotImplementedError
+
+    def release(self, hwnd=None):
+        """释放窗口（hwnd 为 None 时为全部窗口）的绘制资源"""
+
+
+class _BitmapInfoHeader(ctypes.Structure):
+    _fields_ = [
+        ("biSize", ctypes.c_uint32),
+        ("biWidth", ctypes.c_int32),
+        ("biHeight", ctypes.c_int32),
+        ("biPlanes", ctypes.c_uint16),
+        ("biBitCount", ctypes.c_uint16),
+        ("biCompression", ctypes.c_uint32),
+        ("biSizeImage", ctypes.c_uint32),
+        ("biXPelsPerMeter", ctypes.c_int32),
+        ("biYPelsPerMeter", ctypes.c_int32),
+        ("biClrUsed", ctypes.c_uint32),
+        ("biClrImportant", ctypes.c_uint32),
+    ]
+
+
+class DibSectionProvider(PrintWindowSource, BitmapProvider):
+    """PrintWindow 直接绘制到每个窗口常驻的 DIB 位图，位图内存即为返回的数组
+
+    位图只在窗口尺寸变化时重建，不再经过 GetBitmapBits 和 PIL 复制。
+    """
+
+    def __init__(self, log=None):
+        super().__init__(log=log)
+        self._dibs = {}  # hwnd -> (窗口 DC, 内存 DC, 位图, 原位图)
+
+    def allocate(self, hwnd, width, height):
+        self.release(hwnd)
+        windll.user32.SetProcessDPIAware()
+        header = _BitmapInfoHeader()
+        header.biSize = ctypes.sizeof(_BitmapInfoHeader)
+        header.biWidth = width
+        header.biHeight = -height  # 负高度：自上而下的行顺序，与数组一致
+        header.biPlanes = 1
+        header.biBitCount = 32
+        header.biCompression = 0  # BI_RGB
+
+        gdi32 = windll.gdi32
+        gdi32.CreateDIBSection.restype = ctypes.c_void_p
+        gdi32.CreateCompatibleDC.restype = ctypes.c_void_p
+        gdi32.SelectObject.restype = ctypes.c_void_p
+        window_dc = win32gui.GetWindowDC(hwnd)
+        memory_dc = gdi32.CreateCompatibleDC(ctypes.c_void_p(window_dc))
+        bits = ctypes.c_void_p()
+        bitmap = gdi32.CreateDIBSection(
+            ctypes.c_void_p(memory_dc),
+            ctypes.byref(header),
+            0,  # DIB_RGB_COLORS
+            ctypes.byref(bits),
+            None,
+            0,
+        )
+        if not bitmap or not bits.value:
+            gdi32.DeleteDC(ctypes.c_void_p(memory_dc))
+            win32gui.ReleaseDC(hwnd, window_dc)
+            raise OSError("CreateDIBSection 失败")
+        previous = gdi32.SelectObject(ctypes.c_void_p(memory_dc), ctypes.c_void_p(bitmap))
+        self._dibs[hwnd] = (window_dc, memory_dc, bitmap, previous)
+        buffer = (ctypes.c_uint8 * (width * height * 4)).from_address(bits.value)
+        return np.ctypeslib.as_array(buffer).reshape(height, width, 4)
+
+    def render(self, hwnd):
+        state = self._dibs.get(hwnd)
+        if state is None:
+            return False
+        result = windll.user32.PrintWindow(hwnd, ctypes.c_void_p(state[1]), 3)
+        windll.gdi32.GdiFlush()
+        return bool(result)
+
+    def release(self, hwnd=None):
+        hwnds = list(self._dibs) if hwnd is None else [hwnd]
+        gdi32 = windll.gdi32
+        for key in hwnds:
+            state = self._dibs.pop(key, None)
+            if state is None:
+                continue
+            window_dc, memory_dc, bitmap, previous = state
+            gdi32.SelectObject(ctypes.c_void_p(memory_dc), ctypes.c_void_p(previous))
+            gdi32.DeleteObject(ctypes.c_void_p(bitmap))
+            gdi32.DeleteDC(ctypes.c_void_p(memory_dc))
+            win32gui.ReleaseDC(key, window_dc)
+
+
+class FakeBitmapProvider(BitmapProvider):
+    """用给定的 BGR 画面模拟窗口位图，用于在无 Windows 环境下测试缓冲区复用"""
+
+    def __init__(self, frames):
+        self.frames = {}  # hwnd -> BGRX 画面
+        self.dpi = {}  # hwnd -> 模拟的窗口 DPI
+        self._buffers = {}
+        self.allocated = []  # [(hwnd, 宽, 高), ...]，按分配顺序
+        self.released = []  # 释放过绘制资源的 hwnd，全部释放时为 None
+        for hwnd, frame in dict(frames).items():
+            self.set_frame(hwnd, frame)
+
+    def set_frame(self, hwnd, frame):
+        """替换窗口画面（BGR，可改变尺寸）"""
+        self.frames[hwnd] = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.frames]
+
+    def get_title(self, hwnd):
+        return f"fake-{hwnd}"
+
+    def get_rect(self, hwnd):
+        height, width = self.frames[hwnd].shape[:2]
+        return (0, 0, width, height)
+
+    def get_dpi(self, hwnd):
+        return self.dpi.get(hwnd)
+
+    def allocate(self, hwnd, width, height):
+        buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        self._buffers[hwnd] = buffer
+        self.allocated.append((hwnd, width, height))
+        return buffer
+
+    def render(self, hwnd):
+        buffer = self._buffers.get(hwnd)
+        frame = self.frames.get(hwnd)
+        if buffer is None or frame is None or frame.shape[:2] != buffer.shape[:2]:
+            return False
+        np.copyto(buffer, frame)  # 相当于 PrintWindow 写入位图
+        return True
+
+    def release(self, hwnd=None):
+        self.released.append(hwnd)
+        if hwnd is None:
+            self._buffers.clear()
+        else:
+            self._buffers.pop(hwnd, None)
+
+
+class CaptureBufferPool:
+    """每个窗口常驻的截图缓冲区：BGRX 原始位图与转换结果，只在尺寸变化时重新分配"""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._buffers = {}  # hwnd -> {"size": (w, h), "bgrx": ..., (gray, scale): 输出数组}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def _count(self, array):
+        with self._lock:
+            self.allocations += 1
+            self.allocated_bytes += array.nbytes
+
+    def bgrx(self, hwnd, width, height):
+        """窗口的原始位图缓冲区，尺寸变化时重建"""
+        buffers = self._buffers.get(hwnd)
+        if buffers is None or buffers["size"] != (width, height):
+            if buffers is not None:
+                self.provider.release(hwnd)  # 先释放旧尺寸的位图
+            bgrx = self.provider.allocate(hwnd, width, height)
+            self._count(bgrx)
+            buffers = {"size": (width, height), "bgrx": bgrx}
+            self._buffers[hwnd] = buffers
+        return buffers["bgrx"]
+
+    def output(self, hwnd, key, shape):
+        """窗口的转换输出缓冲区，key 区分灰度、缩放等不同输出"""
+        buffers = self._buffers[hwnd]
+        output = buffers.get(key)
+        if output is None or output.shape != shape:
+            output = np.empty(shape, dtype=np.uint8)
+            self._count(output)
+            buffers[key] = output
+        return output
+
+    def forget(self, hwnd):
+        self._buffers.pop(hwnd, None)
+        self.provider.release(hwnd)
+
+    def clear(self):
+        self._buffers.clear()
+        self.provider.release()
+
+
+class PooledCaptureSource(FrameSource):
+    """复用缓冲区的截图来源：位图直接作为数组读取，颜色转换与缩放写入预分配的数组
+
+    返回的画面在下次截取同一窗口时会被覆盖，需要跨帧保留时由调用方复制。
+    """
+
+    def __init__(self, provider, log=None):
+        self.provider = provider
+        self.pool = CaptureBufferPool(provider)
+        self.log = log or (lambda message, level="info": None)
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes_copied = 0  # 颜色转换与缩放写入的字节数
+
+    def list_windows(self):
+        return self.provider.list_windows()
+
+    def get_title(self, hwnd):
+        return self.provider.get_title(hwnd)
+
+    def get_rect(self, hwnd):
+        return self.provider.get_rect(hwnd)
+
+    def get_dpi(self, hwnd):
+        return self.provider.get_dpi(hwnd)
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        try:
+            x, y, x1, y1 = self.provider.get_rect(hwnd)
+            width, height = x1 - x, y1 - y
+            if width <= 0 or height <= 0:
+                return None
+            bgrx = self.pool.bgrx(hwnd, width, height)
+            if not self.provider.render(hwnd):
+                return None
+
+            if gray:
+                frame = self.pool.output(hwnd, "gray", (height, width))
+                cv2.cvtColor(bgrx, cv2.COLOR_BGRA2GRAY, dst=frame)
+            else:
+                frame = self.pool.output(hwnd, "bgr", (height, width, 3))
+                cv2.cvtColor(bgrx, cv2.COLOR_BGRA2BGR, dst=frame)
+            copied = frame.nbytes
+            if scale != 1.0:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                scaled = self.pool.output(
+                    hwnd, ("scaled", gray), (size[1], size[0]) + frame.shape[2:]
+                )
+                cv2.resize(frame, size, dst=scaled, interpolation=cv2.INTER_AREA)
+                frame = scaled
+                copied += scaled.nbytes
+            with self._lock:
+                self.frames += 1
+                self.bytes_copied += copied
+            return frame
+
+        except Exception as e:
+            self.log(f"截图失败: {e}")
+            return None
+
+    def forget(self, hwnd):
+        self.pool.forget(hwnd)
+
+    def stats(self):
+        with self._lock:
+            frames = self.frames
+            return {
+                "frames": frames,
+                "allocations": self.pool.allocations,
+                "allocated_bytes": self.pool.allocated_bytes,
+                "bytes_copied": self.bytes_copied,
+                "bytes_copied_per_frame": self.bytes_copied / frames if frames else 0.0,
+            }
+
+    def close(self):
+        self.pool.clear()
+
+
+def tile_monitor_regions(count, monitor=1):
+    """将显示器横向等分为 count 个虚拟窗口，返回 {hwnd: (left, top, right, bottom)}"""
+    with mss.mss() as sct:
+        area = sct.monitors[monitor]
+    width = area["width"] // count
+    return {
+        i + 1: (
+            area["left"] + i * width,
+            area["top"],
+            area["left"] + (i + 1) * width,
+            area["top"] + area["height"],
+        )
+        for i in range(count)
+    }
+
+
+class DesktopGrabSource(FrameSource):
+    """每轮每个显示器只截一次屏，各窗口按窗口矩形从整屏画面中裁剪（视图，不复制）
+
+    最小化、被遮挡（抽样检查窗口四角和中心是否露出）或不完整落在单个显示器内的
+    窗口回退到 fallback 截图。没有 Windows 窗口时可用 regions 指定屏幕上的虚拟窗口，
+    用于在 Linux（如 Xvfb）下压测。
+
+    grabber 为提供 mss 接口（monitors 列表与 grab(区域)）的截屏对象，为 None 时
+    每个线程各创建一个 mss 实例；visible(hwnd, 矩形) 替换默认的可见性检查。
+    两者用于在没有桌面的环境下测试。
+    """
+
+    def __init__(self, fallback=None, regions=None, log=None, grabber=None, visible=None):
+        if mss is None and grabber is None:
+            raise RuntimeError("整屏截取需要安装 mss")
+        if fallback is None and regions is None:
+            raise ValueError("需要 fallback 截图来源或 regions")
+        self.fallback = fallback
+        self.regions = dict(regions) if regions is not None else None
+        self.log = log or (lambda message, level="info": None)
+        self._grabber = grabber
+        self._check_visible = visible or self._visible
+        self._local = threading.local()  # mss 实例不能跨线程共用
+        self._lock = threading.Lock()
+        self._monitors = None
+        self._generation = 0
+        self._grabs = {}  # 显示器序号 -> (轮次, BGRA 整屏画面)
+        self._outputs = {}  # (hwnd, 输出类型) -> 预分配的转换结果
+        self.grabs = 0
+        self.crops = 0
+        self.fallbacks = 0
+
+    def _sct(self):
+        if self._grabber is not None:
+            return self._grabber
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def monitors(self):
+        if self._monitors is None:
+            self._monitors = self._sct().monitors[1:]
+        return self._monitors
+
+    def begin_cycle(self):
+        with self._lock:
+            self._generation += 1
+
+    def list_windows(self):
+        if self.regions is not None:
+            return [(hwnd, self.get_title(hwnd)) for hwnd in self.regions]
+        return self.fallback.list_windows()
+
+    def get_title(self, hwnd):
+        if self.regions is not None:
+            return f"region-{hwnd}"
+        return self.fallback.get_title(hwnd)
+
+    def get_rect(self, hwnd):
+        if self.regions is not None:
+            return self.regions[hwnd]
+        return self.fallback.get_rect(hwnd)
+
+    def get_dpi(self, hwnd):
+        if self.regions is not None:
+            return None
+        return self.fallback.get_dpi(hwnd)
+
+    def _monitor_index(self, rect):
+        """完整包含窗口矩形的显示器序号，没有时返回 None"""
+        left, top, right, bottom = rect
+        for index, area in enumerate(self.monitors()):
+            if (
+                left >= area["left"]
+                and top >= area["top"]
+                and right <= area["left"] + area["width"]
+                and bottom <= area["top"] + area["height"]
+            ):
+                return index
+        return None
+
+    def _visible(self, hwnd, rect):
+        """窗口未最小化且未被其他窗口遮挡（抽样检查）"""
+        if self.regions is not None or win32gui is None:
+            return True
+        if win32gui.IsIconic(hwnd):
+            return False
+        left, top, right, bottom = rect
+        points = [
+            ((left + right) // 2, (top + bottom) // 2),
+            (left + 1, top + 1),
+            (right - 2, top + 1),
+            (left + 1, bottom - 2),
+            (right - 2, bottom - 2),
+        ]
+        for point in points:
+            owner = win32gui.WindowFromPoint(point)
+            if not owner or win32gui.GetAncestor(owner, win32con.GA_ROOT) != hwnd:
+                return False
+        return True
+
+    def _monitor_frame(self, index):
+        """本轮该显示器的整屏画面，本轮第一次使用时截取"""
+        with self._lock:
+            grab = self._grabs.get(index)
+            if grab is None or grab[0] != self._generation:
+                area = self.monitors()[index]
+                shot = self._sct().grab(area)
+                frame = np.frombuffer(shot.raw, dtype=np.uint8).reshape(
+                    shot.height, shot.width, 4
+                )
+                grab = (self._generation, frame)
+                self._grabs[index] = grab
+                self.grabs += 1
+            return grab[1]
+
+    def _output(self, hwnd, key, shape):
+        output = self._outputs.get((hwnd, key))
+        if output is None or output.shape != shape:
+            output = np.empty(shape, dtype=np.uint8)
+            self._outputs[(hwnd, key)] = output
+        return output
+
+    def _fallback(self, hwnd, gray, scale):
+        if self.fallback is None:
+            return None
+        with self._lock:
+            self.fallbacks += 1
+        return self.fallback.capture(hwnd, gray, scale)
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        try:
+            rect = self.get_rect(hwnd)
+            left, top, right, bottom = rect
+            if right <= left or bottom <= top:
+                return None
+            index = self._monitor_index(rect)
+            if index is None or not self._check_visible(hwnd, rect):
+                return self._fallback(hwnd, gray, scale)
+
+            area = self.monitors()[index]
+            screen = self._monitor_frame(index)
+            x0, y0 = left - area["left"], top - area["top"]
+            view = screen[y0 : y0 + bottom - top, x0 : x0 + right - left]
+            height, width = view.shape[:2]
+            if gray:
+                frame = self._output(hwnd, "gray", (height, width))
+                cv2.cvtColor(view, cv2.COLOR_BGRA2GRAY, dst=frame)
+            else:
+                frame = self._output(hwnd, "bgr", (height, width, 3))
+                cv2.cvtColor(view, cv2.COLOR_BGRA2BGR, dst=frame)
+            if scale != 1.0:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                scaled = self._output(
+                    hwnd, ("scaled", gray), (size[1], size[0]) + frame.shape[2:]
+                )
+                cv2.resize(frame, size, dst=scaled, interpolation=cv2.INTER_AREA)
+                frame = scaled
+            with self._lock:
+                self.crops += 1
+            return frame
+
+        except Exception as e:
+            self.log(f"整屏截取失败: {e}")
+            return self._fallback(hwnd, gray, scale)
+
+    def forget(self, hwnd):
+        for key in [k for k in self._outputs if k[0] == hwnd]:
+            del self._outputs[key]
+        if self.fallback is not None:
+            self.fallback.forget(hwnd)
+
+    def stats(self):
+        with self._lock:
+            return {"grabs": self.grabs, "crops": self.crops, "fallbacks": self.fallbacks}
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+        self._grabs.clear()
+        self._outputs.clear()
+
+
+class ImageFileSource(FrameSource):
+    """从图像文件或目录回放画面，每个虚拟窗口依次循环播放"""
+
+    def __init__(self, path, windows=1, loop=True):
+        if os.path.isdir(path):
+            self.paths = sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            self.paths = [path]
+        if not self.paths:
+            raise ValueError(f"目录中没有图像文件: {path}")
+        self.loop = loop
+        self.hwnds = list(range(1, windows + 1))
+        self._frames = {}  # 已解码的画面
+        self._positions = {hwnd: i for i, hwnd in enumerate(self.hwnds)}
+
+    def _load(self, index):
+        frame = self._frames.get(index)
+        if frame is None:
+            frame = cv2.imread(self.paths[index])
+            self._frames[index] = frame
+        return frame
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.hwnds]
+
+    def get_title(self, hwnd):
+        index = self._positions[hwnd] % len(self.paths)
+        return os.path.basename(self.paths[index])
+
+    def get_rect(self, hwnd):
+        frame = self._load(self._positions[hwnd] % len(self.paths))
+        if frame is None:
+            return (0, 0, 0, 0)
+        height, width = frame.shape[:2]
+        return (0, 0, width, height)
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        position = self._positions[hwnd]
+        if not self.loop and position >= len(self.paths):
+            return None
+        self._positions[hwnd] = position + 1
+        return convert_frame(self._load(position % len(self.paths)), gray, scale)
+
+
+class SyntheticFrameSource(FrameSource):
+    """合成画面：噪声背景上按概率放置模板，用于无显示环境压测"""
+
+    def __init__(
+        self,
+        width=1920,
+        height=1080,
+        template_paths=(),
+        windows=1,
+        hit_rate=0.5,
+        seed=0,
+        template_scale=1.0,
+        copies=1,
+    ):
+        self.width = width
+        self.height = height
+        self.hit_rate = hit_rate
+        self.copies = copies  # 命中时放置的同一模板的数量（互不重叠，模拟同时出现多个按钮）
+        self.hwnds = list(range(1, windows + 1))
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()  # 随机数生成器不是线程安全的
+        self._background = self._rng.integers(
+            0, 256, (height, width, 3), dtype=np.uint8
+        )
+        self.templates = []
+        for path in template_paths:
+            img = cv2.imread(path)
+            if img is not None:
+                if template_scale != 1.0:
+                    # 模拟窗口与模板截取时的 DPI 缩放不同
+                    interpolation = cv2.INTER_AREA if template_scale < 1 else cv2.INTER_LINEAR
+                    img = cv2.resize(
+                        img,
+                        None,
+                        fx=template_scale,
+                        fy=template_scale,
+                        interpolation=interpolation,
+                    )
+                self.templates.append(img)
+        self.planted = {}  # hwnd -> 最近一帧放置的 [(x, y, w, h), ...]
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.hwnds]
+
+    def get_title(self, hwnd):
+        return f"synthetic-{hwnd}"
+
+    def get_rect(self, hwnd):
+        return (0, 0, self.width, self.height)
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        frame = self._background.copy()
+        planted = []
+        with self._lock:
+            if self.templates and self._rng.random() < self.hit_rate:
+                template = self.templates[self._rng.integers(len(self.templates))]
+                h, w = template.shape[:2]
+                if h <= self.height and w <= self.width:
+                    for _ in range(self.copies * 10):
+                        if len(planted) == self.copies:
+                            break
+                        x = int(self._rng.integers(0, self.width - w + 1))
+                        y = int(self._rng.integers(0, self.height - h + 1))
+                        if any(
+                            abs(x - px) < w and abs(y - py) < h for px, py, _, _ in planted
+                        ):
+                            continue
+                        frame[y : y + h, x : x + w] = template
+                        planted.append((x, y, w, h))
+        self.planted[hwnd] = planted
+        return convert_frame(frame, gray, scale)
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+
+
+# 配置文件格式版本；增加字段时提高版本号并在 MIGRATIONS 中登记升级函数
+CONFIG_VERSION = 2
+
+
+def _migrate_v0(config):
+    """版本 0（无 version 字段）与版本 1 字段相同"""
+    return config
+
+
+def _migrate_v1(config):
+    """版本 2 的模板可带 threshold 字段，缺省时使用全局阈值，旧配置无需改动"""
+    return config
+
+
+# 旧版本号 -> 升级到下一版本的函数
+MIGRATIONS = {
+    0: _migrate_v0,
+    1: _migrate_v1,
+}
+
+
+def migrate_config(config):
+    """将读取的配置逐版本升级到 CONFIG_VERSION，返回 (配置, 原版本号)"""
+    version = config.get("version", 0)
+    original = version
+    while version < CONFIG_VERSION:
+        config = MIGRATIONS[version](config)
+        version += 1
+    config["version"] = max(version, original)
+    return config, original
+
+
+def load_config_file(path):
+    """读取配置文件，返回 (配置, 原版本号, 文件内容)；文件不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    config, version = migrate_config(json.loads(text))
+    return config, version, text
+
+
+def write_atomic(path, text):
+    """先写同目录下的临时文件并刷到磁盘，再替换原文件，中断时原文件保持完整"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class ConfigWriter:
+    """在后台线程保存配置
+
+    save() 只记录最新的配置并立即返回；最后一次 save() 之后安静 delay 秒才写入，
+    连续多次修改只写一次。内容与上次写入的相同时跳过。
+
+    文件在上次读取或写入后被其他程序修改（如 auto_click_tuning.py --apply）时
+    不覆盖，由调用方通过 changed_on_disk() 读取新内容、合并后再次保存。
+    """
+
+    def __init__(self, path, delay=0.5, log=None):
+        self.path = path
+        self.delay = delay
+        self.log = log or (lambda message, level="info": None)
+        self._pending = None
+        self._requested_at = 0.0
+        self._last_text = None
+        self._disk_signature = None  # 上次读取或写入后文件的 (mtime, 大小)
+        self._condition = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._running = True
+        self.requests = 0
+        self.writes = 0
+        self.skipped = 0
+        self.conflicts = 0  # 因文件被其他程序修改而未写入的次数
+        self._thread = threading.Thread(target=self._run, name="config", daemon=True)
+        self._thread.start()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def mark_saved(self, text):
+        """记录磁盘上已有的内容（加载配置时调用），相同内容不再写入
+
+        text 为 None 时只记录文件状态，之后的保存总会写入。
+        """
+        with self._io_lock:
+            self._last_text = text
+            self._disk_signature = self._signature()
+
+    def changed_on_disk(self):
+        """文件自上次读取或写入后被其他程序修改时返回新内容，否则返回 None
+
+        返回后视为已读取，之后的保存会覆盖该内容。
+        """
+        with self._io_lock:
+            signature = self._signature()
+            if signature == self._disk_signature:
+                return None
+            self._disk_signature = signature
+            if signature is None:
+                return None
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+            if text == self._last_text:
+                return None
+            self._last_text = text
+            return text
+
+    def save(self, config):
+        """请求保存（不阻塞调用方）"""
+        text = json.dumps(config, ensure_ascii=False, indent=2)
+        with self._condition:
+            self._pending = text
+            self._requested_at = time.monotonic()
+            self.requests += 1
+            self._condition.notify()
+
+    def _take(self):
+        """等到有待写内容且已安静 delay 秒，取出待写内容；停止时返回 None"""
+        with self._condition:
+            while self._running:
+                if self._pending is None:
+                    self._condition.wait()
+                    continue
+                remaining = self._requested_at + self.delay - time.monotonic()
+                if remaining <= 0:
+                    text, self._pending = self._pending, None
+                    return text
+                self._condition.wait(remaining)
+            return None
+
+    def _write(self, text):
+        with self._io_lock:
+            if text == self._last_text:
+                self.skipped += 1
+                return
+            if self._signature() != self._disk_signature:
+                self.conflicts += 1
+                self.log("配置文件已被其他程序修改，重新读取后再保存")
+                return
+            try:
+                write_atomic(self.path, text)
+                self._last_text = text
+                self._disk_signature = self._signature()
+                self.writes += 1
+                self.log("配置保存成功")
+            except Exception as e:
+                self.log(f"配置保存失败: {e}")
+
+    def _run(self):
+        while True:
+            text = self._take()
+            if text is None:
+                break
+            self._write(text)
+
+    def flush(self):
+        """立即写入尚未保存的配置"""
+        with self._condition:
+            text, self._pending = self._pending, None
+        if text is not None:
+            self._write(text)
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=2)
+        self.flush()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "conflicts": self.conflicts,
+        }
@@ -0,0 +1,752 @@
+import argparse
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from auto_click_actuator import AsyncActuator, RecordingClickSink
+from auto_click_cache import FrameChangeTracker, RoiCache, ScaleCache, TemplateOrder
+from auto_click_capture import (
+    DesktopGrabSource,
+    ImageFileSource,
+    SyntheticFrameSource,
+    tile_monitor_regions,
+)
+from auto_click_matching import (
+    ScaleSearcher,
+    SharedSpectrumMatcher,
+    best_match,
+    match_peaks,
+    pyramid_match,
+)
+from auto_click_metrics import STAGE_NAMES, MetricsServer, StageMetrics
+from auto_click_scheduler import PollScheduler
+from auto_click_session import SessionRecorder, SessionReplaySource
+from auto_click_templates import TemplateStore
+
+
+def print_log(message, level="info"):
+    """无界面时的日志输出"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    level_prefix = "[DEBUG]" if level == "debug" else "[INFO]"
+    print(f"[{timestamp}] {level_prefix} {message}")
+
+
+class DetectionEngine:
+    """与界面无关的检测引擎：截图、模板匹配、点击"""
+
+    def __init__(self, source, sink, template_store=None, log=None):
+        self.source = source
+        self.sink = sink
+        self.template_store = template_store or TemplateStore()
+        self.log = log or print_log
+        self.roi_cache = RoiCache()
+        self.metrics = StageMetrics()  # 各阶段耗时，默认关闭
+        self.frame_tracker = FrameChangeTracker()
+        # 按窗口的模板命中统计，决定每个窗口中模板的匹配顺序
+        self.template_order = TemplateOrder()
+        self.scale_cache = ScaleCache()  # 多尺度模式下每个窗口相对模板的缩放比例
+        self._local = threading.local()  # 每个工作线程独立的频谱匹配器
+        # 截图序号：频谱匹配器按序号判断是否为同一帧（截图缓冲区会被复用）
+        self._frame_ids = itertools.count()
+
+        # 运行参数，由界面或命令行设置
+        self.templates = []  # [{"name": ..., "path": ...}, ...]
+        self.threshold = 0.8  # 全局阈值；模板带 "threshold" 字段时使用模板自己的阈值
+        self.click_type = {}  # hwnd -> '拓展'(仅点击) 或 'cli'(点击并回车)
+        # 一帧中同一模板最多点击的位置数；大于 1 时同时出现的多个按钮在一次检测中全部点击
+        self.max_hits = 1
+        self.click_pause = 1.0  # 点击后的等待时间（秒）；异步点击时为该窗口的冷却时间
+        # 设置后命中结果交给点击线程执行，检测不再等待点击和冷却
+        self.actuator = None
+        self.recorder = None  # 设置后将每帧截图写入会话文件
+        # 'full'(全分辨率)、'pyramid'(金字塔由粗到细) 或 'fft'(多模板共享画面频谱)
+        self.match_mode = "full"
+        self.pyramid_scale = 0.5
+        self.pyramid_levels = 1
+        self.fast_mode = False  # 快速模式：截取单通道画面并与灰度模板匹配
+        self.fast_scale = 1.0  # 快速模式下的截图缩放比例
+        # 多尺度模式：按窗口估计画面相对模板的缩放比例（DPI 不同），之后只在该比例上匹配
+        self.scale_search = False
+        self.template_dpi = 96  # 模板截取时的 DPI，用于按窗口 DPI 推算首先尝试的比例
+        # 并行处理的窗口数；OpenCV 匹配时释放 GIL，多线程可同时截图和匹配
+        self.workers = 1
+        self.running = True
+        self._match_params = None
+        self._executor = None
+        self._executor_workers = 0
+        self._click_lock = threading.Lock()  # 鼠标和前台焦点是全局的，点击必须串行
+
+        # 统计
+        self.cycles = 0
+        self._clicks = 0  # 检测线程中完成的点击，加上已替换的点击线程完成的点击
+        self.multi_hits = 0  # 命中多个位置的检测次数
+        self.window_latency = {}  # hwnd -> 最近一次截图加匹配耗时（秒）
+        self.window_changed = {}  # hwnd -> 最近一帧画面是否有变化
+
+    @property
+    def clicks(self):
+        """已完成的点击次数；异步点击只统计点击线程实际执行的点击"""
+        actuator = self.actuator
+        return self._clicks + (actuator.stats()["clicks"] if actuator is not None else 0)
+
+    @property
+    def spectrum_matcher(self):
+        """当前线程的共享频谱匹配器（其中保存了每帧状态，不能跨线程共用）"""
+        matcher = getattr(self._local, "spectrum_matcher", None)
+        if matcher is None:
+            matcher = SharedSpectrumMatcher()
+            self._local.spectrum_matcher = matcher
+        return matcher
+
+    @property
+    def scale_searcher(self):
+        """当前线程的多尺度搜索器（其中保存了缩小后的当前画面）"""
+        searcher = getattr(self._local, "scale_searcher", None)
+        if searcher is None:
+            searcher = ScaleSearcher()
+            self._local.scale_searcher = searcher
+        return searcher
+
+    def frame_token(self, gray):
+        """当前线程正在检测的画面标识（截图序号, 是否灰度）；不在 scan_window 中时为 None"""
+        frame = getattr(self._local, "frame", None)
+        return (frame, gray) if frame is not None else None
+
+    def debug_log(self, message):
+        self.log(message, "debug")
+
+    def match(self, screen, entry, threshold, scale=1.0):
+        """按当前匹配模式在整幅画面中搜索，返回 (最高分, 左上角坐标)"""
+        gray = screen.ndim == 2
+        if self.match_mode == "pyramid":
+            return pyramid_match(
+                screen,
+                entry.pyramid(self.pyramid_scale, self.pyramid_levels, gray, scale),
+                threshold,
+                self.pyramid_scale,
+                self.pyramid_levels,
+            )
+        if self.match_mode == "fft":
+            matcher = self.spectrum_matcher
+            matcher.template_count = len(self.templates)
+            return matcher.match(
+                screen,
+                entry.variant(gray, scale),
+                (entry.path, entry.mtime, gray, scale),
+                self.frame_token(gray),
+            )
+        return best_match(screen, entry.variant(gray, scale))
+
+    def match_regions(self, screen, template, regions):
+        """只在变化区域内匹配：每个区域按模板尺寸外扩，覆盖跨越区域边界的位置"""
+        screen_h, screen_w = screen.shape[:2]
+        template_h, template_w = template.shape[:2]
+        best = (-1.0, (0, 0))
+        for x0, y0, x1, y1 in regions:
+            x0 = max(0, x0 - template_w + 1)
+            y0 = max(0, y0 - template_h + 1)
+            x1 = min(screen_w, x1 + template_w - 1)
+            y1 = min(screen_h, y1 + template_h - 1)
+            if x1 - x0 < template_w or y1 - y0 < template_h:
+                continue
+            max_val, (dx, dy) = best_match(screen[y0:y1, x0:x1], template)
+            if max_val > best[0]:
+                best = (max_val, (x0 + dx, y0 + dy))
+        return best
+
+    def find_template(
+        self,
+        screen,
+        template_path,
+        threshold,
+        hwnd=None,
+        regions=None,
+        scale=1.0,
+        window_scale=1.0,
+    ):
+        """查找模板
+
+        指定 hwnd 时先在上次命中位置附近搜索；指定 regions 时只搜索这些变化区域。
+        单通道画面使用灰度模板；scale 为画面相对窗口的缩放比例，
+        返回的中心坐标始终是窗口坐标。window_scale 为窗口相对模板的缩放比例，
+        为 None 时在候选比例中搜索（见 search_template）。
+        """
+        try:
+            entry = self.template_store.get(template_path)
+            if entry is None:
+                return False, 0, 0
+            if window_scale is None:
+                return self.search_template(screen, entry, threshold, hwnd, scale)
+            template = entry.variant(screen.ndim == 2, scale * window_scale)
+            half_w = round(entry.width * window_scale) // 2
+            half_h = round(entry.height * window_scale) // 2
+
+            screen_h, screen_w = screen.shape[:2]
+            template_h, template_w = template.shape[:2]
+
+            if template_h > screen_h or template_w > screen_w:
+                return False, 0, 0
+
+            if hwnd is not None:
+                roi = self.roi_cache.roi(
+                    hwnd, template_path, template_w, template_h, screen_w, screen_h
+                )
+                if roi is not None:
+                    x0, y0, x1, y1 = roi
+                    max_val, (dx, dy) = best_match(screen[y0:y1, x0:x1], template)
+                    if max_val >= threshold:
+                        self.roi_cache.record(
+                            hwnd, template_path, (x0 + dx, y0 + dy), in_roi=True
+                        )
+                        return (
+                            True,
+                            round((x0 + dx) / scale) + half_w,
+                            round((y0 + dy) / scale) + half_h,
+                        )
+                    self.roi_cache.record_miss()
+
+            if regions is not None:
+                max_val, max_loc = self.match_regions(screen, template, regions)
+            else:
+                max_val, max_loc = self.match(screen, entry, threshold, scale * window_scale)
+
+            if max_val >= threshold:
+                if hwnd is not None:
+                    self.roi_cache.record(hwnd, template_path, max_loc)
+                center_x = round(max_loc[0] / scale) + half_w
+                center_y = round(max_loc[1] / scale) + half_h
+                return True, center_x, center_y
+
+            return False, 0, 0
+
+        except Exception as e:
+            self.log(f"模板匹配错误: {e}")
+            return False, 0, 0
+
+    def search_template(self, screen, entry, threshold, hwnd=None, scale=1.0):
+        """在候选缩放比例中搜索模板；命中时缓存该窗口的比例，之后只在该比例上匹配"""
+        gray = screen.ndim == 2
+        # 没有按 DPI 推算或之前估计的比例时，首先尝试原尺寸
+        prefer = self.scale_cache.prefer(hwnd) if hwnd is not None else None
+        if prefer is None:
+            prefer = 1.0
+        max_val, max_loc, window_scale = self.scale_searcher.search(
+            screen, lambda k: entry.variant(gray, scale * k), threshold, prefer,
+            self.frame_token(gray),
+        )
+        if max_val < threshold:
+            return False, 0, 0
+        if hwnd is not None:
+            self.scale_cache.set(hwnd, window_scale)
+            self.roi_cache.record(hwnd, entry.path, max_loc)
+            self.debug_log(f"窗口 {hwnd} 缩放比例: {window_scale:.3g} (分数 {max_val:.3f})")
+        center_x = round(max_loc[0] / scale) + round(entry.width * window_scale) // 2
+        center_y = round(max_loc[1] / scale) + round(entry.height * window_scale) // 2
+        return True, center_x, center_y
+
+    def find_hits(
+        self,
+        screen,
+        template_path,
+        threshold,
+        hwnd=None,
+        regions=None,
+        scale=1.0,
+        window_scale=1.0,
+    ):
+        """查找模板的所有命中位置，返回窗口坐标 [(x, y), ...]，未命中时为空列表
+
+        max_hits 为 1 时只返回 find_template 的结果。否则命中后在整幅画面的结果图上
+        取所有不低于阈值的峰值（非极大值抑制，最多 max_hits 个），按从下到上排序：
+        点击下方按钮后上方内容通常不移动，依次点击时尚未点击的位置仍然有效。
+        """
+        found, x, y = self.find_template(
+            screen, template_path, threshold, hwnd, regions, scale, window_scale
+        )
+        if not found:
+            return []
+        if self.max_hits <= 1:
+            return [(x, y)]
+        if window_scale is None and hwnd is not None:
+            window_scale = self.scale_cache.scale(hwnd)
+        entry = self.template_store.get(template_path)
+        if window_scale is None or entry is None:
+            return [(x, y)]
+        try:
+            template = entry.variant(screen.ndim == 2, scale * window_scale)
+            peaks = match_peaks(screen, template, threshold, self.max_hits)
+        except Exception as e:
+            self.log(f"模板匹配错误: {e}")
+            return [(x, y)]
+        if len(peaks) <= 1:
+            return [(x, y)]
+        half_w = round(entry.width * window_scale) // 2
+        half_h = round(entry.height * window_scale) // 2
+        points = [
+            (round(px / scale) + half_w, round(py / scale) + half_h) for _, (px, py) in peaks
+        ]
+        points.sort(key=lambda point: point[1], reverse=True)
+        return points
+
+    def update_window_scale(self, hwnd, rect):
+        """多尺度模式下记录窗口尺寸和 DPI，变化时丢弃该窗口缓存的比例和 ROI"""
+        dpi = self.source.get_dpi(hwnd)
+        prefer = dpi / self.template_dpi if dpi and self.template_dpi else None
+        size = (rect[2] - rect[0], rect[3] - rect[1])
+        if self.scale_cache.update_window(hwnd, size, dpi, prefer):
+            self.roi_cache.forget(hwnd)
+            self.debug_log(f"窗口 {hwnd} 尺寸或 DPI 变化，重新估计缩放比例")
+
+    def scan_window(self, hwnd, window_title):
+        """截图并按该窗口的命中频率依次匹配模板，返回首个命中的 (template_info, [(x, y), ...]) 或 None"""
+        rect = None
+        try:
+            rect = self.source.get_rect(hwnd)
+            self.roi_cache.update_window(hwnd, rect)
+            if self.scale_search:
+                self.update_window_scale(hwnd, rect)
+        except Exception:
+            pass
+        # 多尺度模式下尚未估计出比例时为 None
+        window_scale = self.scale_cache.scale(hwnd) if self.scale_search else 1.0
+        scale = self.fast_scale if self.fast_mode else 1.0
+        with self.metrics.time("capture", hwnd):
+            screen = self.source.capture(hwnd, gray=self.fast_mode, scale=scale)
+        if screen is None:
+            self.debug_log(f"窗口截图失败: {window_title}")
+            return None
+        self._local.frame = next(self._frame_ids)
+        recorder = self.recorder
+        if recorder is not None and rect is not None:
+            recorder.record(hwnd, screen, rect, window_title)
+        self.debug_log(f"成功获取画面: {window_title}, 大小: {screen.shape}")
+
+        params = (self.threshold, self.match_mode, self.fast_mode, scale, self.scale_search)
+        if params != self._match_params:
+            # 截图的通道或尺寸变化后，ROI 坐标不再适用
+            self.roi_cache.clear()
+            self._match_params = params
+
+        # 上一帧已未命中的模板：画面未变化则跳过，部分变化则只搜索变化区域
+        delta = self.frame_tracker.begin(hwnd, screen, params + (window_scale,))
+        self.window_changed[hwnd] = delta.regions != []
+        hit = None
+        gray_screen = screen if screen.ndim == 2 else None
+        tried = 0
+        for template_info in self.template_order.order(hwnd, self.templates):
+            if not self.running:
+                break
+            target = screen
+            if template_info.get("fast") and gray_screen is None:
+                # 单个模板启用快速模式时，在彩色画面的灰度副本上匹配
+                gray_screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+            if template_info.get("fast"):
+                target = gray_screen
+            threshold = template_info.get("threshold", self.threshold)
+            key = self.template_key(template_info["path"]) + (threshold,)
+            regions = None
+            if key in delta.missed_before:
+                if not delta.regions:
+                    self.frame_tracker.skip()
+                    delta.missed.add(key)
+                    continue
+                if window_scale is not None:
+                    regions = delta.regions
+            with self.metrics.time("match", hwnd, template_info["name"]):
+                points = self.find_hits(
+                    target,
+                    template_info["path"],
+                    threshold,
+                    hwnd,
+                    regions,
+                    scale,
+                    window_scale,
+                )
+            self.template_order.record(hwnd, template_info["path"], bool(points), tried)
+            tried += 1
+            if points:
+                hit = (template_info, points)
+                break
+            delta.missed.add(key)
+            self.debug_log(f"模板 '{template_info['name']}' 未匹配")
+        # 释放本帧的频谱和缩小画面，避免占用内存到下一个窗口
+        self._local.frame = None
+        self.spectrum_matcher.release()
+        if self.scale_search:
+            self.scale_searcher.release()
+        return hit
+
+    def template_key(self, template_path):
+        """模板文件变化后键也随之变化，保证重新加载的模板会被重新匹配"""
+        entry = self.template_store.get(template_path)
+        return (template_path, entry.mtime if entry is not None else None)
+
+    def create_actuator(self):
+        """创建异步点击执行器，冷却时间取 click_pause"""
+        if self.actuator is not None:
+            self._clicks += self.actuator.stats()["clicks"]
+        self.actuator = AsyncActuator(
+            self.sink,
+            self.source.get_rect,
+            log=self.log,
+            cooldown=self.click_pause,
+            metrics=self.metrics,
+        )
+        return self.actuator
+
+    def click_hit(self, hwnd, points):
+        """激活窗口一次，依次点击窗口内坐标 [(x, y), ...]，全部点击后等待一次"""
+        with self._click_lock:
+            with self.metrics.time("activate", hwnd):
+                self.sink.activate(hwnd)
+            rect = self.source.get_rect(hwnd)
+            press_enter = self.click_type.get(hwnd, "拓展") == "cli"
+            for x, y in points:
+                screen_x = rect[0] + x
+                screen_y = rect[1] + y
+                with self.metrics.time("click", hwnd):
+                    self.sink.click(hwnd, screen_x, screen_y, press_enter)
+                self._clicks += 1
+                self.log(f"点击位置: ({screen_x}, {screen_y})")
+            if self.click_pause > 0:
+                with self.metrics.time("sleep", hwnd):
+                    time.sleep(self.click_pause)
+
+    def timed_scan(self, hwnd):
+        """获取标题并扫描窗口，记录耗时；返回 (hwnd, 标题, 命中, 检测完成时间)"""
+        if not self.running:
+            return hwnd, None, None, None
+        try:
+            with self.metrics.time("title", hwnd):
+                window_title = self.source.get_title(hwnd)
+        except Exception:
+            return hwnd, None, None, None
+        start = time.perf_counter()
+        hit = self.scan_window(hwnd, window_title)
+        finished = time.perf_counter()
+        self.window_latency[hwnd] = finished - start
+        return hwnd, window_title, hit, finished
+
+    def executor(self):
+        """按当前 workers 设置获取线程池"""
+        if self._executor is None or self._executor_workers != self.workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="scan"
+            )
+            self._executor_workers = self.workers
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def run_cycle(self, hwnds):
+        """对所有窗口执行一轮检测
+
+        workers 大于 1 时各窗口并行截图和匹配，命中结果按窗口顺序在当前线程依次点击。
+        设置了 actuator 时命中结果放入点击队列，有待执行点击或处于冷却期的窗口本轮跳过。
+        返回 {hwnd: 是否活跃}，活跃指命中模板或画面有变化；跳过的窗口不在其中。
+        """
+        actuator = self.actuator
+        if actuator is not None:
+            hwnds = [hwnd for hwnd in hwnds if not actuator.is_busy(hwnd)]
+        self.source.begin_cycle()
+        if self.workers > 1 and len(hwnds) > 1:
+            results = self.executor().map(self.timed_scan, hwnds)
+        else:
+            results = map(self.timed_scan, hwnds)
+        activity = {}
+        for hwnd, window_title, hit, detected_at in results:
+            if not self.running:
+                break
+            activity[hwnd] = hit is not None or (
+                window_title is not None and self.window_changed.get(hwnd, False)
+            )
+            if hit is not None:
+                template_info, points = hit
+                if len(points) > 1:
+                    self.multi_hits += 1
+                    self.log(
+                        f"在窗口 '{window_title}' 找到模板 '{template_info['name']}' {len(points)} 处"
+                    )
+                else:
+                    self.log(f"在窗口 '{window_title}' 找到模板 '{template_info['name']}'")
+                if actuator is not None:
+                    press_enter = self.click_type.get(hwnd, "拓展") == "cli"
+                    actuator.submit(hwnd, points, press_enter, detected_at)
+                else:
+                    self.click_hit(hwnd, points)
+        self.cycles += 1
+        if actuator is not None:
+            action_stats = actuator.stats()
+            self.debug_log(
+                f"点击队列: 深度 {action_stats['queue_depth']} (最大 {action_stats['max_depth']}), "
+                f"已执行 {action_stats['executed']}, 平均点击耗时 {action_stats['avg_action_ms']:.1f} ms, "
+                f"检测到点击平均 {action_stats['avg_delay_ms']:.1f} ms"
+            )
+        roi_stats = self.roi_cache.stats()
+        self.debug_log(
+            f"ROI 缓存命中率: {roi_stats['hit_rate']:.1%} "
+            f"(命中 {roi_stats['hits']}, 未命中 {roi_stats['misses']}, 失效 {roi_stats['invalidations']})"
+        )
+        frame_stats = self.frame_tracker.stats()
+        self.debug_log(
+            f"画面未变化: {frame_stats['frames_unchanged']}/{frame_stats['frames_checked']} 帧, "
+            f"局部变化: {frame_stats['frames_partial']} 帧 (平均变化面积 {frame_stats['dirty_area']:.1%}), "
+            f"跳过模板匹配 {frame_stats['templates_skipped']} 次"
+        )
+        order_stats = self.template_order.stats()
+        self.debug_log(
+            f"模板顺序: 首个模板命中率 {order_stats['first_hit_rate']:.1%}, "
+            f"每次检测平均匹配 {order_stats['tries_per_scan']:.2f} 个模板, "
+            f"跳过从未命中的模板 {order_stats['sampled_out']} 次"
+        )
+        return activity
+
+    def run_scheduled_cycle(self, scheduler, hwnds):
+        """只检测已到期的窗口并按活跃情况安排下次检测，返回距下次到期的秒数
+
+        因冷却被跳过的窗口按活跃处理，冷却结束后尽快再次检测。
+        """
+        scheduler.sync(hwnds)
+        due = scheduler.due()
+        if due:
+            activity = self.run_cycle(due)
+            for hwnd in due:
+                scheduler.reschedule(hwnd, activity.get(hwnd, True))
+            sched_stats = scheduler.stats()
+            self.debug_log(
+                f"调度: 本轮检测 {len(due)}/{sched_stats['windows']} 个窗口, "
+                f"平均间隔 {sched_stats['avg_interval']:.2f}s"
+            )
+        return scheduler.wait_time()
+
+    def run(self, hwnds, interval=1.0, max_cycles=None, scheduler=None):
+        """持续检测，直到 running 为 False 或达到 max_cycles
+
+        指定 scheduler 时按窗口各自的到期时间检测，否则每轮检测全部窗口后等待 interval。
+        """
+        self.running = True
+        while self.running and (max_cycles is None or self.cycles < max_cycles):
+            try:
+                if scheduler is not None:
+                    wait = self.run_scheduled_cycle(scheduler, hwnds)
+                    with self.metrics.time("sleep"):
+                        time.sleep(wait if wait is not None else max(interval, 0.1))
+                    continue
+                self.run_cycle(hwnds)
+                if interval > 0:
+                    with self.metrics.time("sleep"):
+                        time.sleep(interval)
+            except Exception as e:
+                self.log(f"监控异常: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面运行检测循环并统计吞吐量")
+    parser.add_argument(
+        "--source",
+        choices=["synthetic", "files", "desktop", "replay"],
+        default="synthetic",
+        help="desktop: 整屏截取后按 --windows 等分为虚拟窗口（可在 Xvfb 下运行）；"
+        "replay: 回放录制的会话文件",
+    )
+    parser.add_argument("--path", help="files 模式下的图像文件或目录，replay 模式下的会话文件")
+    parser.add_argument("--realtime", action="store_true", help="replay 模式按录制时的时间间隔回放")
+    parser.add_argument("--speed", type=float, default=1.0, help="按原时间回放时的倍速")
+    parser.add_argument("--record", help="将截取的画面录制到该会话文件")
+    parser.add_argument("--templates", nargs="+", default=["image1.png", "image2.png"])
+    parser.add_argument("--pack", help="模板包文件：存在时从中载入模板，模板变化后重建")
+    parser.add_argument("--windows", type=int, default=1)
+    parser.add_argument("--size", default="1920x1080", help="合成画面尺寸，如 1920x1080")
+    parser.add_argument("--hit-rate", type=float, default=0.5)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument(
+        "--template-thresholds",
+        nargs="+",
+        default=[],
+        metavar="PATH=VALUE",
+        help="单个模板的阈值（见 auto_click_tuning.py），未指定的模板使用 --threshold",
+    )
+    parser.add_argument("--mode", choices=["full", "pyramid", "fft"], default="full")
+    parser.add_argument("--pyramid-scale", type=float, default=0.5)
+    parser.add_argument("--pyramid-levels", type=int, default=1)
+    parser.add_argument("--fast", action="store_true", help="快速模式（灰度）")
+    parser.add_argument("--fast-scale", type=float, default=1.0)
+    parser.add_argument(
+        "--scale-search", action="store_true", help="多尺度模式：按窗口估计相对模板的缩放比例"
+    )
+    parser.add_argument("--template-dpi", type=int, default=96, help="模板截取时的 DPI")
+    parser.add_argument(
+        "--plant-scale", type=float, default=1.0, help="合成画面中模板的缩放比例（模拟 DPI 不同）"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="并行处理的窗口数")
+    parser.add_argument(
+        "--max-hits", type=int, default=1, help="一帧中同一模板最多点击的位置数（非极大值抑制）"
+    )
+    parser.add_argument(
+        "--plant-copies", type=int, default=1, help="合成画面中命中时放置的模板数量"
+    )
+    parser.add_argument(
+        "--sample-after",
+        type=int,
+        default=0,
+        help="窗口中从未命中的模板匹配该次数后降低匹配频率（0 表示不启用）",
+    )
+    parser.add_argument("--sample-every", type=int, default=10, help="降低频率后每几次检测匹配一次")
+    parser.add_argument("--async-clicks", action="store_true", help="由点击线程异步执行点击")
+    parser.add_argument("--cooldown", type=float, default=0.0, help="异步点击后窗口的冷却时间（秒）")
+    parser.add_argument("--cycles", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.0, help="每轮检测后的等待时间（秒）")
+    parser.add_argument(
+        "--max-interval", type=float, help="启用按窗口自适应调度，空闲窗口间隔的上限（秒）"
+    )
+    parser.add_argument("--debug", action="store_true")
+    parser.add_argument("--metrics", action="store_true", help="统计各阶段耗时并在结束时输出")
+    parser.add_argument("--metrics-file", help="结束时写入 Prometheus 文本文件")
+    parser.add_argument("--metrics-port", type=int, help="运行期间在该端口提供 /metrics")
+    args = parser.parse_args()
+
+    if args.source in ("files", "replay") and not args.path:
+        parser.error(f"{args.source} 模式需要 --path")
+    if args.source == "files":
+        source = ImageFileSource(args.path, windows=args.windows)
+    elif args.source == "replay":
+        source = SessionReplaySource(args.path, realtime=args.realtime, speed=args.speed)
+    elif args.source == "desktop":
+        source = DesktopGrabSource(regions=tile_monitor_regions(args.windows))
+    else:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        source = SyntheticFrameSource(
+            width,
+            height,
+            args.templates,
+            windows=args.windows,
+            hit_rate=args.hit_rate,
+            template_scale=args.plant_scale,
+            copies=args.plant_copies,
+        )
+
+    def log(message, level="info"):
+        if level == "debug" and not args.debug:
+            return
+        print_log(message, level)
+
+    sink = RecordingClickSink()
+    engine = DetectionEngine(source, sink, log=log)
+    engine.templates = [{"name": p, "path": p} for p in args.templates]
+    template_thresholds = dict(item.rsplit("=", 1) for item in args.template_thresholds)
+    for template_info in engine.templates:
+        if template_info["path"] in template_thresholds:
+            template_info["threshold"] = float(template_thresholds[template_info["path"]])
+    engine.threshold = args.threshold
+    engine.match_mode = args.mode
+    engine.pyramid_scale = args.pyramid_scale
+    engine.pyramid_levels = args.pyramid_levels
+    engine.fast_mode = args.fast
+    engine.fast_scale = args.fast_scale
+    engine.scale_search = args.scale_search
+    engine.template_dpi = args.template_dpi
+    engine.workers = args.workers
+    engine.max_hits = max(1, args.max_hits)
+    engine.template_order.sample_after = args.sample_after
+    engine.template_order.sample_every = max(1, args.sample_every)
+    engine.click_pause = args.cooldown if args.async_clicks else 0
+    if args.pack and os.path.exists(args.pack):
+        engine.template_store.load_pack(args.pack, args.pyramid_scale, args.pyramid_levels)
+    engine.template_store.sync(engine.templates)
+    if args.pack and engine.template_store.pack_dirty:
+        engine.template_store.save_pack(args.pack, args.pyramid_scale, args.pyramid_levels)
+    engine.metrics.enabled = bool(args.metrics or args.metrics_file or args.metrics_port)
+    server = MetricsServer(engine.metrics, args.metrics_port) if args.metrics_port else None
+    if args.async_clicks:
+        engine.create_actuator().start()
+    if args.record:
+        engine.recorder = SessionRecorder(args.record, log=log)
+
+    hwnds = [hwnd for hwnd, _ in source.list_windows()]
+    start = time.perf_counter()
+    scheduler = None
+    if args.max_interval is not None:
+        scheduler = PollScheduler(args.interval, args.max_interval)
+    engine.run(hwnds, interval=args.interval, max_cycles=args.cycles, scheduler=scheduler)
+    elapsed = time.perf_counter() - start
+    engine.shutdown()
+    source.close()
+    if server is not None:
+        server.close()
+    if args.metrics_file:
+        engine.metrics.write_textfile(args.metrics_file)
+    if engine.metrics.enabled:
+        for stage, summary in engine.metrics.summary().items():
+            print(
+                f"{STAGE_NAMES.get(stage, stage)}: {summary['count']} 次, "
+                f"平均 {summary['mean'] * 1000:.2f} ms, p50 {summary['p50'] * 1000:.2f} ms, "
+                f"p99 {summary['p99'] * 1000:.2f} ms, 最大 {summary['max'] * 1000:.2f} ms"
+            )
+    if engine.recorder is not None:
+        engine.recorder.close()
+        record_stats = engine.recorder.stats()
+        print(
+            f"录制: {record_stats['frames']} 帧 (丢弃 {record_stats['dropped']}), "
+            f"写入 {record_stats['written_bytes'] / 1048576:.1f} MB, "
+            f"压缩比 {record_stats['ratio']:.1f}x"
+        )
+    if engine.actuator is not None:
+        engine.actuator.stop()
+        action_stats = engine.actuator.stats()
+        print(
+            f"点击队列: 最大深度 {action_stats['max_depth']}, 已执行 {action_stats['executed']}, "
+            f"未执行丢弃 {action_stats['dropped']}, 平均点击耗时 {action_stats['avg_action_ms']:.2f} ms, "
+            f"检测到点击平均 {action_stats['avg_delay_ms']:.2f} ms"
+        )
+
+    stats = engine.template_store.stats()
+    print(f"轮次: {engine.cycles}, 耗时: {elapsed:.3f}s, 每秒轮次: {engine.cycles / elapsed:.2f}")
+    print(
+        f"点击: {engine.clicks} (多处命中 {engine.multi_hits} 次), 模板缓存命中 {stats['hits']}, 未命中 {stats['misses']}, "
+        f"从模板包载入 {stats['pack_loaded']}"
+    )
+    if isinstance(source, DesktopGrabSource):
+        grab_stats = source.stats()
+        print(
+            f"整屏截取: {grab_stats['grabs']} 次, 裁剪窗口 {grab_stats['crops']} 次, "
+            f"回退 {grab_stats['fallbacks']} 次"
+        )
+    if scheduler is not None:
+        sched_stats = scheduler.stats()
+        print(
+            f"调度: 检测 {sched_stats['scans']} 次 (活跃 {sched_stats['active_scans']}), "
+            f"平均间隔 {sched_stats['avg_interval']:.2f}s"
+        )
+    if engine.scale_search:
+        scale_stats = engine.scale_cache.stats()
+        print(
+            f"多尺度: {scale_stats['estimated']}/{scale_stats['windows']} 个窗口已估计比例, "
+            f"估计 {scale_stats['estimates']} 次, 因尺寸或 DPI 变化重新估计 "
+            f"{scale_stats['invalidations']} 次"
+        )
+    order_stats = engine.template_order.stats()
+    print(
+        f"模板顺序: 首个模板命中率 {order_stats['first_hit_rate']:.1%}, "
+        f"每次检测平均匹配 {order_stats['tries_per_scan']:.2f} 个模板, "
+        f"跳过从未命中的模板 {order_stats['sampled_out']} 次"
+    )
+    frame_stats = engine.frame_tracker.stats()
+    print(
+        f"画面未变化: {frame_stats['frames_unchanged']}/{frame_stats['frames_checked']} 帧, "
+        f"局部变化: {frame_stats['frames_partial']} 帧 (平均变化面积 {frame_stats['dirty_area']:.1%}), "
+        f"跳过模板匹配 {frame_stats['templates_skipped']} 次"
+    )
+
+
+if __name__ == "__main__":
+    main()
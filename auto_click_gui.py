@@ -1,22 +1,29 @@
 ﻿import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import cv2
-import numpy as np
-import pyautogui
 from PIL import Image, ImageTk, ImageGrab
+import json
 import time
 import win32gui
-import win32ui
-import win32con
 import win32api
-from ctypes import windll
 import mss
 import threading
-import queue
 import os
-import json
 from datetime import datetime
 
+from auto_click_actuator import PyAutoGuiClickSink
+from auto_click_config import CONFIG_VERSION, ConfigWriter, load_config_file, migrate_config
+from auto_click_capture import DesktopGrabSource, DibSectionProvider, PooledCaptureSource
+from auto_click_engine import DetectionEngine
+from auto_click_logging import LogFileWriter, LogStore, RepeatFilter
+from auto_click_metrics import STAGE_NAMES, MetricsFileWriter, MetricsServer
+from auto_click_scheduler import PollScheduler
+from auto_click_session import SessionRecorder
+from auto_click_templates import TemplateStore
+from auto_click_windows import WindowWatcher
+
+# 窗口列表中监控中窗口的状态文字
+WINDOW_MONITORING = "✅ 监控中"
+
 
 class AutoClickGUI:
     def __init__(self, root):
@@ -29,40 +36,159 @@ class AutoClickGUI:
         self.target_windows = []  # 存储目标窗口句柄
         self.monitoring = False
         self.monitor_thread = None
-        self.log_queue = queue.Queue()
+        # 日志：环形缓冲只保留最近的行，界面每 100ms 批量插入一次
+        self.log_store = LogStore()
+        self.repeat_filter = RepeatFilter()  # 重复的调试消息限流
+        self.log_writer = None  # 配置了 log_file 时在后台写入并轮转日志文件
+        self.log_max_lines = 5000
+        self.log_file = ""
+        self.log_file_max_mb = 10
+        self.log_backups = 3
         self.all_windows = []  # 存储所有窗口信息
+        self.window_items = {}  # hwnd -> 窗口列表中的行
+        self.template_store = TemplateStore()  # 模板缓存，避免每轮重复解码
+        self.poll_scheduler = None  # 开始监控时创建
 
         # 配置文件路径
         self.config_file = "auto_click_config.json"
+        # 配置在后台线程合并写入，避免界面操作时同步写文件
+        self.config_writer = ConfigWriter(self.config_file, log=self.log)
+        # 读取到的完整配置与版本：保存时保留本版本不认识的字段，不降低版本号
+        self.config_extra = {}
+        self.config_version = CONFIG_VERSION
 
         # 配置参数
         self.check_interval = tk.DoubleVar(value=1.0)
+        # 空闲窗口的检查间隔逐渐放宽，最长不超过该值
+        self.max_check_interval = tk.DoubleVar(value=10.0)
         self.match_threshold = tk.DoubleVar(value=0.8)
         self.log_level = tk.StringVar(value="info")
+        # 匹配模式：'full'(全分辨率)、'pyramid'(金字塔由粗到细) 或 'fft'(共享频谱)
+        self.match_mode = tk.StringVar(value="full")
+        self.pyramid_scale = 0.5
+        self.pyramid_levels = 1
+        # 快速模式：单通道截图 + 灰度模板（模板也可单独设置 "fast": true）
+        self.fast_mode = tk.BooleanVar(value=False)
+        # 多尺度匹配：按窗口估计相对模板的缩放比例（显示缩放不同），之后只在该比例上匹配
+        self.scale_search = tk.BooleanVar(value=False)
+        self.template_dpi = 96  # 模板截取时的 DPI
+        self.fast_scale = 1.0
+        # 并行处理的窗口数（1 表示逐个处理）
+        self.parallel_workers = tk.IntVar(value=1)
+        # 一帧中同一模板最多点击的位置数（大于 1 时同时出现的多个按钮一次切换窗口全部点击）
+        self.max_hits = tk.IntVar(value=1)
+        # 截图方式：'window'(逐窗口 PrintWindow) 或 'desktop'(每轮整屏截取一次后裁剪)
+        self.capture_mode = tk.StringVar(value="window")
+        # 各阶段耗时统计；可选导出为 Prometheus 文本文件或本地 HTTP 端口
+        self.metrics_enabled = tk.BooleanVar(value=False)
+        self.metrics_file = ""
+        self.metrics_port = 0
+        self.metrics_server = None
+        self.metrics_file_writer = None
+        # 自动刷新窗口列表（在后台线程枚举，只更新变化的行）
+        self.auto_refresh_windows = tk.BooleanVar(value=False)
+        self.window_refresh_interval = 5.0
+        # 在某窗口中从未命中的模板匹配该次数后，每 template_sample_every 次检测才匹配一次（0 表示不启用）
+        self.template_sample_after = 0
+        self.template_sample_every = 10
+        # 预处理好的模板包，启动时直接载入，模板文件变化后自动重建（为空时不使用）
+        self.template_pack = "auto_click_templates.pack"
         # 每个窗口的点击类型（不持久化）：'拓展'(仅点击) 或 'cli'(点击并回车)
         self.window_click_type = {}
 
+        # 截图来源；整屏截取在首次使用时创建，被遮挡或最小化的窗口回退到逐窗口截图
+        self.window_source = PooledCaptureSource(
+            DibSectionProvider(log=self.log), log=self.log
+        )
+        self.desktop_source = None
+
+        # 检测引擎（截图、匹配、点击与界面分离）
+        self.engine = DetectionEngine(
+            self.window_source,
+            PyAutoGuiClickSink(log=self.log),
+            template_store=self.template_store,
+            log=self.log,
+        )
+
         # 加载配置
         self.load_config()
+        startup_lines = self.log_store.drain()
+        self.log_store = LogStore(self.log_max_lines)
+        for line in startup_lines:
+            self.log_store.append(line)
+        if self.log_file:
+            try:
+                self.log_writer = LogFileWriter(
+                    self.log_file,
+                    max_bytes=int(self.log_file_max_mb * 1024 * 1024),
+                    backup_count=self.log_backups,
+                )
+            except Exception as e:
+                self.log(f"无法打开日志文件: {e}")
 
-        # 初始化默认模板
+        # 从模板包载入预处理好的模板，避免逐个解码图像
+        self.load_template_pack()
+
+        # 初始化默认模板，并预加载配置中的全部模板，使首次启动即可写出完整的模板包
         self.init_default_templates()
+        self.template_store.sync(self.templates)
+        self.save_template_pack()
+
+        # 窗口枚举在后台线程进行，界面只应用变化
+        self.window_watcher = WindowWatcher(self.list_visible_windows, log=self.log)
 
         self.setup_ui()
-        self.refresh_windows()
+        self.on_auto_refresh_toggled()
+        self.window_watcher.start()
+        self.process_window_updates()
         self.update_template_display()  # 显示已加载的模板
         self.process_log_queue()
+        self.on_metrics_toggled()
+        self.update_latency_display()
+        self.check_config_file()
 
     def load_config(self):
         """加载配置文件"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r", encoding="utf-8") as f:
-                    config = json.load(f)
+            loaded = load_config_file(self.config_file)
+            if loaded is not None:
+                config, version, text = loaded
+                if version > CONFIG_VERSION:
+                    self.log(
+                        f"配置文件版本 {version} 高于当前版本 {CONFIG_VERSION}，未知字段保存时原样保留"
+                    )
+                self.config_extra = config
+                self.config_version = max(version, CONFIG_VERSION)
+                # 旧版本的配置需要按新格式重新写入
+                self.config_writer.mark_saved(text if version == CONFIG_VERSION else None)
 
                 # 加载参数
                 self.check_interval.set(config.get("check_interval", 1.0))
+                self.max_check_interval.set(config.get("max_check_interval", 10.0))
                 self.match_threshold.set(config.get("match_threshold", 0.8))
+                self.match_mode.set(config.get("match_mode", "full"))
+                self.pyramid_scale = config.get("pyramid_scale", 0.5)
+                self.pyramid_levels = config.get("pyramid_levels", 1)
+                self.fast_mode.set(config.get("fast_mode", False))
+                self.scale_search.set(config.get("scale_search", False))
+                self.template_dpi = config.get("template_dpi", 96)
+                self.fast_scale = config.get("fast_scale", 1.0)
+                self.parallel_workers.set(config.get("parallel_workers", 1))
+                self.max_hits.set(config.get("max_hits", 1))
+                self.capture_mode.set(config.get("capture_mode", "window"))
+                self.metrics_enabled.set(config.get("metrics_enabled", False))
+                self.metrics_file = config.get("metrics_file", "")
+                self.metrics_port = config.get("metrics_port", 0)
+                self.log_max_lines = config.get("log_max_lines", 5000)
+                self.log_file = config.get("log_file", "")
+                self.log_file_max_mb = config.get("log_file_max_mb", 10)
+                self.log_backups = config.get("log_backups", 3)
+                self.repeat_filter.interval = config.get("log_repeat_interval", 10.0)
+                self.auto_refresh_windows.set(config.get("auto_refresh_windows", False))
+                self.window_refresh_interval = config.get("window_refresh_interval", 5.0)
+                self.template_sample_after = config.get("template_sample_after", 0)
+                self.template_sample_every = config.get("template_sample_every", 10)
+                self.template_pack = config.get("template_pack", "auto_click_templates.pack")
 
                 # 加载模板
                 self.templates = config.get("templates", [])
@@ -80,33 +206,112 @@ class AutoClickGUI:
             self.log("应用默认配置")
             self.set_default_config()
             # 自动保存默认配置
+            self.config_writer.mark_saved(None)
             self.save_config()
 
     def set_default_config(self):
         """设置默认配置"""
         self.check_interval.set(1.0)
+        self.max_check_interval.set(10.0)
         self.match_threshold.set(0.8)
+        self.match_mode.set("full")
+        self.pyramid_scale = 0.5
+        self.pyramid_levels = 1
+        self.fast_mode.set(False)
+        self.scale_search.set(False)
+        self.template_dpi = 96
+        self.fast_scale = 1.0
+        self.parallel_workers.set(1)
+        self.max_hits.set(1)
+        self.capture_mode.set("window")
+        self.metrics_enabled.set(False)
+        self.metrics_file = ""
+        self.metrics_port = 0
+        self.log_max_lines = 5000
+        self.log_file = ""
+        self.log_file_max_mb = 10
+        self.log_backups = 3
+        self.repeat_filter.interval = 10.0
+        self.auto_refresh_windows.set(False)
+        self.window_refresh_interval = 5.0
+        self.template_sample_after = 0
+        self.template_sample_every = 10
+        self.template_pack = "auto_click_templates.pack"
         self.templates = []
         self.target_windows = []
         self.window_click_type = {}
         self.log("已应用默认配置")
 
     def save_config(self):
-        """保存配置文件"""
+        """保存配置文件（在后台线程合并写入）"""
         try:
-            config = {
+            config = dict(self.config_extra)
+            config.update({
+                "version": self.config_version,
                 "check_interval": self.check_interval.get(),
+                "max_check_interval": self.max_check_interval.get(),
                 "match_threshold": self.match_threshold.get(),
+                "match_mode": self.match_mode.get(),
+                "pyramid_scale": self.pyramid_scale,
+                "pyramid_levels": self.pyramid_levels,
+                "fast_mode": self.fast_mode.get(),
+                "scale_search": self.scale_search.get(),
+                "template_dpi": self.template_dpi,
+                "fast_scale": self.fast_scale,
+                "parallel_workers": self.parallel_workers.get(),
+                "max_hits": self.max_hits.get(),
+                "capture_mode": self.capture_mode.get(),
+                "metrics_enabled": self.metrics_enabled.get(),
+                "metrics_file": self.metrics_file,
+                "metrics_port": self.metrics_port,
+                "log_max_lines": self.log_max_lines,
+                "log_file": self.log_file,
+                "log_file_max_mb": self.log_file_max_mb,
+                "log_backups": self.log_backups,
+                "log_repeat_interval": self.repeat_filter.interval,
+                "auto_refresh_windows": self.auto_refresh_windows.get(),
+                "window_refresh_interval": self.window_refresh_interval,
+                "template_sample_after": self.template_sample_after,
+                "template_sample_every": self.template_sample_every,
+                "template_pack": self.template_pack,
                 "templates": self.templates,
-            }
-
-            with open(self.config_file, "w", encoding="utf-8") as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            })
 
-            self.log("配置保存成功")
+            self.config_writer.save(config)
         except Exception as e:
             self.log(f"配置保存失败: {e}")
 
+    def check_config_file(self):
+        """配置文件被其他程序修改（如 auto_click_tuning.py --apply）时采用其中各模板的阈值
+
+        合并后重新保存，界面随后的保存不会覆盖调好的阈值。
+        """
+        try:
+            text = self.config_writer.changed_on_disk()
+            if text is not None:
+                config, version = migrate_config(json.loads(text))
+                self.config_extra = config
+                self.config_version = max(version, self.config_version)
+                thresholds = {t["path"]: t.get("threshold") for t in config.get("templates", [])}
+                updated = 0
+                for template_info in self.templates:
+                    path = template_info["path"]
+                    if path not in thresholds or thresholds[path] == template_info.get("threshold"):
+                        continue
+                    if thresholds[path] is None:
+                        template_info.pop("threshold", None)
+                    else:
+                        template_info["threshold"] = thresholds[path]
+                    updated += 1
+                self.log(f"配置文件已在外部修改，更新了 {updated} 个模板的阈值")
+                if updated:
+                    self.update_template_display()
+                self.save_config()
+        except Exception as e:
+            self.log(f"读取外部修改的配置失败: {e}")
+        finally:
+            self.root.after(2000, self.check_config_file)
+
     def init_default_templates(self):
         """初始化默认模板"""
         default_templates = ["image1.png", "image2.png"]
@@ -118,13 +323,12 @@ class AutoClickGUI:
                 exists = any(t["path"] == template_file for t in self.templates)
                 if not exists:
                     try:
-                        img = cv2.imread(template_file)
-                        if img is not None:
-                            height, width = img.shape[:2]
+                        entry = self.template_store.get(template_file)
+                        if entry is not None:
                             template_info = {
                                 "name": template_file,
                                 "path": template_file,
-                                "size": f"{width}x{height}",
+                                "size": entry.size_text,
                             }
                             self.templates.append(template_info)
                             self.log(f"添加默认模板: {template_file}")
@@ -133,6 +337,37 @@ class AutoClickGUI:
             else:
                 self.log(f"默认模板文件不存在: {template_file}")
 
+    def load_template_pack(self):
+        """从模板包载入源文件未变化的模板"""
+        if not self.template_pack or not os.path.exists(self.template_pack):
+            return
+        try:
+            start = time.perf_counter()
+            loaded = self.template_store.load_pack(
+                self.template_pack, self.pyramid_scale, self.pyramid_levels
+            )
+            self.debug_log(
+                f"模板包: 载入 {loaded} 个模板, 耗时 {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+        except Exception as e:
+            self.log(f"模板包载入失败，将重新解码模板: {e}")
+
+    def save_template_pack(self):
+        """模板有变化时在后台线程重建模板包"""
+        if not self.template_pack or not self.template_store.pack_dirty:
+            return
+
+        def write():
+            try:
+                size = self.template_store.save_pack(
+                    self.template_pack, self.pyramid_scale, self.pyramid_levels
+                )
+                self.debug_log(f"模板包已重建: {size / 1048576:.1f} MB")
+            except Exception as e:
+                self.log(f"模板包保存失败: {e}")
+
+        threading.Thread(target=write, name="template-pack", daemon=True).start()
+
     def update_template_display(self):
         """更新模板列表显示"""
         # 清空现有显示
@@ -148,9 +383,15 @@ class AutoClickGUI:
                     template_info["name"],
                     template_info["path"],
                     template_info["size"],
+                    self.template_threshold_text(template_info),
                 ),
             )
 
+    def template_threshold_text(self, template_info):
+        """模板的阈值显示：单独调过阈值的模板显示其阈值，否则使用全局阈值"""
+        threshold = template_info.get("threshold")
+        return "全局" if threshold is None else f"{threshold:.3f}"
+
     def setup_ui(self):
         """设置用户界面"""
         # 创建主框架
@@ -212,9 +453,9 @@ class AutoClickGUI:
         window_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 5))
 
         # 窗口列表
-        columns = ("hwnd", "title", "status", "type")
+        columns = ("hwnd", "title", "status", "type", "latency")
         self.window_tree = ttk.Treeview(
-            window_frame, columns=columns, show="headings", height=20
+            window_frame, columns=columns, show="headings", height=14
         )
         self.window_tree.heading("hwnd", text="句柄")
         self.window_tree.heading("title", text="窗口标题")
@@ -224,6 +465,8 @@ class AutoClickGUI:
         self.window_tree.column("status", width=80)
         self.window_tree.heading("type", text="Codex类型")
         self.window_tree.column("type", width=100)
+        self.window_tree.heading("latency", text="耗时(ms)")
+        self.window_tree.column("latency", width=70)
 
         # 绑定双击事件
         self.window_tree.bind("<Double-1>", self.on_window_double_click)
@@ -247,8 +490,46 @@ class AutoClickGUI:
         ).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(
             window_btn_frame, text="全部取消监控", command=self.clear_all_monitoring
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(
+            window_btn_frame,
+            text="自动刷新",
+            variable=self.auto_refresh_windows,
+            command=self.on_auto_refresh_toggled,
+        ).pack(side=tk.LEFT)
+
+        # 各阶段耗时统计
+        stats_frame = ttk.LabelFrame(parent, text="耗时统计", padding=10)
+        stats_frame.pack(fill=tk.X, pady=(0, 5))
+
+        stats_control_frame = ttk.Frame(stats_frame)
+        stats_control_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Checkbutton(
+            stats_control_frame,
+            text="启用统计",
+            variable=self.metrics_enabled,
+            command=self.on_metrics_toggled,
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(
+            stats_control_frame, text="重置", command=self.engine.metrics.reset
         ).pack(side=tk.LEFT)
 
+        stats_columns = ("stage", "count", "mean", "p50", "p99", "max")
+        self.stats_tree = ttk.Treeview(
+            stats_frame, columns=stats_columns, show="headings", height=6
+        )
+        for column, text, width in (
+            ("stage", "阶段", 100),
+            ("count", "次数", 70),
+            ("mean", "平均(ms)", 80),
+            ("p50", "p50(ms)", 80),
+            ("p99", "p99(ms)", 80),
+            ("max", "最大(ms)", 80),
+        ):
+            self.stats_tree.heading(column, text=text)
+            self.stats_tree.column(column, width=width)
+        self.stats_tree.pack(fill=tk.X)
+
     def setup_right_panel(self, parent):
         """设置右侧面板"""
         # 模板管理区域
@@ -259,16 +540,18 @@ class AutoClickGUI:
         template_list_frame = ttk.Frame(template_frame)
         template_list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 5))
 
-        columns = ("name", "path", "size")
+        columns = ("name", "path", "size", "threshold")
         self.template_tree = ttk.Treeview(
             template_list_frame, columns=columns, show="headings", height=6
         )
         self.template_tree.heading("name", text="名称")
         self.template_tree.heading("path", text="路径")
         self.template_tree.heading("size", text="尺寸")
+        self.template_tree.heading("threshold", text="阈值")
         self.template_tree.column("name", width=100)
         self.template_tree.column("path", width=200)
         self.template_tree.column("size", width=80)
+        self.template_tree.column("threshold", width=60)
 
         template_scrollbar = ttk.Scrollbar(
             template_list_frame, orient=tk.VERTICAL, command=self.template_tree.yview
@@ -332,6 +615,82 @@ class AutoClickGUI:
 
         self.match_threshold.trace("w", update_threshold_label)
 
+        # 匹配模式
+        ttk.Label(config_frame, text="匹配模式:").grid(
+            row=2, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0)
+        )
+        mode_frame = ttk.Frame(config_frame)
+        mode_frame.grid(row=2, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Radiobutton(
+            mode_frame, text="全分辨率", variable=self.match_mode, value="full"
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Radiobutton(
+            mode_frame, text="金字塔", variable=self.match_mode, value="pyramid"
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Radiobutton(
+            mode_frame, text="共享FFT", variable=self.match_mode, value="fft"
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(
+            mode_frame, text="快速模式(灰度)", variable=self.fast_mode
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(
+            mode_frame, text="多尺度", variable=self.scale_search
+        ).pack(side=tk.LEFT)
+
+        # 并行窗口数
+        ttk.Label(config_frame, text="并行窗口数:").grid(
+            row=3, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0)
+        )
+        workers_frame = ttk.Frame(config_frame)
+        workers_frame.grid(row=3, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=16,
+            textvariable=self.parallel_workers,
+            width=5,
+        ).pack(side=tk.LEFT, padx=(0, 10))
+
+        # 每帧最多点击的位置数
+        ttk.Label(workers_frame, text="每帧最多点击:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=20,
+            textvariable=self.max_hits,
+            width=5,
+        ).pack(side=tk.LEFT)
+
+        # 空闲窗口的最长检查间隔
+        ttk.Label(config_frame, text="最长检查间隔(秒):").grid(
+            row=4, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0)
+        )
+        ttk.Scale(
+            config_frame,
+            from_=1.0,
+            to=60.0,
+            variable=self.max_check_interval,
+            orient=tk.HORIZONTAL,
+            length=200,
+            command=lambda v: self.max_check_interval.set(round(float(v))),
+        ).grid(row=4, column=1, padx=(0, 5), pady=(5, 0))
+        ttk.Label(config_frame, textvariable=self.max_check_interval).grid(
+            row=4, column=2, pady=(5, 0)
+        )
+
+        # 截图方式
+        ttk.Label(config_frame, text="截图方式:").grid(
+            row=5, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0)
+        )
+        capture_frame = ttk.Frame(config_frame)
+        capture_frame.grid(row=5, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Radiobutton(
+            capture_frame, text="逐窗口", variable=self.capture_mode, value="window"
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Radiobutton(
+            capture_frame, text="整屏截取", variable=self.capture_mode, value="desktop"
+        ).pack(side=tk.LEFT)
+
         # 控制按钮区域
         control_frame = ttk.LabelFrame(parent, text="监控控制", padding=10)
         control_frame.pack(fill=tk.X, pady=(0, 5))
@@ -350,9 +709,14 @@ class AutoClickGUI:
         self.stop_btn.pack(side=tk.LEFT, padx=(0, 5))
 
         ttk.Button(control_frame, text="保存配置", command=self.save_config).pack(
-            side=tk.LEFT
+            side=tk.LEFT, padx=(0, 5)
         )
 
+        self.record_btn = ttk.Button(
+            control_frame, text="开始录制", command=self.toggle_recording
+        )
+        self.record_btn.pack(side=tk.LEFT)
+
     def setup_status_bar(self):
         """设置状态栏"""
         self.status_frame = ttk.Frame(self.root)
@@ -366,6 +730,10 @@ class AutoClickGUI:
         )
         self.monitor_status_label.pack(side=tk.RIGHT, padx=10, pady=5)
 
+        # 点击队列深度与检测到点击的延迟
+        self.action_status_label = ttk.Label(self.status_frame, text="")
+        self.action_status_label.pack(side=tk.RIGHT, padx=10, pady=5)
+
     def log(self, message, level="info"):
         """添加日志消息"""
         # 检查是否应该显示此级别的消息
@@ -373,9 +741,20 @@ class AutoClickGUI:
         if level == "debug" and current_level == "info":
             return  # info模式不显示debug消息
 
+        if level == "debug":
+            # 同一调试消息（如每轮的未匹配提示）在间隔内只显示一次
+            emit, suppressed = self.repeat_filter.check(message)
+            if not emit:
+                return
+            if suppressed:
+                message = f"{message} (省略 {suppressed} 条重复)"
+
         timestamp = datetime.now().strftime("%H:%M:%S")
         level_prefix = "[DEBUG]" if level == "debug" else "[INFO]"
-        self.log_queue.put(f"[{timestamp}] {level_prefix} {message}")
+        line = f"[{timestamp}] {level_prefix} {message}"
+        self.log_store.append(line)
+        if self.log_writer is not None:
+            self.log_writer.write(line)
 
     def debug_log(self, message):
         """添加调试日志"""
@@ -386,49 +765,168 @@ class AutoClickGUI:
         self.log(message, "info")
 
     def process_log_queue(self):
-        """处理日志队列"""
+        """将新日志一次性插入文本框，并删除超出行数上限的旧行"""
         try:
-            while True:
-                message = self.log_queue.get_nowait()
-                self.log_text.insert(tk.END, message + "\n")
+            batch = self.log_store.drain()
+            if batch:
+                self.log_text.insert(tk.END, "\n".join(batch) + "\n")
+                line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                excess = line_count - self.log_store.max_lines
+                if excess > 0:
+                    self.log_text.delete("1.0", f"{excess + 1}.0")
                 self.log_text.see(tk.END)
-        except queue.Empty:
+        except Exception:
             pass
         finally:
             self.root.after(100, self.process_log_queue)
 
-    def refresh_windows(self):
-        """刷新窗口列表"""
-        # 清空当前列表
-        for item in self.window_tree.get_children():
-            self.window_tree.delete(item)
+    def update_latency_display(self):
+        """在窗口列表中显示各监控窗口最近一轮的截图加匹配耗时，并在状态栏显示点击队列"""
+        try:
+            latency = dict(self.engine.window_latency)
+            for hwnd in self.target_windows:
+                item = self.window_items.get(hwnd)
+                if item is not None and hwnd in latency:
+                    self.window_tree.set(item, "latency", f"{latency[hwnd] * 1000:.0f}")
+            if self.engine.metrics.enabled:
+                self.update_stats_panel()
+            if self.engine.actuator is not None:
+                action_stats = self.engine.actuator.stats()
+                self.action_status_label.config(
+                    text=f"点击队列: {action_stats['queue_depth']}  "
+                    f"检测到点击: {action_stats['last_delay_ms']:.0f} ms"
+                )
+        except Exception:
+            pass
+        finally:
+            self.root.after(1000, self.update_latency_display)
+
+    def update_stats_panel(self):
+        """刷新耗时统计表（文本文件由 MetricsFileWriter 在后台导出）"""
+        summary = self.engine.metrics.summary()
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for stage, name in STAGE_NAMES.items():
+            if stage not in summary:
+                continue
+            stats = summary[stage]
+            self.stats_tree.insert(
+                "",
+                tk.END,
+                values=(
+                    name,
+                    stats["count"],
+                    f"{stats['mean'] * 1000:.1f}",
+                    f"{stats['p50'] * 1000:.1f}",
+                    f"{stats['p99'] * 1000:.1f}",
+                    f"{stats['max'] * 1000:.1f}",
+                ),
+            )
+
+    def on_metrics_toggled(self):
+        """启用或关闭耗时统计；配置了端口或文本文件时同时启停 /metrics 服务和文件导出"""
+        enabled = self.metrics_enabled.get()
+        self.engine.metrics.enabled = enabled
+        if enabled and self.metrics_port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.engine.metrics, self.metrics_port)
+                self.log(f"统计数据: http://127.0.0.1:{self.metrics_server.port}/metrics")
+            except Exception as e:
+                self.log(f"统计服务启动失败: {e}")
+        elif not enabled and self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if enabled and self.metrics_file and self.metrics_file_writer is None:
+            self.metrics_file_writer = MetricsFileWriter(
+                self.engine.metrics, self.metrics_file, log=self.log
+            )
+        elif not enabled and self.metrics_file_writer is not None:
+            self.metrics_file_writer.close()
+            self.metrics_file_writer = None
 
-        # 获取所有窗口
-        self.all_windows = self.list_visible_windows()
+    def refresh_windows(self):
+        """刷新窗口列表（在后台线程枚举，结果由 process_window_updates 应用）"""
+        self.window_watcher.refresh()
 
-        # 分类：监控中的窗口 与 其他窗口
-        monitored_windows = []
-        other_windows = []
+    def on_auto_refresh_toggled(self):
+        """开启自动刷新时按 window_refresh_interval 定期枚举窗口"""
+        self.window_watcher.interval = (
+            self.window_refresh_interval if self.auto_refresh_windows.get() else 0.0
+        )
+        self.window_watcher.refresh()
 
-        for hwnd, title in self.all_windows:
+    def process_window_updates(self):
+        """每 200ms 取出后台枚举的结果并应用到窗口列表"""
+        try:
+            for diff in self.window_watcher.poll():
+                self.apply_window_diff(diff)
+        except Exception as e:
+            self.log(f"更新窗口列表失败: {e}")
+        finally:
+            self.root.after(200, self.process_window_updates)
+
+    def apply_window_diff(self, diff):
+        """只插入新窗口、删除已关闭的窗口、更新标题变化的行"""
+        closed_targets = []
+        for hwnd in diff.removed:
+            item = self.window_items.pop(hwnd, None)
+            if item is not None:
+                self.window_tree.delete(item)
             if hwnd in self.target_windows:
-                monitored_windows.append((hwnd, title))
-            else:
-                other_windows.append((hwnd, title))
-
-        # 先插入监控中的窗口
-        # 先插入监控中的窗口
-        for hwnd, title in monitored_windows:
-            self.window_tree.insert(
-                "", tk.END, values=(hwnd, title, "? 监控中", self.window_click_type.get(hwnd, "拓展")), tags=("monitoring",)
+                closed_targets.append(hwnd)
+        for hwnd, title in diff.renamed:
+            item = self.window_items.get(hwnd)
+            if item is not None:
+                self.window_tree.set(item, "title", title)
+        for hwnd, title in diff.added:
+            monitored = hwnd in self.target_windows
+            self.window_items[hwnd] = self.window_tree.insert(
+                "",
+                tk.END,
+                values=(
+                    hwnd,
+                    title,
+                    WINDOW_MONITORING if monitored else "",
+                    self.window_click_type.get(hwnd, "拓展"),
+                ),
+                tags=("monitoring" if monitored else "normal",),
             )
 
-        # 再插入其他窗口
-        for hwnd, title in other_windows:
-            self.window_tree.insert(
-                "", tk.END, values=(hwnd, title, "", self.window_click_type.get(hwnd, "拓展")), tags=("normal",)
+        # 已关闭的窗口不再监控
+        for hwnd in closed_targets:
+            self.target_windows.remove(hwnd)
+            self.forget_window(hwnd)
+            self.log(f"窗口已关闭，停止监控: {hwnd}")
+
+        self.all_windows = list(self.window_watcher.snapshot.items())
+        if diff.added or diff.renamed:
+            self.sort_windows()
+        if diff.manual:
+            monitored = sum(1 for hwnd in self.target_windows if hwnd in self.window_items)
+            self.log(f"刷新窗口列表，找到 {diff.total} 个窗口，其中 {monitored} 个在监控")
+        elif diff:
+            self.debug_log(
+                f"窗口列表变化: 新增 {len(diff.added)}, 关闭 {len(diff.removed)}, "
+                f"标题变化 {len(diff.renamed)}"
             )
-        self.log(f"刷新窗口列表，找到 {len(self.all_windows)} 个窗口，其中 {len(monitored_windows)} 个在监控")
+
+    def forget_window(self, hwnd):
+        """清除窗口在检测引擎和截图来源中的缓存"""
+        self.engine.roi_cache.forget(hwnd)
+        self.engine.frame_tracker.forget(hwnd)
+        self.engine.template_order.forget(hwnd)
+        self.engine.scale_cache.forget(hwnd)
+        self.window_source.forget(hwnd)
+        if self.desktop_source is not None:
+            self.desktop_source.forget(hwnd)
+
+    def set_window_monitoring(self, hwnd, monitored):
+        """更新窗口行的监控状态"""
+        item = self.window_items.get(hwnd)
+        if item is None:
+            return
+        self.window_tree.set(item, "status", WINDOW_MONITORING if monitored else "")
+        self.window_tree.item(item, tags=("monitoring" if monitored else "normal",))
+
     def on_window_double_click(self, event):
         """窗口列表双击事件"""
         selection = self.window_tree.selection()
@@ -439,7 +937,7 @@ class AutoClickGUI:
         values = item["values"]
         # 兼容三列/四列
         if len(values) >= 4:
-            hwnd, title, status, current_type = values
+            hwnd, title, status, current_type = values[:4]
         else:
             hwnd, title, status = values
             current_type = self.window_click_type.get(int(hwnd), "拓展")
@@ -448,9 +946,8 @@ class AutoClickGUI:
         if hwnd in self.target_windows:
             # 取消监控
             self.target_windows.remove(hwnd)
-            self.window_tree.item(
-                selection[0], values=(hwnd, title, "", self.window_click_type.get(hwnd, "拓展")), tags=("normal",)
-            )
+            self.forget_window(hwnd)
+            self.set_window_monitoring(hwnd, False)
             self.log(f"取消监控窗口: {title}")
 
             # 自动保存配置（不包含窗口与点击类型）
@@ -460,9 +957,8 @@ class AutoClickGUI:
             self.target_windows.append(hwnd)
             # 默认点击类型：拓展（仅点击）
             self.window_click_type[hwnd] = self.window_click_type.get(hwnd, "拓展")
-            self.window_tree.item(
-                selection[0], values=(hwnd, title, "✅ 监控中", self.window_click_type[hwnd]), tags=("monitoring",)
-            )
+            self.window_tree.set(selection[0], "type", self.window_click_type[hwnd])
+            self.set_window_monitoring(hwnd, True)
             self.log(f"添加监控窗口: {title}")
 
             # 自动保存配置（不包含窗口与点击类型）
@@ -470,25 +966,25 @@ class AutoClickGUI:
 
         # 重新排序，将监控在前面
         self.sort_windows()
-    def sort_windows(self):
-        """排序窗口，监控的在前面"""
-        # 获取所有项目
-        all_items = []
-        for item in self.window_tree.get_children():
-            values = self.window_tree.item(item)["values"]
-            tags = self.window_tree.item(item)["tags"]
-            all_items.append((values, tags))
-
-        # 清空列表
-        for item in self.window_tree.get_children():
-            self.window_tree.delete(item)
 
-        # 排序：监控的在前面
-        all_items.sort(key=lambda x: (0 if x[0][2] == "✓ 监控中" else 1, x[0][1]))
-
-        # 重新插入
-        for values, tags in all_items:
-            self.window_tree.insert("", tk.END, values=values, tags=tags)
+    def sort_windows(self):
+        """排序窗口，监控的在前面（移动已有的行，不重建列表）
+
+        按 set_window_monitoring 设置的 monitoring 标签判断，不比较状态列的显示文字。
+        """
+        items = list(self.window_tree.get_children())
+        order = sorted(
+            items,
+            key=lambda item: (
+                0 if "monitoring" in self.window_tree.item(item, "tags") else 1,
+                self.window_tree.set(item, "title"),
+            ),
+        )
+        for index, item in enumerate(order):
+            if items[index] != item:
+                self.window_tree.move(item, "", index)
+                items.remove(item)
+                items.insert(index, item)
 
     def on_window_tree_click(self, event):
         """点击窗口列表，若点击到type列，弹出下拉选择类型"""
@@ -560,8 +1056,11 @@ class AutoClickGUI:
             "确认", f"确定要取消监控所有 {len(self.target_windows)} 个窗口吗？"
         )
         if result:
+            for hwnd in self.target_windows:
+                self.forget_window(hwnd)
+                self.set_window_monitoring(hwnd, False)
             self.target_windows.clear()
-            self.refresh_windows()
+            self.sort_windows()
             self.log("已取消所有窗口的监控")
 
             # 自动保存配置
@@ -595,13 +1094,12 @@ class AutoClickGUI:
 
         for file_path in file_paths:
             try:
-                # 加载图像获取尺寸
-                img = cv2.imread(file_path)
-                if img is None:
+                # 加载图像获取尺寸（同时写入模板缓存）
+                entry = self.template_store.get(file_path)
+                if entry is None:
                     self.log(f"无法加载图像文件: {file_path}")
                     continue
 
-                height, width = img.shape[:2]
                 name = os.path.basename(file_path)
 
                 # 检查是否已存在
@@ -614,12 +1112,19 @@ class AutoClickGUI:
                 template_info = {
                     "name": name,
                     "path": file_path,
-                    "size": f"{width}x{height}",
+                    "size": entry.size_text,
                 }
 
                 self.templates.append(template_info)
                 self.template_tree.insert(
-                    "", tk.END, values=(name, file_path, f"{width}x{height}")
+                    "",
+                    tk.END,
+                    values=(
+                        name,
+                        file_path,
+                        entry.size_text,
+                        self.template_threshold_text(template_info),
+                    ),
                 )
                 self.log(f"添加模板: {name}")
                 added_count += 1
@@ -629,6 +1134,7 @@ class AutoClickGUI:
 
         if added_count > 0:
             self.log(f"成功添加 {added_count} 个模板")
+            self.save_template_pack()
             # 自动保存配置
             self.save_config()
         else:
@@ -646,6 +1152,8 @@ class AutoClickGUI:
 
         del self.templates[index]
         self.template_tree.delete(selection[0])
+        self.template_store.sync(self.templates)
+        self.save_template_pack()
         self.log(f"删除模板: {template_info['name']}")
 
         # 自动保存配置
@@ -691,6 +1199,39 @@ class AutoClickGUI:
             messagebox.showwarning("警告", "请先添加模板图像")
             return
 
+        # 预加载模板，监控循环中不再读取磁盘
+        self.template_store.sync(self.templates)
+        self.save_template_pack()
+
+        self.engine.templates = self.templates
+        for template_info in self.templates:
+            if "threshold" in template_info:
+                self.log(
+                    f"模板 '{template_info['name']}' 使用单独阈值 {template_info['threshold']:.3f}"
+                )
+        self.engine.click_type = self.window_click_type
+        self.engine.pyramid_scale = self.pyramid_scale
+        self.engine.pyramid_levels = self.pyramid_levels
+        self.engine.fast_scale = self.fast_scale
+        self.engine.template_dpi = self.template_dpi
+        self.engine.template_order.sample_after = self.template_sample_after
+        self.engine.template_order.sample_every = max(1, self.template_sample_every)
+        self.engine.running = True
+        self.engine.source = self.window_source
+        if self.capture_mode.get() == "desktop":
+            try:
+                if self.desktop_source is None:
+                    self.desktop_source = DesktopGrabSource(
+                        fallback=self.window_source, log=self.log
+                    )
+                self.engine.source = self.desktop_source
+            except Exception as e:
+                self.log(f"整屏截取不可用，改用逐窗口截图: {e}")
+        # 点击在独立线程执行，只有被点击的窗口进入冷却，其余窗口继续检测
+        self.engine.create_actuator().start()
+        # 每个窗口独立安排检测时间
+        self.poll_scheduler = PollScheduler()
+
         self.monitoring = True
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
@@ -705,152 +1246,151 @@ class AutoClickGUI:
     def stop_monitoring(self):
         """停止监控"""
         self.monitoring = False
+        self.engine.running = False
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.monitor_status_label.config(text="已停止", foreground="red")
 
+        stats = self.template_store.stats()
+        self.debug_log(
+            f"模板缓存: {stats['entries']} 个模板, 命中 {stats['hits']}, 未命中 {stats['misses']}"
+        )
+        if self.desktop_source is not None:
+            grab_stats = self.desktop_source.stats()
+            self.debug_log(
+                f"整屏截取: {grab_stats['grabs']} 次, 裁剪窗口 {grab_stats['crops']} 次, "
+                f"回退逐窗口截图 {grab_stats['fallbacks']} 次"
+            )
+        capture_stats = self.window_source.stats()
+        self.debug_log(
+            f"截图: {capture_stats['frames']} 帧, 缓冲区分配 {capture_stats['allocations']} 次 "
+            f"({capture_stats['allocated_bytes'] / 1048576:.1f} MB), "
+            f"每帧复制 {capture_stats['bytes_copied_per_frame'] / 1048576:.2f} MB"
+        )
+        if self.poll_scheduler is not None:
+            sched_stats = self.poll_scheduler.stats()
+            self.debug_log(
+                f"调度: 检测 {sched_stats['scans']} 次 (活跃 {sched_stats['active_scans']}), "
+                f"平均间隔 {sched_stats['avg_interval']:.2f}s"
+            )
+        frame_stats = self.engine.frame_tracker.stats()
+        self.debug_log(
+            f"画面未变化: {frame_stats['frames_unchanged']}/{frame_stats['frames_checked']} 帧, "
+            f"局部变化: {frame_stats['frames_partial']} 帧, "
+            f"跳过模板匹配 {frame_stats['templates_skipped']} 次"
+        )
+        if self.scale_search.get():
+            scale_stats = self.engine.scale_cache.stats()
+            self.debug_log(
+                f"多尺度: {scale_stats['estimated']}/{scale_stats['windows']} 个窗口已估计比例, "
+                f"因尺寸或 DPI 变化重新估计 {scale_stats['invalidations']} 次"
+            )
+        order_stats = self.engine.template_order.stats()
+        self.debug_log(
+            f"模板顺序: 首个模板命中率 {order_stats['first_hit_rate']:.1%}, "
+            f"每次检测平均匹配 {order_stats['tries_per_scan']:.2f} 个模板, "
+            f"跳过从未命中的模板 {order_stats['sampled_out']} 次"
+        )
+        for hwnd in self.target_windows:
+            entries = self.engine.template_order.window_stats(hwnd)
+            if entries:
+                self.debug_log(
+                    f"窗口 {hwnd} 模板顺序: "
+                    + ", ".join(
+                        f"{os.path.basename(path)} (命中 {hits}/{tries}, 得分 {score:.2f})"
+                        for path, score, tries, hits in entries
+                    )
+                )
+        if self.engine.actuator is not None:
+            self.engine.actuator.stop()
+            action_stats = self.engine.actuator.stats()
+            self.debug_log(
+                f"点击: 已执行 {action_stats['executed']}, 最大队列深度 {action_stats['max_depth']}, "
+                f"平均点击耗时 {action_stats['avg_action_ms']:.0f} ms, "
+                f"检测到点击平均 {action_stats['avg_delay_ms']:.0f} ms"
+            )
         self.log("停止监控")
 
     def monitor_loop(self):
-        """监控循环"""
+        """监控循环：只检测已到期的窗口，活跃窗口按检查间隔检测，空闲窗口逐渐放宽"""
+        scheduler = self.poll_scheduler
+        metrics = self.engine.metrics
         while self.monitoring:
             try:
-                for hwnd in list(self.target_windows):
-                    if not self.monitoring:
-                        break
-                    try:
-                        window_title = win32gui.GetWindowText(hwnd)
-                    except:
-                        continue
-                    screen = self.capture_window(hwnd)
-                    if screen is None:
-                        self.debug_log(f"窗口截图失败: {window_title}")
-                        continue
-                    self.debug_log(f"成功获取画面: {window_title}, 大小: {screen.shape}")
-                    for template_info in self.templates:
-                        if not self.monitoring:
-                            break
-                        found, x, y = self.find_template(screen, template_info["path"], self.match_threshold.get())
-                        if found:
-                            self.log(f"在窗口 '{window_title}' 找到模板 '{template_info['name']}'")
-                            self.bring_window_to_front(hwnd)
-                            rect = win32gui.GetWindowRect(hwnd)
-                            screen_x = rect[0] + x
-                            screen_y = rect[1] + y
-                            pyautogui.moveTo(screen_x, screen_y)
-                            pyautogui.click()
-                            if self.window_click_type.get(hwnd, "拓展") == "cli":
-                                time.sleep(0.05)
-                                pyautogui.press("enter")
-                                self.debug_log("已在点击后发送回车")
-                            self.log(f"点击位置: ({screen_x}, {screen_y})")
-                            time.sleep(1)
-                            break
-                        else:
-                            self.debug_log(f"模板 '{template_info['name']}' 未匹配")
-                time.sleep(self.check_interval.get())
+                self.engine.threshold = self.match_threshold.get()
+                self.engine.match_mode = self.match_mode.get()
+                self.engine.fast_mode = self.fast_mode.get()
+                self.engine.scale_search = self.scale_search.get()
+                self.engine.workers = max(1, self.parallel_workers.get())
+                self.engine.max_hits = max(1, self.max_hits.get())
+                scheduler.min_interval = self.check_interval.get()
+                scheduler.max_interval = max(
+                    scheduler.min_interval, self.max_check_interval.get()
+                )
+                wait = self.engine.run_scheduled_cycle(
+                    scheduler, list(self.target_windows)
+                )
+                # 最多等待 0.2 秒，及时响应新加入的窗口和停止操作
+                with metrics.time("sleep"):
+                    time.sleep(min(wait if wait is not None else 0.2, 0.2))
             except Exception as e:
                 self.log(f"监控异常: {e}")
-    def capture_window(self, hwnd):
-        """截取窗口（基础PrintWindow方法）"""
-        try:
-            windll.user32.SetProcessDPIAware()
-
-            # 获取窗口尺寸
-            rect = win32gui.GetWindowRect(hwnd)
-            x, y, x1, y1 = rect
-            width = x1 - x
-            height = y1 - y
-
-            if width <= 0 or height <= 0:
-                return None
-
-            # 执行截图
-            hwndDC = win32gui.GetWindowDC(hwnd)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-            saveDC.SelectObject(saveBitMap)
-
-            result = windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 3)
-
-            if result:
-                bmpinfo = saveBitMap.GetInfo()
-                bmpstr = saveBitMap.GetBitmapBits(True)
-                img = Image.frombuffer(
-                    "RGB",
-                    (bmpinfo["bmWidth"], bmpinfo["bmHeight"]),
-                    bmpstr,
-                    "raw",
-                    "BGRX",
-                    0,
-                    1,
-                )
-                img_np = np.array(img)
-                img_bgr = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-            else:
-                img_bgr = None
-
-            # 清理资源
-            win32gui.DeleteObject(saveBitMap.GetHandle())
-            saveDC.DeleteDC()
-            mfcDC.DeleteDC()
-            win32gui.ReleaseDC(hwnd, hwndDC)
 
-            return img_bgr
-
-        except Exception as e:
-            self.log(f"截图失败: {e}")
-            return None
-
-    def find_template(self, screen, template_path, threshold):
-        """查找模板"""
-        try:
-            template = cv2.imread(template_path)
-            if template is None:
-                return False, 0, 0
-
-            screen_h, screen_w = screen.shape[:2]
-            template_h, template_w = template.shape[:2]
-
-            if template_h > screen_h or template_w > screen_w:
-                return False, 0, 0
-
-            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-            if max_val >= threshold:
-                center_x = max_loc[0] + template_w // 2
-                center_y = max_loc[1] + template_h // 2
-                return True, center_x, center_y
-
-            return False, 0, 0
-
-        except Exception as e:
-            self.log(f"模板匹配错误: {e}")
-            return False, 0, 0
+    def toggle_recording(self):
+        """开始或停止将截图录制到会话文件，供离线回放和压测"""
+        if self.engine.recorder is None:
+            path = filedialog.asksaveasfilename(
+                title="保存录制文件",
+                defaultextension=".acs",
+                filetypes=[("会话录制", "*.acs"), ("所有文件", "*.*")],
+            )
+            if not path:
+                return
+            try:
+                self.engine.recorder = SessionRecorder(path, log=self.log)
+            except Exception as e:
+                messagebox.showerror("错误", f"无法创建录制文件: {e}")
+                return
+            self.record_btn.config(text="停止录制")
+            self.log(f"开始录制: {path}")
+        else:
+            self.stop_recording()
 
-    def bring_window_to_front(self, hwnd):
-        """将窗口切换到前台"""
-        try:
-            if win32gui.IsIconic(hwnd):
-                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-            win32gui.SetForegroundWindow(hwnd)
-            win32gui.SetActiveWindow(hwnd)
-            time.sleep(0.2)
-        except Exception as e:
-            self.log(f"切换窗口失败: {e}")
+    def stop_recording(self):
+        recorder = self.engine.recorder
+        if recorder is None:
+            return
+        self.engine.recorder = None
+        recorder.close()
+        stats = recorder.stats()
+        self.record_btn.config(text="开始录制")
+        self.log(
+            f"录制结束: {stats['frames']} 帧 (丢弃 {stats['dropped']}), "
+            f"{stats['written_bytes'] / 1048576:.1f} MB, 压缩比 {stats['ratio']:.1f}x"
+        )
 
     def clear_log(self):
         """清除日志"""
         self.log_text.delete(1.0, tk.END)
+        self.log_store.clear()
 
     def on_closing(self):
         """关闭程序时的处理"""
         if self.monitoring:
             self.stop_monitoring()
+        self.engine.shutdown()
+        self.stop_recording()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.metrics_file_writer is not None:
+            self.metrics_file_writer.close()
+        if self.log_writer is not None:
+            self.log_writer.close()
+        self.window_watcher.close()
+        self.config_writer.close()
+        self.window_source.close()
+        if self.desktop_source is not None:
+            self.desktop_source.close()
         self.root.destroy()
 
 
@@ -0,0 +1,88 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueListener, RotatingFileHandler
+
+
+class LogStore:
+    """日志环形缓冲：只保留最近 max_lines 行，界面每次取出新增的一批"""
+
+    def __init__(self, max_lines=5000):
+        self.max_lines = max_lines
+        self._lines = deque(maxlen=max_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self.dropped = 0  # 界面来不及显示就已超出上限的行数
+
+    def append(self, line):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(line)
+            self._lines.append(line)
+
+    def drain(self):
+        """取出尚未显示的行"""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        return batch
+
+    def lines(self):
+        with self._lock:
+            return list(self._lines)
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
+            self._pending.clear()
+
+
+class RepeatFilter:
+    """相同消息在 interval 秒内只输出一次，再次输出时附带被省略的次数"""
+
+    def __init__(self, interval=10.0, max_entries=1000):
+        self.interval = interval
+        self.max_entries = max_entries
+        self._seen = {}  # 消息 -> [上次输出时间, 之后被省略的次数]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def check(self, message, now=None):
+        """返回 (是否输出, 上次输出后被省略的次数)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._seen.get(message)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                self.suppressed += 1
+                return False, 0
+            if len(self._seen) >= self.max_entries:
+                self._seen = {
+                    m: e for m, e in self._seen.items() if now - e[0] < self.interval
+                }
+            self._seen[message] = [now, 0]
+            return True, entry[1] if entry is not None else 0
+
+
+class LogFileWriter:
+    """在后台线程把日志写入文件，超过 max_bytes 时轮转，保留 backup_count 个旧文件"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=3):
+        self.path = path
+        self._handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.Queue()
+        self._listener = QueueListener(self._queue, self._handler)
+        self._listener.start()
+
+    def write(self, line):
+        self._queue.put_nowait(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
+
+    def close(self):
+        self._listener.stop()
+        self._handler.close()
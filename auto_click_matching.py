@@ -0,0 +1,427 @@
+import math
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+MIN_PYRAMID_TEMPLATE_SIZE = 6  # 缩放后模板的最小边长，过小则减少层数
+
+
+def best_match(screen, template):
+    """全分辨率 NCC 匹配，返回 (最高分, 左上角坐标)"""
+    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def find_peaks(result, count, min_score, suppress_w, suppress_h):
+    """在结果图中依次取最高峰，并抑制峰值邻域"""
+    result = result.copy()
+    peaks = []
+    for _ in range(count):
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < min_score:
+            break
+        peaks.append((max_val, max_loc))
+        x, y = max_loc
+        x0 = max(0, x - suppress_w // 2)
+        y0 = max(0, y - suppress_h // 2)
+        result[y0 : y + suppress_h // 2 + 1, x0 : x + suppress_w // 2 + 1] = -1
+    return peaks
+
+
+def match_peaks(screen, template, threshold, max_hits):
+    """全分辨率匹配，返回所有不低于阈值的峰值 [(分数, 左上角坐标), ...]，按分数从高到低最多 max_hits 个
+
+    非极大值抑制：与已选位置重叠（两个方向的距离都小于模板尺寸）的位置不再选取。
+    """
+    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+    template_h, template_w = template.shape[:2]
+    return find_peaks(result, max_hits, threshold, 2 * template_w - 1, 2 * template_h - 1)
+
+
+def build_pyramid(image, scale, levels):
+    """构建图像金字塔，第 0 层为原图"""
+    pyramid = [image]
+    height, width = image.shape[:2]
+    for level in range(1, levels + 1):
+        factor = scale**level
+        size = (max(1, round(width * factor)), max(1, round(height * factor)))
+        pyramid.append(cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+    return pyramid
+
+
+def usable_levels(template_shape, scale, levels):
+    """模板缩放后仍不小于最小尺寸的层数"""
+    height, width = template_shape[:2]
+    while levels > 0 and min(height, width) * scale**levels < MIN_PYRAMID_TEMPLATE_SIZE:
+        levels -= 1
+    return levels
+
+
+def refine_match(screen, template, x, y, radius):
+    """仅在 (x, y) 附近半径 radius 的区域内做 NCC，返回 (分数, 左上角坐标)"""
+    screen_h, screen_w = screen.shape[:2]
+    template_h, template_w = template.shape[:2]
+    x0 = max(0, x - radius)
+    y0 = max(0, y - radius)
+    x1 = min(screen_w, x + radius + template_w)
+    y1 = min(screen_h, y + radius + template_h)
+    if x1 - x0 < template_w or y1 - y0 < template_h:
+        return -1.0, (x, y)
+    max_val, (dx, dy) = best_match(screen[y0:y1, x0:x1], template)
+    return max_val, (x0 + dx, y0 + dy)
+
+
+def pyramid_match(
+    screen,
+    template_pyramid,
+    threshold,
+    scale=0.5,
+    levels=1,
+    candidates=5,
+    margin=0.2,
+):
+    """由粗到细的金字塔匹配
+
+    在最顶层对缩小后的画面做完整匹配得到候选峰值，再逐层回到原分辨率，
+    每层只在候选点附近的小邻域内复核。返回 (最高分, 左上角坐标)。
+    """
+    levels = min(levels, len(template_pyramid) - 1)
+    levels = usable_levels(template_pyramid[0].shape, scale, levels)
+    if levels == 0:
+        return best_match(screen, template_pyramid[0])
+
+    screen_pyramid = build_pyramid(screen, scale, levels)
+    top_screen = screen_pyramid[levels]
+    top_template = template_pyramid[levels]
+    if (
+        top_template.shape[0] > top_screen.shape[0]
+        or top_template.shape[1] > top_screen.shape[1]
+    ):
+        return best_match(screen, template_pyramid[0])
+
+    # 顶层：完整搜索，阈值放宽以免漏掉候选
+    coarse_threshold = threshold - margin
+    result = cv2.matchTemplate(top_screen, top_template, cv2.TM_CCOEFF_NORMED)
+    peaks = find_peaks(
+        result, candidates, coarse_threshold, top_template.shape[1], top_template.shape[0]
+    )
+
+    # 逐层回到原分辨率，只在邻域内复核
+    radius = math.ceil(1 / scale) + 1
+    best = (-1.0, (0, 0))
+    for _, (x, y) in peaks:
+        score = -1.0
+        for level in range(levels - 1, -1, -1):
+            x = round(x / scale)
+            y = round(y / scale)
+            score, (x, y) = refine_match(
+                screen_pyramid[level], template_pyramid[level], x, y, radius
+            )
+            if level > 0 and score < coarse_threshold:
+                break
+        else:
+            if score > best[0]:
+                best = (score, (x, y))
+    return best
+
+
+class SharedSpectrumMatcher:
+    """多模板共享频域变换的 NCC 匹配器（结果与 TM_CCOEFF_NORMED 一致）
+
+    每帧画面只做一次 DFT；每个模板只需与画面频谱相乘，各通道乘积相加后
+    做一次逆变换。模板减去均值后分子等于画面与零均值模板的互相关，分母由
+    窗口方差（盒式滤波求和）与模板范数得到，同尺寸模板共用窗口方差。
+    模板频谱按 (key, DFT 尺寸) 缓存，总大小受 cache_bytes 限制。1080p 画面下
+    一个彩色模板的频谱约 24 MB，默认大小约可缓存 10 个模板；设置 template_count
+    后按模板数和画面尺寸放大到能缓存全部模板，但不超过 max_cache_bytes。
+    匹配器保存每帧状态，检测引擎和批量匹配在每个工作线程各创建一个，
+    实际占用最多为线程数 × 缓存大小。
+
+    缓存放不下全部模板时不按 LRU 淘汰：每帧按固定顺序访问模板，LRU 会在
+    复用前淘汰每个条目，使所有模板每帧都重新计算频谱。最近 keep_frames 帧
+    内用过的条目不会被淘汰，放不下的模板不缓存，每帧只重新计算这部分模板；
+    长时间未使用的条目（模板已移除或画面尺寸已变化）才会被淘汰。
+
+    画面频谱按调用方给出的 frame 标识复用，而不是按画面对象：截图缓冲池会把
+    同一个数组填入下一帧内容，按对象判断会沿用上一帧的频谱。
+    """
+
+    def __init__(
+        self,
+        cache_bytes=256 * 1024 * 1024,
+        keep_frames=8,
+        template_count=None,
+        max_cache_bytes=1024 * 1024 * 1024,
+    ):
+        self.cache_bytes = cache_bytes
+        self.keep_frames = keep_frames
+        self.template_count = template_count  # 每帧匹配的模板数，由调用方更新
+        self.max_cache_bytes = max_cache_bytes
+        # (key, dft_h, dft_w) -> [(各通道频谱, 模板范数), 最近使用的帧序号]
+        self._spectra = OrderedDict()
+        self._spectra_bytes = 0
+        self._lock = threading.Lock()
+        self._screen = None
+        self._frame = None
+        self.screens_prepared = 0
+        self.templates_matched = 0
+        self.spectra_computed = 0
+        self.spectra_uncached = 0  # 缓存已满而未缓存的频谱
+
+    def prepare(self, screen, frame=None):
+        """计算画面的频谱
+
+        frame 为调用方给出的画面标识（如截图序号）：与上次相同时视为同一画面内容，
+        不重新计算；为 None 时总是重新计算。
+        """
+        if frame is not None and frame == self._frame:
+            return
+        height, width = screen.shape[:2]
+        self._screen = screen
+        self._frame = frame
+        self._height, self._width = height, width
+        self._dft_h = cv2.getOptimalDFTSize(height)
+        self._dft_w = cv2.getOptimalDFTSize(width)
+        channels = [screen] if screen.ndim == 2 else cv2.split(screen)
+        self._screen_spectra = []
+        for channel in channels:
+            padded = np.zeros((self._dft_h, self._dft_w), dtype=np.float32)
+            padded[:height, :width] = channel
+            self._screen_spectra.append(cv2.dft(padded, nonzeroRows=height))
+        self._inv_std = {}  # (template_h, template_w) -> 1 / 窗口标准差
+        self.screens_prepared += 1
+        if self.template_count:
+            # 放大缓存以容纳全部模板在当前 DFT 尺寸下的频谱（只增不减）
+            needed = self.template_count * len(channels) * self._dft_h * self._dft_w * 4
+            self.cache_bytes = max(self.cache_bytes, min(self.max_cache_bytes, needed))
+
+    def _template_spectra(self, template, key):
+        cache_key = (key, self._dft_h, self._dft_w) if key is not None else None
+        if cache_key is not None:
+            with self._lock:
+                cached = self._spectra.get(cache_key)
+                if cached is not None:
+                    cached[1] = self.screens_prepared
+                    self._spectra.move_to_end(cache_key)
+                    return cached[0]
+
+        template_h, template_w = template.shape[:2]
+        channels = [template] if template.ndim == 2 else cv2.split(template)
+        spectra = []
+        norm_sq = 0.0
+        for channel in channels:
+            zero_mean = channel.astype(np.float32)
+            zero_mean -= zero_mean.mean()
+            norm_sq += float((zero_mean * zero_mean).sum())
+            padded = np.zeros((self._dft_h, self._dft_w), dtype=np.float32)
+            padded[:template_h, :template_w] = zero_mean
+            spectra.append(cv2.dft(padded, nonzeroRows=template_h))
+        spectra = (spectra, math.sqrt(norm_sq))
+        self.spectra_computed += 1
+
+        if cache_key is not None:
+            size = sum(s.nbytes for s in spectra[0])
+            with self._lock:
+                if self._make_room(size):
+                    self._spectra[cache_key] = [spectra, self.screens_prepared]
+                    self._spectra_bytes += size
+                else:
+                    self.spectra_uncached += 1
+        return spectra
+
+    def _make_room(self, size):
+        """淘汰 keep_frames 帧内未使用的条目（最久未用的优先），直到能放下 size 字节"""
+        stale_before = self.screens_prepared - self.keep_frames
+        for cache_key in list(self._spectra):
+            if self._spectra_bytes + size <= self.cache_bytes:
+                break
+            (old, _), last_used = self._spectra[cache_key]
+            if last_used < stale_before:
+                del self._spectra[cache_key]
+                self._spectra_bytes -= sum(s.nbytes for s in old)
+        return self._spectra_bytes + size <= self.cache_bytes
+
+    def _window_inv_std(self, template_h, template_w):
+        inv_std = self._inv_std.get((template_h, template_w))
+        if inv_std is None:
+            result_h = self._height - template_h + 1
+            result_w = self._width - template_w + 1
+            # 以窗口左上角为锚点求和，只取完整落在画面内的窗口
+            box = dict(
+                ksize=(template_w, template_h),
+                anchor=(0, 0),
+                normalize=False,
+                borderType=cv2.BORDER_CONSTANT,
+            )
+            sums = cv2.boxFilter(self._screen, cv2.CV_64F, **box)[:result_h, :result_w]
+            sq_sums = cv2.sqrBoxFilter(self._screen, cv2.CV_64F, **box)[:result_h, :result_w]
+            variance = cv2.subtract(
+                sq_sums, cv2.multiply(sums, sums, scale=1.0 / (template_h * template_w))
+            )
+            if variance.ndim == 3:
+                variance = cv2.transform(variance, np.ones((1, variance.shape[2])))
+            # 方差接近 0 的纯色窗口得分记为 0
+            variance = variance.astype(np.float32)
+            cv2.threshold(variance, 0, 0, cv2.THRESH_TOZERO, dst=variance)
+            std = cv2.sqrt(variance)
+            inv_std = np.zeros_like(std)
+            np.divide(1.0, std, out=inv_std, where=std > 1e-3)
+            self._inv_std[(template_h, template_w)] = inv_std
+        return inv_std
+
+    def match(self, screen, template, key=None, frame=None):
+        """返回 (最高分, 左上角坐标)；key 用于缓存模板频谱，frame 见 prepare()"""
+        self.prepare(screen, frame)
+        return self._match_prepared(template, key)
+
+    def _match_prepared(self, template, key):
+        template_h, template_w = template.shape[:2]
+        result_h = self._height - template_h + 1
+        result_w = self._width - template_w + 1
+
+        spectra, norm = self._template_spectra(template, key)
+        if norm == 0:
+            return 0.0, (0, 0)
+        product = None
+        for screen_spectrum, template_spectrum in zip(self._screen_spectra, spectra):
+            term = cv2.mulSpectrums(screen_spectrum, template_spectrum, 0, conjB=True)
+            product = term if product is None else cv2.add(product, term)
+        correlation = cv2.idft(product, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)[
+            :result_h, :result_w
+        ]
+
+        result = cv2.multiply(correlation, self._window_inv_std(template_h, template_w))
+        result *= 1.0 / norm
+        np.clip(result, -1.0, 1.0, out=result)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        self.templates_matched += 1
+        return max_val, max_loc
+
+    def match_all(self, screen, templates, keys=None):
+        """一次计算画面频谱，返回每个模板的 (最高分, 左上角坐标)"""
+        keys = keys or [None] * len(templates)
+        self.prepare(screen)
+        return [self._match_prepared(t, k) for t, k in zip(templates, keys)]
+
+    def release(self):
+        """释放当前画面的频谱与积分图"""
+        self._screen = None
+        self._frame = None
+        self._screen_spectra = []
+        self._inv_std = {}
+
+
+# Windows 常用的显示缩放比例（%），窗口与模板截取时的缩放之比即为候选比例
+DPI_SCALES = (100, 125, 150, 175, 200)
+
+
+def scale_candidates(dpi_scales=DPI_SCALES, min_scale=0.5, max_scale=2.0):
+    """窗口相对模板的候选缩放比例，按与 1 的接近程度排序"""
+    ratios = {round(a / b, 3) for a in dpi_scales for b in dpi_scales}
+    return sorted(
+        (r for r in ratios if min_scale <= r <= max_scale), key=lambda r: abs(math.log(r))
+    )
+
+
+class ScaleSearcher:
+    """在多个候选缩放比例中搜索模板，用于估计窗口相对模板的缩放比例
+
+    先在缩小 coarse 倍的画面上，用相邻相差约 coarse_step 倍的部分比例定位模板
+    （每帧只缩小一次画面），取分数最高的 verify 个位置；再在原分辨率上、只在
+    这些位置附近用所有比例验证。比例由原分辨率上的分数决定。
+    """
+
+    def __init__(self, scales=None, coarse=0.5, verify=3, coarse_step=1.2):
+        self.scales = list(scales) if scales is not None else scale_candidates()
+        self.coarse = coarse
+        self.verify = verify
+        # 定位只需相近的比例，粗搜索只用其中一部分
+        self.coarse_scales = []
+        for scale in sorted(self.scales):
+            if not self.coarse_scales or scale >= self.coarse_scales[-1] * coarse_step:
+                self.coarse_scales.append(scale)
+        self._screen = None
+        self._frame = None
+        self._small = None
+        self.searches = 0
+
+    def prepare(self, screen, frame=None):
+        """缩小画面；frame 与上次相同时视为同一画面，不再缩小（见 SharedSpectrumMatcher.prepare）"""
+        if frame is not None and frame == self._frame:
+            return
+        self._screen = screen
+        self._frame = frame
+        self._small = cv2.resize(
+            screen, None, fx=self.coarse, fy=self.coarse, interpolation=cv2.INTER_AREA
+        )
+
+    def search(self, screen, template_at, threshold, prefer=None, frame=None):
+        """返回 (最高分, 左上角坐标, 缩放比例)
+
+        template_at(k) 返回按 k 缩放后的模板。指定 prefer 时先在该比例上全图匹配，
+        达到阈值即返回，不再搜索其他比例。frame 为画面标识，见 prepare()。
+        """
+        self.searches += 1
+        screen_h, screen_w = screen.shape[:2]
+        best = (-1.0, (0, 0), 1.0)
+
+        if prefer is not None:
+            template = template_at(prefer)
+            if template.shape[0] <= screen_h and template.shape[1] <= screen_w:
+                max_val, max_loc = best_match(screen, template)
+                if max_val >= threshold:
+                    return max_val, max_loc, prefer
+                best = (max_val, max_loc, prefer)
+
+        self.prepare(screen, frame)
+        small_h, small_w = self._small.shape[:2]
+        peaks = []  # 各比例的 (分数, 原分辨率左上角坐标)
+        for scale in self.coarse_scales:
+            template = template_at(scale * self.coarse)
+            template_h, template_w = template.shape[:2]
+            if template_h > small_h or template_w > small_w:
+                continue
+            if min(template_h, template_w) < MIN_PYRAMID_TEMPLATE_SIZE:
+                # 缩小后过小，在原分辨率上定位
+                template = template_at(scale)
+                if template.shape[0] <= screen_h and template.shape[1] <= screen_w:
+                    peaks.append(best_match(screen, template))
+                continue
+            max_val, (x, y) = best_match(self._small, template)
+            peaks.append((max_val, (round(x / self.coarse), round(y / self.coarse))))
+        peaks.sort(reverse=True)
+
+        # 合并相近的位置，只验证 verify 个不同位置
+        locations = []
+        for _, (x, y) in peaks:
+            if all(abs(x - lx) > 8 or abs(y - ly) > 8 for lx, ly in locations):
+                locations.append((x, y))
+                if len(locations) == self.verify:
+                    break
+
+        for scale in self.scales:
+            template = template_at(scale)
+            template_h, template_w = template.shape[:2]
+            if template_h > screen_h or template_w > screen_w:
+                continue
+            pad = max(template_h, template_w) // 2 + 4
+            for x, y in locations:
+                x0 = max(0, x - pad)
+                y0 = max(0, y - pad)
+                x1 = min(screen_w, x + template_w + pad)
+                y1 = min(screen_h, y + template_h + pad)
+                if x1 - x0 < template_w or y1 - y0 < template_h:
+                    continue
+                max_val, (dx, dy) = best_match(screen[y0:y1, x0:x1], template)
+                if max_val > best[0]:
+                    best = (max_val, (x0 + dx, y0 + dy), scale)
+        return best
+
+    def release(self):
+        self._screen = None
+        self._frame = None
+        self._small = None
@@ -0,0 +1,255 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 直方图桶上界（秒），最后一个桶为 +Inf
+BUCKETS = (
+    0.00001, 0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01,
+    0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0,
+)  # fmt: skip
+
+# 各阶段的显示名称
+STAGE_NAMES = {
+    "title": "获取标题",
+    "capture": "截图",
+    "match": "模板匹配",
+    "activate": "切换窗口",
+    "click": "点击",
+    "sleep": "等待",
+}
+
+
+class LatencyHistogram:
+    """固定桶的耗时直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数（秒），插值范围限制在已观测的最小、最大值之间"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = max(self.min, BUCKETS[i - 1] if i > 0 else 0.0)
+                upper = min(self.max, BUCKETS[i] if i < len(BUCKETS) else self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class _NullTimer:
+    """关闭统计时使用的空计时器"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "window", "template", "start")
+
+    def __init__(self, metrics, stage, window, template):
+        self.metrics = metrics
+        self.stage = stage
+        self.window = window
+        self.template = template
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(
+            self.stage, time.perf_counter() - self.start, self.window, self.template
+        )
+        return False
+
+
+class StageMetrics:
+    """按阶段、窗口和模板分别记录耗时直方图
+
+    enabled 为 False 时 time() 返回共享的空计时器，observe() 直接返回。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = {}  # (阶段, 窗口, 模板) -> LatencyHistogram
+        self._lock = threading.Lock()
+
+    def time(self, stage, window=None, template=None):
+        """用于 with 语句的计时器"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, window, template)
+
+    def observe(self, stage, seconds, window=None, template=None):
+        if not self.enabled:
+            return
+        key = (stage, window, template)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self._histograms[key] = histogram
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def summary(self):
+        """按阶段汇总：{阶段: {"count", "mean", "p50", "p99", "max"}}（秒）"""
+        merged = {}
+        with self._lock:
+            for (stage, _, _), histogram in self._histograms.items():
+                merged.setdefault(stage, LatencyHistogram()).merge(histogram)
+        return {
+            stage: {
+                "count": h.count,
+                "mean": h.total / h.count if h.count else 0.0,
+                "p50": h.quantile(0.5),
+                "p99": h.quantile(0.99),
+                "max": h.max,
+            }
+            for stage, h in merged.items()
+        }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = [
+            "# HELP auto_click_stage_seconds 检测与点击各阶段耗时",
+            "# TYPE auto_click_stage_seconds histogram",
+        ]
+        with self._lock:
+            items = [
+                (key, list(h.counts), h.total, h.count)
+                for key, h in self._histograms.items()
+            ]
+        items.sort(key=lambda item: str(item[0]))
+        for (stage, window, template), counts, total, count in items:
+            labels = f'stage="{stage}"'
+            if window is not None:
+                labels += f',window="{window}"'
+            if template is not None:
+                labels += f',template="{_escape(template)}"'
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'auto_click_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}'
+                )
+            lines.append(f"auto_click_stage_seconds_sum{{{labels}}} {total}")
+            lines.append(f"auto_click_stage_seconds_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """写入 Prometheus 文本文件（先写临时文件再替换，读取方不会看到半个文件）"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsFileWriter:
+    """在后台线程每隔 interval 秒写入 Prometheus 文本文件，关闭时再写一次"""
+
+    def __init__(self, metrics, path, interval=1.0, log=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.log = log or (lambda message, level="info": None)
+        self.writes = 0
+        self.errors = 0
+        self._error = None  # 上次记录的错误，相同错误只记录一次
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        try:
+            self.metrics.write_textfile(self.path)
+        except OSError as e:
+            self.errors += 1
+            if str(e) != self._error:
+                self._error = str(e)
+                self.log(f"统计文件写入失败: {e}")
+            return
+        self._error = None
+        self.writes += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.write()
+
+
+class MetricsServer:
+    """在本地端口以 /metrics 提供 Prometheus 文本"""
+
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,104 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class PollScheduler:
+    """按窗口安排下次检测时间的调度器
+
+    每个窗口有独立的检测间隔和到期时间，保存在按到期时间排序的堆中。
+    窗口命中模板或画面变化后间隔回到 min_interval；连续空闲时间隔按
+    backoff 倍数增长，最长不超过 max_interval。间隔小于 base_step 时从
+    base_step 开始增长，min_interval 为 0 时空闲窗口同样会降低检测频率。
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=10.0, backoff=1.5, base_step=0.1):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.base_step = base_step
+        self._heap = []  # [(到期时间, 序号, hwnd), ...]
+        self._deadlines = {}  # hwnd -> 当前有效的到期时间，堆中其他条目视为过期
+        self._intervals = {}  # hwnd -> 当前检测间隔
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        # 统计
+        self.scans = 0
+        self.active_scans = 0
+
+    def _push(self, hwnd, deadline):
+        self._deadlines[hwnd] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), hwnd))
+
+    def sync(self, hwnds, now=None):
+        """与当前监控窗口同步：新窗口立即到期，移除的窗口不再调度"""
+        now = time.monotonic() if now is None else now
+        hwnds = set(hwnds)
+        with self._lock:
+            # 以 _intervals 为准：已由 due() 取出、尚未重新安排的窗口不在 _deadlines 中
+            for hwnd in list(self._intervals):
+                if hwnd not in hwnds:
+                    del self._intervals[hwnd]
+                    self._deadlines.pop(hwnd, None)
+            for hwnd in hwnds:
+                if hwnd not in self._intervals:
+                    self._intervals[hwnd] = self.min_interval
+                    self._push(hwnd, now)
+            # 过期条目过多时重建堆
+            if len(self._heap) > 4 * len(self._deadlines) + 16:
+                self._heap = [e for e in self._heap if self._deadlines.get(e[2]) == e[0]]
+                heapq.heapify(self._heap)
+
+    def due(self, now=None):
+        """取出所有已到期的窗口"""
+        now = time.monotonic() if now is None else now
+        hwnds = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, hwnd = heapq.heappop(self._heap)
+                if self._deadlines.get(hwnd) == deadline:
+                    del self._deadlines[hwnd]
+                    hwnds.append(hwnd)
+        return hwnds
+
+    def reschedule(self, hwnd, active, now=None):
+        """检测完成后安排下次检测；active 表示本次命中或画面有变化"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if hwnd not in self._intervals:
+                return  # 已不再监控
+            if active:
+                interval = self.min_interval
+                self.active_scans += 1
+            else:
+                interval = max(self._intervals[hwnd], self.base_step) * self.backoff
+                interval = min(self.max_interval, max(self.min_interval, interval))
+            self._intervals[hwnd] = interval
+            self.scans += 1
+            self._push(hwnd, now + interval)
+
+    def wait_time(self, now=None):
+        """距最近一个窗口到期的秒数，没有窗口时返回 None"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - now)
+
+    def interval(self, hwnd):
+        with self._lock:
+            return self._intervals.get(hwnd)
+
+    def stats(self):
+        with self._lock:
+            intervals = list(self._intervals.values())
+            return {
+                "windows": len(intervals),
+                "scans": self.scans,
+                "active_scans": self.active_scans,
+                "avg_interval": sum(intervals) / len(intervals) if intervals else 0.0,
+            }
@@ -0,0 +1,342 @@
+import json
+import mmap
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from auto_click_capture import FrameSource, convert_frame
+
+
+# 会话文件布局：
+#   MAGIC
+#   记录 * N       每条为 RECORD 头（以 RECORD_MAGIC 开头）+ 数据
+#   元数据 JSON    窗口标题等
+#   索引           INDEX_DTYPE 数组，每条记录一项
+#   FOOTER         元数据偏移、索引偏移、记录数、MAGIC
+MAGIC = b"ACSESS02"
+RECORD_MAGIC = b"ACFR"
+# RECORD_MAGIC, hwnd, 时间, 窗口矩形, 高, 宽, 通道数, 类型, 数据长度
+RECORD = struct.Struct("<4sqdiiiiIIBBI")
+FOOTER = struct.Struct("<QQQ8s")
+
+KIND_RAW = 0  # 未压缩画面
+KIND_KEYFRAME = 1  # zlib 压缩的完整画面
+KIND_DELTA = 2  # 与同一窗口上一帧按字节异或后 zlib 压缩
+KIND_REPEAT = 3  # 与同一窗口上一帧完全相同，无数据
+MAX_FRAME_SIDE = 1 << 15  # 恢复扫描时视为合理的最大画面边长
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("hwnd", "<i8"),
+        ("timestamp", "<f8"),
+        ("rect", "<i4", 4),
+        ("height", "<u4"),
+        ("width", "<u4"),
+        ("channels", "u1"),
+        ("kind", "u1"),
+        ("length", "<u4"),
+        ("offset", "<u8"),
+    ]
+)
+
+
+class SessionRecorder:
+    """将截取的画面连同 hwnd、时间和窗口矩形追加写入会话文件
+
+    画面复制后交给后台线程压缩写入，不阻塞检测；队列满或已关闭时丢弃并计数，
+    丢弃的画面不复制。
+    同一窗口每 keyframe_interval 帧写一次完整画面，其余写与上一帧的差异。
+    """
+
+    def __init__(self, path, keyframe_interval=30, level=1, max_pending=64, log=None):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.log = log or (lambda message, level="info": None)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._index = []
+        self._titles = {}
+        self._previous = {}  # hwnd -> (上一帧, 距上一关键帧的帧数)
+        self._lock = threading.Lock()  # 统计由检测线程和写入线程共同更新
+        self.frames = 0
+        self.dropped = 0
+        self.raw_bytes = 0
+        self.written_bytes = len(MAGIC)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, hwnd, frame, rect, title=None, timestamp=None):
+        """记录一帧（画面会被复制，调用方可继续复用缓冲区）"""
+        if frame is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._closed or self._queue.full():
+            with self._lock:
+                self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((hwnd, np.array(frame, copy=True), tuple(rect), title, timestamp))
+        except queue.Full:  # 其他检测线程在复制期间占满了队列
+            with self._lock:
+                self.dropped += 1
+
+    def _encode(self, hwnd, frame):
+        previous, since_key = self._previous.get(hwnd, (None, 0))
+        if previous is not None and previous.shape == frame.shape:
+            if np.array_equal(previous, frame):
+                self._previous[hwnd] = (previous, since_key + 1)
+                return KIND_REPEAT, b""
+            if since_key + 1 < self.keyframe_interval:
+                delta = cv2.bitwise_xor(previous, frame)
+                self._previous[hwnd] = (frame, since_key + 1)
+                return KIND_DELTA, zlib.compress(delta, self.level)
+        self._previous[hwnd] = (frame, 0)
+        data = zlib.compress(frame, self.level)
+        if len(data) >= frame.nbytes:
+            return KIND_RAW, frame.tobytes()
+        return KIND_KEYFRAME, data
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            hwnd, frame, rect, title, timestamp = item
+            try:
+                frame = np.ascontiguousarray(frame)
+                kind, data = self._encode(hwnd, frame)
+                height, width = frame.shape[:2]
+                channels = frame.shape[2] if frame.ndim == 3 else 1
+                offset = self._file.tell()
+                self._file.write(
+                    RECORD.pack(
+                        RECORD_MAGIC, hwnd, timestamp, *rect, height, width, channels, kind, len(data)
+                    )
+                )
+                self._file.write(data)
+                self._index.append(
+                    (hwnd, timestamp, rect, height, width, channels, kind, len(data), offset)
+                )
+                if title is not None:
+                    self._titles[str(hwnd)] = title
+                with self._lock:
+                    self.frames += 1
+                    self.raw_bytes += frame.nbytes
+                    self.written_bytes += RECORD.size + len(data)
+            except Exception as e:
+                self.log(f"录制写入失败: {e}")
+
+    def close(self):
+        """写完队列中的画面，追加元数据、索引和文件尾；之后 record() 的画面计入 dropped"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        # 与关闭同时进行的 record() 可能在结束标记之后入队
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self.dropped += 1
+        meta_offset = self._file.tell()
+        self._file.write(json.dumps({"titles": self._titles}, ensure_ascii=False).encode("utf-8"))
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.write(FOOTER.pack(meta_offset, index_offset, len(self._index), MAGIC))
+        self._file.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "dropped": self.dropped,
+                "raw_bytes": self.raw_bytes,
+                "written_bytes": self.written_bytes,
+                "ratio": self.raw_bytes / self.written_bytes if self.written_bytes else 0.0,
+            }
+
+
+def _plausible_record(height, width, channels, kind, length):
+    """记录头中的尺寸与数据长度是否自洽"""
+    if not (0 < height <= MAX_FRAME_SIDE and 0 < width <= MAX_FRAME_SIDE):
+        return False
+    if channels not in (1, 3, 4):
+        return False
+    raw = height * width * channels
+    if kind == KIND_RAW:
+        return length == raw
+    if kind == KIND_REPEAT:
+        return length == 0
+    if kind in (KIND_KEYFRAME, KIND_DELTA):
+        # zlib 压缩后最多比原数据略大
+        return 0 < length <= raw + raw // 100 + 64
+    return False
+
+
+def _scan_records(data):
+    """文件尾缺失（录制中断）时顺序扫描记录重建索引
+
+    遇到不以 RECORD_MAGIC 开头或内容不合理的记录头时停止，不会把已写入的
+    元数据和索引当作画面记录。
+    """
+    index = []
+    offset = len(MAGIC)
+    while offset + RECORD.size <= len(data):
+        magic, hwnd, timestamp, *rest = RECORD.unpack_from(data, offset)
+        rect, (height, width, channels, kind, length) = rest[:4], rest[4:]
+        if magic != RECORD_MAGIC or not _plausible_record(height, width, channels, kind, length):
+            break
+        if offset + RECORD.size + length > len(data):
+            break
+        index.append((hwnd, timestamp, rect, height, width, channels, kind, length, offset))
+        offset += RECORD.size + length
+    return np.array(index, dtype=INDEX_DTYPE)
+
+
+class SessionReplaySource(FrameSource):
+    """内存映射会话文件，按窗口依次回放录制的画面
+
+    realtime 为 False 时全速回放；为 True 时按录制时的时间间隔（除以 speed）回放。
+    未压缩的画面直接作为映射内存的只读视图返回。
+    """
+
+    def __init__(self, path, realtime=False, speed=1.0, loop=True):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是会话文件: {path}")
+
+        self.titles = {}
+        footer = None
+        if len(self._map) >= len(MAGIC) + FOOTER.size:
+            footer = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if footer is not None and footer[3] == MAGIC:
+            meta_offset, index_offset, count, _ = footer
+            meta = json.loads(bytes(self._map[meta_offset:index_offset]).decode("utf-8"))
+            self.titles = {int(k): v for k, v in meta.get("titles", {}).items()}
+            self.index = np.frombuffer(
+                self._map, dtype=INDEX_DTYPE, count=count, offset=index_offset
+            )
+        else:
+            self.index = _scan_records(self._map)
+
+        self.hwnds = list(dict.fromkeys(int(h) for h in self.index["hwnd"]))
+        self._entries = {
+            hwnd: np.flatnonzero(self.index["hwnd"] == hwnd) for hwnd in self.hwnds
+        }
+        self._positions = {hwnd: 0 for hwnd in self.hwnds}
+        self._frames = {}  # hwnd -> 上一次解码的画面
+        self._start = None
+        self._t0 = float(self.index["timestamp"].min()) if len(self.index) else 0.0
+        self.frames = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.hwnds]
+
+    def get_title(self, hwnd):
+        return self.titles.get(hwnd, f"replay-{hwnd}")
+
+    def _current(self, hwnd):
+        entries = self._entries[hwnd]
+        position = self._positions[hwnd]
+        if position >= len(entries):
+            if not self.loop:
+                return None
+            position = 0
+        return self.index[entries[position]]
+
+    def get_rect(self, hwnd):
+        entry = self._current(hwnd)
+        if entry is None:
+            entry = self.index[self._entries[hwnd][-1]]
+        return tuple(int(v) for v in entry["rect"])
+
+    def _decode(self, hwnd, entry):
+        return self._decode_with(self._frames.get(hwnd), entry)
+
+    def _decode_with(self, previous, entry):
+        """解码一条记录；previous 为同一窗口的上一帧（差异帧和重复帧需要）"""
+        shape = (int(entry["height"]), int(entry["width"]))
+        if entry["channels"] > 1:
+            shape += (int(entry["channels"]),)
+        start = int(entry["offset"]) + RECORD.size
+        data = self._map[start : start + int(entry["length"])]
+        kind = entry["kind"]
+        if kind == KIND_RAW:
+            return np.frombuffer(self._map, np.uint8, int(entry["length"]), start).reshape(shape)
+        if kind == KIND_REPEAT:
+            return previous
+        frame = np.frombuffer(zlib.decompress(data), np.uint8).reshape(shape)
+        if kind == KIND_DELTA:
+            frame = cv2.bitwise_xor(previous, frame)
+        return frame
+
+    def iter_frames(self, hwnd=None):
+        """按录制顺序逐帧产生 (hwnd, 画面)，不影响回放位置；指定 hwnd 时只产生该窗口的画面
+
+        未压缩的画面为映射内存的只读视图，关闭会话前有效。
+        """
+        previous = {}
+        for entry in self.index:
+            entry_hwnd = int(entry["hwnd"])
+            frame = self._decode_with(previous.get(entry_hwnd), entry)
+            previous[entry_hwnd] = frame
+            if hwnd is None or entry_hwnd == hwnd:
+                if frame.ndim == 2:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                yield entry_hwnd, frame
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        entries = self._entries[hwnd]
+        position = self._positions[hwnd]
+        if position >= len(entries):
+            if not self.loop:
+                return None
+            position = 0
+            self._frames.pop(hwnd, None)
+            if hwnd == self.hwnds[0]:
+                self._start = None  # 重新开始计时
+        entry = self.index[entries[position]]
+        self._positions[hwnd] = position + 1
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now - (float(entry["timestamp"]) - self._t0) / self.speed
+            wait = self._start + (float(entry["timestamp"]) - self._t0) / self.speed - now
+            if wait > 0:
+                time.sleep(wait)
+
+        frame = self._decode(hwnd, entry)
+        self._frames[hwnd] = frame
+        self.frames += 1
+        if frame.ndim == 2 and not gray:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        return convert_frame(frame, gray, scale)
+
+    def close(self):
+        self.index = None
+        self._frames.clear()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # 调用方仍持有映射内存的视图，随其释放
+        self._file.close()
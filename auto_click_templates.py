@@ -0,0 +1,301 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+from auto_click_matching import build_pyramid
+
+
+# 模板包文件布局：
+#   PACK_MAGIC
+#   头部长度 (u64) + 头部 JSON   每个模板的源文件 mtime/大小、统计量和各平面的偏移与形状
+#   数据区                      各平面的像素，按 PACK_ALIGN 字节对齐
+PACK_MAGIC = b"ACTPACK1"
+PACK_VERSION = 1
+PACK_ALIGN = 64
+PACK_HEADER = struct.Struct("<Q")
+
+
+def decode_template(path):
+    """解码模板图像为 BGR 像素；灰度或带 alpha 通道的图像转换为三通道，失败时返回 None"""
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+class TemplateEntry:
+    """已解码的模板及其派生数据
+
+    从模板包加载时，灰度平面和统计量直接使用包中的数据，不再重新计算。
+    """
+
+    def __init__(
+        self, path, image, mtime, file_size, gray=None, mean=None, norm=None
+    ):
+        self.path = path
+        self.image = image  # BGR 像素
+        self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if gray is None else gray
+        self.height, self.width = image.shape[:2]
+        # 归一化相关所需的均值与零均值范数
+        if mean is None or norm is None:
+            pixels = image.astype(np.float32)
+            mean = pixels.mean(axis=(0, 1))
+            norm = float(np.sqrt(((pixels - mean) ** 2).sum()))
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.norm = float(norm)
+        # 用于判断文件是否变化
+        self.mtime = mtime
+        self.file_size = file_size
+        self._variants = {}  # (gray, scale) -> 预处理后的模板
+        self._pyramids = {}  # (scale, levels, gray, capture_scale) -> 金字塔
+
+    def variant(self, gray=False, scale=1.0):
+        """获取（并缓存）灰度和/或缩小后的模板，与快速模式的截图对应"""
+        key = (gray, scale)
+        image = self._variants.get(key)
+        if image is None:
+            image = self.gray if gray else self.image
+            if scale != 1.0:
+                size = (
+                    max(1, round(self.width * scale)),
+                    max(1, round(self.height * scale)),
+                )
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            self._variants[key] = image
+        return image
+
+    def pyramid(self, scale, levels, gray=False, capture_scale=1.0):
+        """获取（并缓存）模板金字塔"""
+        key = (scale, levels, gray, capture_scale)
+        pyramid = self._pyramids.get(key)
+        if pyramid is None:
+            pyramid = build_pyramid(self.variant(gray, capture_scale), scale, levels)
+            self._pyramids[key] = pyramid
+        return pyramid
+
+    @property
+    def size_text(self):
+        return f"{self.width}x{self.height}"
+
+
+def write_template_pack(path, entries, pyramid_scale=0.5, pyramid_levels=1):
+    """将已解码的模板写入模板包（先写临时文件再替换）
+
+    每个模板保存 BGR 与灰度平面、pyramid_scale/pyramid_levels 的金字塔各层
+    以及归一化统计量。
+    """
+    header = {
+        "version": PACK_VERSION,
+        "pyramid_scale": pyramid_scale,
+        "pyramid_levels": pyramid_levels,
+        "templates": [],
+    }
+    planes = []
+    offset = 0
+    for entry in entries:
+        arrays = {"image": entry.image, "gray": entry.gray}
+        for gray in (False, True):
+            pyramid = entry.pyramid(pyramid_scale, pyramid_levels, gray)
+            for level, image in enumerate(pyramid[1:], 1):
+                arrays[f"{'gray' if gray else 'image'}_{level}"] = image
+        layout = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array, dtype=np.uint8)
+            layout[name] = [offset, list(array.shape)]
+            planes.append((offset, array))
+            offset += -(-array.nbytes // PACK_ALIGN) * PACK_ALIGN
+        header["templates"].append(
+            {
+                "path": entry.path,
+                "mtime": entry.mtime,
+                "file_size": entry.file_size,
+                "mean": [float(v) for v in entry.mean],
+                "norm": entry.norm,
+                "planes": layout,
+            }
+        )
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = len(PACK_MAGIC) + PACK_HEADER.size + len(header_bytes)
+    data_start = -(-data_start // PACK_ALIGN) * PACK_ALIGN
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(PACK_MAGIC)
+        f.write(PACK_HEADER.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for plane_offset, array in planes:
+            f.seek(data_start + plane_offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp_path, path)
+    return data_start + offset
+
+
+def read_template_pack(path):
+    """内存映射读取模板包，返回 (头部, [{平面名: 数组}, ...])
+
+    平面从映射中复制出来后立即关闭映射，运行中可以直接重建同一个模板包文件。
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[: len(PACK_MAGIC)] != PACK_MAGIC:
+                raise ValueError(f"不是模板包文件: {path}")
+            (header_size,) = PACK_HEADER.unpack_from(data, len(PACK_MAGIC))
+            header_start = len(PACK_MAGIC) + PACK_HEADER.size
+            header = json.loads(bytes(data[header_start : header_start + header_size]))
+            if header.get("version") != PACK_VERSION:
+                raise ValueError(f"模板包版本不支持: {header.get('version')}")
+            data_start = -(-(header_start + header_size) // PACK_ALIGN) * PACK_ALIGN
+            planes = []
+            for template in header["templates"]:
+                arrays = {}
+                for name, (offset, shape) in template["planes"].items():
+                    count = int(np.prod(shape))
+                    view = np.frombuffer(data, np.uint8, count, data_start + offset)
+                    arrays[name] = view.reshape(shape).copy()
+                    del view
+                planes.append(arrays)
+    return header, planes
+
+
+class TemplateStore:
+    """模板缓存：每个模板只解码一次，文件变化时才重新加载
+
+    可从模板包预先载入已处理好的模板；之后有模板重新解码或被移除时
+    pack_dirty 为 True，由 save_pack() 重建模板包。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0  # 直接使用内存中的模板
+        self.misses = 0  # 需要从磁盘解码
+        self.pack_loaded = 0  # 从模板包载入的模板数
+        self.pack_dirty = False
+        self._pack_lock = threading.Lock()  # 同一时间只写一个模板包
+
+    def get(self, path):
+        """获取模板，文件 mtime 或大小变化时自动重新加载"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        def fresh(entry):
+            return (
+                entry is not None
+                and entry.mtime == st.st_mtime_ns
+                and entry.file_size == st.st_size
+            )
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if fresh(entry):
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 在锁外解码，其他模板的命中不必等待磁盘读取
+        image = decode_template(path)
+        entry = TemplateEntry(path, image, st.st_mtime_ns, st.st_size) if image is not None else None
+
+        with self._lock:
+            current = self._entries.get(path)
+            if fresh(current):
+                # 其他线程已载入同一版本的文件
+                return current
+            self.pack_dirty = True
+            if entry is None:
+                self._entries.pop(path, None)
+            else:
+                self._entries[path] = entry
+            return entry
+
+    def load_pack(self, path, pyramid_scale=None, pyramid_levels=None):
+        """从模板包载入源文件未变化的模板，返回载入数量；源文件已变化的模板之后按需解码
+
+        指定的金字塔参数与模板包中的不同时，模板仍然载入（金字塔按需重新计算），
+        并标记 pack_dirty 以按新参数重建模板包。
+        """
+        header, planes = read_template_pack(path)
+        scale = header["pyramid_scale"]
+        levels = header["pyramid_levels"]
+        loaded = 0
+        with self._lock:
+            if (pyramid_scale is not None and pyramid_scale != scale) or (
+                pyramid_levels is not None and pyramid_levels != levels
+            ):
+                self.pack_dirty = True
+            for template, arrays in zip(header["templates"], planes):
+                source = template["path"]
+                try:
+                    st = os.stat(source)
+                except OSError:
+                    self.pack_dirty = True
+                    continue
+                if st.st_mtime_ns != template["mtime"] or st.st_size != template["file_size"]:
+                    self.pack_dirty = True
+                    continue
+                entry = TemplateEntry(
+                    source,
+                    arrays["image"],
+                    template["mtime"],
+                    template["file_size"],
+                    gray=arrays["gray"],
+                    mean=template["mean"],
+                    norm=template["norm"],
+                )
+                for gray, name in ((False, "image"), (True, "gray")):
+                    entry._pyramids[(scale, levels, gray, 1.0)] = [arrays[name]] + [
+                        arrays[f"{name}_{level}"] for level in range(1, levels + 1)
+                    ]
+                self._entries[source] = entry
+                loaded += 1
+            self.pack_loaded += loaded
+        return loaded
+
+    def save_pack(self, path, pyramid_scale=0.5, pyramid_levels=1):
+        """将当前所有模板写入模板包，返回写入的字节数"""
+        with self._pack_lock:
+            with self._lock:
+                entries = list(self._entries.values())
+                self.pack_dirty = False
+            try:
+                return write_template_pack(path, entries, pyramid_scale, pyramid_levels)
+            except Exception:
+                self.pack_dirty = True
+                raise
+
+    def sync(self, templates):
+        """与模板列表同步：移除已删除的模板，预加载新模板"""
+        paths = {t["path"] for t in templates}
+        with self._lock:
+            for path in list(self._entries):
+                if path not in paths:
+                    del self._entries[path]
+                    self.pack_dirty = True
+        for path in paths:
+            self.get(path)
+
+    def invalidate(self, path=None):
+        """丢弃指定模板（或全部模板）的缓存"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+            self.pack_dirty = True
+
+    def stats(self):
+        """返回缓存统计"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "pack_loaded": self.pack_loaded,
+            }
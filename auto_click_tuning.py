@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from auto_click_batch import BatchMatcher
+from auto_click_config import load_config_file, write_atomic
+from auto_click_session import SessionReplaySource
+
+
+# 精确率/召回率表中列出的阈值
+REPORT_THRESHOLDS = np.round(np.arange(0.5, 1.0, 0.05), 2)
+
+
+def load_labels(path):
+    """读取标注文件，返回 [(画面, {模板名称, ...}), ...]
+
+    标注文件为 JSON：{"frames": [条目, ...]}，条目为
+    {"path": 图像文件, "templates": [出现的模板名称, ...]} 或
+    {"session": 会话录制文件, "index": 帧序号, "templates": [...]}。
+    相对路径相对标注文件所在目录；templates 为空表示画面中不应点击任何模板。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)["frames"]
+    base = os.path.dirname(os.path.abspath(path))
+
+    frames = []
+    by_session = defaultdict(dict)  # 会话文件 -> {帧序号: 条目在 frames 中的位置}
+    for item in items:
+        labels = set(item.get("templates", []))
+        if "session" in item:
+            session = os.path.join(base, item["session"])
+            by_session[session][int(item["index"])] = len(frames)
+            frames.append((None, labels))
+        else:
+            image = cv2.imread(os.path.join(base, item["path"]))
+            if image is None:
+                raise ValueError(f"无法读取画面: {item['path']}")
+            frames.append((image, labels))
+
+    for session, wanted in by_session.items():
+        source = SessionReplaySource(session, loop=False)
+        try:
+            for index, (_, frame) in enumerate(source.iter_frames()):
+                if index in wanted:
+                    # 映射内存的视图在关闭会话后失效，需要复制
+                    frames[wanted[index]] = (frame.copy(), frames[wanted[index]][1])
+        finally:
+            source.close()
+        missing = [index for index in wanted if frames[wanted[index]][0] is None]
+        if missing:
+            raise ValueError(f"会话 {session} 中没有第 {missing} 帧")
+    return frames
+
+
+def label_matrix(frames, names):
+    """(帧数, 模板数) 的布尔矩阵：画面中是否应命中该模板（按名称或文件名匹配）"""
+    matrix = np.zeros((len(frames), len(names)), dtype=bool)
+    for i, (_, labels) in enumerate(frames):
+        for j, name in enumerate(names):
+            matrix[i, j] = name in labels or os.path.basename(name) in labels
+    return matrix
+
+
+def precision_recall(positive, negative, thresholds):
+    """按阈值计算 (精确率, 召回率, 误检数)，每个阈值一列，一次向量化计算"""
+    thresholds = np.asarray(thresholds, dtype=np.float32)
+    true_positive = (positive[:, None] >= thresholds).sum(axis=0)
+    false_positive = (negative[:, None] >= thresholds).sum(axis=0)
+    detected = true_positive + false_positive
+    precision = np.where(detected > 0, true_positive / np.maximum(detected, 1), 1.0)
+    recall = true_positive / len(positive) if len(positive) else np.ones(len(thresholds))
+    return precision, recall, false_positive
+
+
+def recommend_threshold(positive, negative, min_precision=1.0, floor=0.5, ceiling=0.99):
+    """推荐阈值：精确率不低于 min_precision 时召回率最高的阈值
+
+    阈值取在被接受的最低正例分数与其下方最近的分数之间的中点，两侧留出余量；
+    没有正例时返回 None。
+    """
+    if not len(positive):
+        return None
+    candidates = np.unique(positive)
+    precision, recall, _ = precision_recall(positive, negative, candidates)
+    allowed = precision >= min_precision
+    if not allowed.any():
+        # 任何阈值都有误检：取误检最少时召回率最高的阈值（即最高的正例分数）
+        allowed = candidates == candidates.max()
+    best = np.flatnonzero(allowed & (recall == recall[allowed].max()))[-1]
+    accepted = float(candidates[best])
+    below = np.concatenate([positive[positive < accepted], negative[negative < accepted]])
+    lower = float(below.max()) if len(below) else floor
+    return float(np.clip(round((accepted + max(lower, floor)) / 2, 3), floor, ceiling))
+
+
+def distribution(scores):
+    """分数分布摘要"""
+    if not len(scores):
+        return "无"
+    p5, p50, p95 = np.percentile(scores, [5, 50, 95])
+    return (
+        f"{len(scores)} 帧, 最低 {scores.min():.3f}, p5 {p5:.3f}, p50 {p50:.3f}, "
+        f"p95 {p95:.3f}, 最高 {scores.max():.3f}"
+    )
+
+
+def tune(result, labels, threshold, min_precision=1.0):
+    """逐模板统计分数分布和精确率/召回率，返回 {模板名称: 推荐阈值或 None}"""
+    recommended = {}
+    for j, name in enumerate(result.names):
+        scores = result.scores[:, j]
+        valid = scores >= 0  # 模板大于画面的帧不参与统计
+        positive = scores[valid & labels[:, j]]
+        negative = scores[valid & ~labels[:, j]]
+        print(f"\n模板 {name}")
+        print(f"  应命中: {distribution(positive)}")
+        print(f"  不应命中: {distribution(negative)}")
+        if len(positive) and len(negative):
+            print(f"  分数间隔: {positive.min() - negative.max():+.3f} (最低正例 - 最高负例)")
+
+        precision, recall, false_positive = precision_recall(
+            positive, negative, REPORT_THRESHOLDS
+        )
+        print("  阈值   精确率  召回率  误检")
+        for t, p, r, fp in zip(REPORT_THRESHOLDS, precision, recall, false_positive):
+            print(f"  {t:.2f}  {p:6.1%}  {r:6.1%}  {fp:4d}")
+
+        value = recommend_threshold(positive, negative, min_precision)
+        recommended[name] = value
+        current = precision_recall(positive, negative, [threshold])
+        print(
+            f"  全局阈值 {threshold:.2f}: 精确率 {current[0][0]:.1%}, 召回率 {current[1][0]:.1%}"
+        )
+        if value is None:
+            print("  没有应命中该模板的画面，无法推荐阈值")
+            continue
+        tuned = precision_recall(positive, negative, [value])
+        print(
+            f"  推荐阈值 {value:.3f}: 精确率 {tuned[0][0]:.1%}, 召回率 {tuned[1][0]:.1%}"
+        )
+    return recommended
+
+
+def apply_thresholds(config_path, recommended):
+    """将推荐阈值写入配置文件中对应模板的 threshold 字段，返回更新的模板数
+
+    运行中的界面不会覆盖外部修改的配置文件，而是在几秒内重新读取各模板的阈值
+    （见 ConfigWriter.changed_on_disk）；界面在此之前不会保存旧的阈值。
+    """
+    config, _, _ = load_config_file(config_path)
+    updated = 0
+    for template in config.get("templates", []):
+        value = recommended.get(template["name"], recommended.get(template["path"]))
+        if value is not None:
+            template["threshold"] = value
+            updated += 1
+    write_atomic(config_path, json.dumps(config, ensure_ascii=False, indent=2))
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在标注的画面上批量匹配所有模板，统计分数分布和精确率/召回率并推荐每个模板的阈值"
+    )
+    parser.add_argument("labels", help="标注文件 (JSON)")
+    parser.add_argument("--config", default="auto_click_config.json", help="读取模板和全局阈值的配置文件")
+    parser.add_argument("--templates", nargs="+", help="模板文件，默认使用配置文件中的模板")
+    parser.add_argument("--threshold", type=float, help="对比的全局阈值，默认使用配置中的 match_threshold")
+    parser.add_argument(
+        "--min-precision", type=float, default=1.0, help="推荐阈值需满足的最低精确率"
+    )
+    parser.add_argument("--mode", choices=["full", "fft"], default="full")
+    parser.add_argument("--fast", action="store_true", help="快速模式（灰度），应与监控时一致")
+    parser.add_argument("--fast-scale", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, help="线程数，默认为 CPU 核数")
+    parser.add_argument("--apply", action="store_true", help="将推荐阈值写入配置文件")
+    args = parser.parse_args()
+
+    loaded = load_config_file(args.config)
+    config = loaded[0] if loaded is not None else {}
+    templates = args.templates or config.get("templates", [])
+    if not templates:
+        parser.error("没有模板：请指定 --templates 或在配置文件中添加模板")
+    if args.apply and loaded is None:
+        parser.error(f"配置文件不存在: {args.config}")
+    threshold = args.threshold if args.threshold is not None else config.get("match_threshold", 0.8)
+
+    frames = load_labels(args.labels)
+    matcher = BatchMatcher(
+        templates,
+        gray=args.fast,
+        scale=args.fast_scale if args.fast else 1.0,
+        mode=args.mode,
+        workers=args.workers,
+    )
+    result = matcher.match(frame for frame, _ in frames)
+    labels = label_matrix(frames, result.names)
+    print(f"{len(result)} 帧, {len(result.names)} 个模板")
+
+    recommended = tune(result, labels, threshold, args.min_precision)
+    if args.apply:
+        updated = apply_thresholds(args.config, recommended)
+        print(f"\n已将 {updated} 个模板的阈值写入 {args.config}")
+        print("正在运行的界面会在几秒内自动载入新阈值")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import queue
+import threading
+
+
+class WindowDiff:
+    """两次窗口枚举之间的变化"""
+
+    def __init__(self, added, removed, renamed, total, manual=False):
+        self.added = added  # [(hwnd, 标题), ...]，按枚举顺序
+        self.removed = removed  # [hwnd, ...]
+        self.renamed = renamed  # [(hwnd, 新标题), ...]
+        self.total = total  # 当前窗口总数
+        self.manual = manual  # 是否由手动刷新触发
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.renamed)
+
+
+def diff_windows(previous, windows):
+    """比较上一次快照 {hwnd: 标题} 与本次枚举结果 [(hwnd, 标题), ...]
+
+    返回 (WindowDiff, 新快照)。
+    """
+    current = dict(windows)
+    added = [(hwnd, title) for hwnd, title in current.items() if hwnd not in previous]
+    removed = [hwnd for hwnd in previous if hwnd not in current]
+    renamed = [
+        (hwnd, title)
+        for hwnd, title in current.items()
+        if hwnd in previous and previous[hwnd] != title
+    ]
+    return WindowDiff(added, removed, renamed, len(current)), current
+
+
+class WindowWatcher:
+    """在后台线程枚举窗口，只把与上次快照相比的变化放入 updates 队列
+
+    enumerate_windows 为返回 [(hwnd, 标题), ...] 的函数，测试时可传入假的枚举函数。
+    interval 大于 0 时按该间隔自动刷新，否则只在调用 refresh() 时刷新。
+    """
+
+    def __init__(self, enumerate_windows, interval=0.0, log=None):
+        self.enumerate_windows = enumerate_windows
+        self.interval = interval
+        self.log = log or (lambda message, level="info": None)
+        self.snapshot = {}
+        self.updates = queue.Queue()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="windows", daemon=True)
+        self._thread.start()
+
+    def refresh(self):
+        """请求立即刷新（不阻塞调用方）"""
+        self._wake.set()
+
+    def scan(self, manual=False):
+        """枚举一次窗口并与快照比较；有变化或手动刷新时放入队列"""
+        windows = self.enumerate_windows()
+        with self._lock:
+            diff, self.snapshot = diff_windows(self.snapshot, windows)
+        diff.manual = manual
+        if diff or manual:
+            self.updates.put(diff)
+        return diff
+
+    def poll(self):
+        """取出所有待应用的变化"""
+        diffs = []
+        while True:
+            try:
+                diffs.append(self.updates.get_nowait())
+            except queue.Empty:
+                return diffs
+
+    def _run(self):
+        while self._running:
+            manual = self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                self.scan(manual)
+            except Exception as e:
+                self.log(f"枚举窗口失败: {e}")
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def make_template(tmp_path):
+    """在临时目录写入带纹理的模板图像，返回 (路径, BGR 像素)"""
+    rng = np.random.default_rng(1)
+
+    def make(name="template.png", width=40, height=24):
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(image, (3, 3), 0)
+        path = str(tmp_path / name)
+        cv2.imwrite(path, image)
+        return path, image
+
+    return make
+
+
+@pytest.fixture
+def background():
+    """平滑的噪声背景，与模板不相似"""
+    rng = np.random.default_rng(2)
+
+    def make(width=320, height=240):
+        small = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    return make
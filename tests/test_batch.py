@@ -0,0 +1,28 @@
+import cv2
+import numpy as np
+import pytest
+
+from auto_click_batch import BatchMatcher
+
+
+@pytest.mark.parametrize("mode", ["full", "fft"])
+@pytest.mark.parametrize("gray", [False, True])
+def test_match_accepts_gray_and_bgr_stacks(make_template, background, mode, gray):
+    path, template = make_template()
+    frames = []
+    for x, y in [(10, 20), (200, 150), (120, 60)]:
+        frame = background()
+        frame[y : y + template.shape[0], x : x + template.shape[1]] = template
+        frames.append(frame)
+    bgr_stack = np.stack(frames)
+    gray_stack = np.stack([cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames])
+    assert bgr_stack.shape == (3, 240, 320, 3)
+    assert gray_stack.shape == (3, 240, 320)
+
+    matcher = BatchMatcher([path], gray=gray, mode=mode, chunk_size=2, workers=2)
+    for stack in (bgr_stack, gray_stack):
+        result = matcher.match(stack)
+        assert len(result) == 3
+        assert result.hits(0.9)[:, 0].all()
+        assert result.locations[:, 0].tolist() == [[10, 20], [200, 150], [120, 60]]
+        assert result.centers[0, 0].tolist() == [10 + 20, 20 + 12]
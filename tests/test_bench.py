@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from auto_click_bench import compare_results
+
+
+def result(p50, p99, recall, frames="1920x1080"):
+    return {
+        "frames": frames,
+        "templates": 10,
+        "template_scale": 1.0,
+        "mode": "fft",
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "recall": recall,
+    }
+
+
+@pytest.mark.parametrize(
+    "current, expected",
+    [
+        (result(10.5, 21.0, 1.0), []),
+        (result(12.0, 20.0, 1.0), [("p50_ms", 0.2)]),
+        (result(10.0, 30.0, 1.0), [("p99_ms", 0.5)]),
+        (result(10.0, 20.0, 0.9), [("recall", -0.1)]),
+        (result(10.0, 20.0, None), []),  # 录制画面没有召回率
+        (result(12.0, 20.0, 1.0, frames="3840x2160"), []),  # 基线中没有该项
+    ],
+)
+def test_compare_results(tmp_path, current, expected):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [result(10.0, 20.0, 1.0)]}), encoding="utf-8")
+    regressions = compare_results([current], str(baseline), max_regression=0.1)
+    assert [(metric, pytest.approx(change)) for _, _, metric, change in regressions] == expected
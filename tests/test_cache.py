@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from auto_click_actuator import RecordingClickSink
+from auto_click_cache import FrameChangeTracker, TemplateOrder, dirty_tile_regions
+from auto_click_engine import DetectionEngine
+from auto_click_matching import best_match
+
+
+def quiet(message, level="info"):
+    pass
+
+
+@pytest.mark.parametrize(
+    "x, y",
+    [
+        (10, 10),  # 完全在一个块内
+        (40, 50),  # 跨越横向和纵向的块边界
+        (60, 100),  # 左半部分上一帧已存在，只有右半部分所在的块变化
+    ],
+)
+def test_dirty_region_search_matches_full_search(make_template, background, x, y):
+    path, template = make_template()
+    h, w = template.shape[:2]
+    engine = DetectionEngine(None, RecordingClickSink(), log=quiet)
+    tracker = FrameChangeTracker(tile_size=64)
+
+    previous = background()
+    if (x, y) == (60, 100):
+        previous[y : y + h, x : x + 4] = template[:, :4]  # 块边界 x=64 左侧已相同
+    assert tracker.begin(1, previous, ()).regions is None
+
+    screen = previous.copy()
+    screen[y : y + h, x : x + w] = template
+    delta = tracker.begin(1, screen, ())
+    assert delta.regions
+    if (x, y) == (60, 100):
+        assert all(x0 >= 64 for x0, _, _, _ in delta.regions)
+
+    full_score, full_location = best_match(screen, template)
+    region_score, region_location = engine.match_regions(screen, template, delta.regions)
+    assert region_location == full_location == (x, y)
+    assert region_score == pytest.approx(full_score, abs=1e-5)
+    assert engine.find_template(screen, path, 0.9, regions=delta.regions) == (
+        True,
+        x + w // 2,
+        y + h // 2,
+    )
+
+
+def test_dirty_tile_regions_cover_every_changed_pixel(background):
+    rng = np.random.default_rng(5)
+    previous = background(300, 200)  # 尺寸不是块大小的整数倍
+    screen = previous.copy()
+    changed = [(int(rng.integers(0, 300)), int(rng.integers(0, 200))) for _ in range(20)]
+    for x, y in changed:
+        screen[y, x] ^= 0xFF
+    regions = dirty_tile_regions(previous, screen, 32)
+    for x, y in changed:
+        assert any(x0 <= x < x1 and y0 <= y < y1 for x0, y0, x1, y1 in regions)
+    assert dirty_tile_regions(previous, previous.copy(), 32) == []
+
+
+TEMPLATES = [{"path": "a.png"}, {"path": "b.png"}, {"path": "c.png"}]
+
+
+def paths(templates):
+    return [t["path"] for t in templates]
+
+
+def test_template_order_follows_decayed_hits():
+    order = TemplateOrder(decay=0.8)
+    assert paths(order.order(1, TEMPLATES)) == ["a.png", "b.png", "c.png"]
+
+    for path in ("c.png", "c.png", "b.png"):
+        order.record(1, path, hit=True)
+    scores = {path: score for path, score, _, _ in order.window_stats(1)}
+    assert scores["c.png"] == pytest.approx((0.2 * 0.8 + 0.2) * 0.8)
+    assert scores["b.png"] == pytest.approx(0.2)
+    assert paths(order.order(1, TEMPLATES)) == ["c.png", "b.png", "a.png"]
+
+    # 最近的命中权重更大：b 连续命中两次后排到 c 前面
+    order.record(1, "b.png", hit=True)
+    order.record(1, "b.png", hit=True)
+    assert paths(order.order(1, TEMPLATES)) == ["b.png", "c.png", "a.png"]
+    # 其他窗口不受影响
+    assert paths(order.order(2, TEMPLATES)) == ["a.png", "b.png", "c.png"]
+
+
+def test_template_order_ties_keep_config_order():
+    order = TemplateOrder()
+    for path in ("c.png", "a.png", "b.png"):
+        order.record(1, path, hit=False)
+    assert paths(order.order(1, TEMPLATES)) == ["a.png", "b.png", "c.png"]
+
+    order.record(1, "c.png", hit=True)
+    order.record(1, "a.png", hit=True)
+    order.record(1, "c.png", hit=True)
+    order.record(1, "a.png", hit=True)
+    assert paths(order.order(1, TEMPLATES)) == ["a.png", "c.png", "b.png"]
+
+
+def test_template_order_samples_templates_that_never_hit():
+    order = TemplateOrder(sample_after=2, sample_every=3)
+    order.record(1, "a.png", hit=True)
+    order.record(1, "b.png", hit=False)
+    order.record(1, "c.png", hit=False)
+    order.record(1, "c.png", hit=False)  # 匹配 2 次从未命中
+
+    seen = [paths(order.order(1, TEMPLATES)) for _ in range(6)]
+    assert all(s[:2] == ["a.png", "b.png"] for s in seen)
+    # 每 3 次检测只尝试一次
+    assert sum("c.png" in s for s in seen) == 2
+    assert order.stats()["sampled_out"] == 4
+
+    order.record(1, "c.png", hit=True)
+    assert all("c.png" in paths(order.order(1, TEMPLATES)) for _ in range(3))
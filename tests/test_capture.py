@@ -0,0 +1,163 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from auto_click_capture import (
+    DesktopGrabSource,
+    FakeBitmapProvider,
+    FrameSource,
+    PooledCaptureSource,
+)
+
+
+def test_pooled_capture_reuses_buffers_while_size_is_unchanged(background):
+    frame = background(320, 240)
+    provider = FakeBitmapProvider({1: frame})
+    source = PooledCaptureSource(provider)
+
+    first = source.capture(1)
+    np.testing.assert_array_equal(first, frame)
+    assert source.stats()["allocations"] == 2  # BGRX 位图 + BGR 输出
+    assert provider.allocated == [(1, 320, 240)]
+
+    changed = frame.copy()
+    changed[:10] = 0
+    provider.set_frame(1, changed)
+    second = source.capture(1)
+    assert second is first  # 同一输出缓冲区，内容已更新
+    np.testing.assert_array_equal(second, changed)
+
+    gray = source.capture(1, gray=True)
+    np.testing.assert_array_equal(gray, cv2.cvtColor(changed, cv2.COLOR_BGR2GRAY))
+    scaled = source.capture(1, gray=True, scale=0.5)
+    assert scaled.shape == (120, 160)
+    for _ in range(3):
+        source.capture(1)
+        source.capture(1, gray=True, scale=0.5)
+    stats = source.stats()
+    assert stats["allocations"] == 4  # 新增灰度与缩放输出各一次，之后不再分配
+    assert stats["allocated_bytes"] == 320 * 240 * (4 + 3 + 1) + 160 * 120
+    assert provider.allocated == [(1, 320, 240)]
+    assert provider.released == []
+
+
+def test_pooled_capture_reallocates_and_releases_on_resize(background):
+    provider = FakeBitmapProvider({1: background(320, 240), 2: background(200, 100)})
+    source = PooledCaptureSource(provider)
+    source.capture(1)
+    source.capture(2)
+    assert source.stats()["allocations"] == 4
+
+    resized = background(400, 300)
+    provider.set_frame(1, resized)
+    frame = source.capture(1)
+    np.testing.assert_array_equal(frame, resized)
+    assert provider.allocated == [(1, 320, 240), (2, 200, 100), (1, 400, 300)]
+    assert provider.released == [1]
+    assert source.stats()["allocations"] == 6
+
+    source.capture(2)  # 其他窗口的缓冲区不受影响
+    assert source.stats()["allocations"] == 6
+
+    source.forget(2)
+    assert provider.released == [1, 2]
+    source.close()
+    assert provider.released == [1, 2, None]
+
+
+class FakeGrabber:
+    """按 mss 接口返回给定的整屏画面（BGR），记录每次截屏的显示器"""
+
+    def __init__(self, screens):
+        self.screens = [cv2.cvtColor(screen, cv2.COLOR_BGR2BGRA) for screen in screens]
+        self.monitors = [{}]  # 第 0 项为全部显示器的合并区域，不使用
+        left = 0
+        for screen in screens:
+            height, width = screen.shape[:2]
+            self.monitors.append({"left": left, "top": 0, "width": width, "height": height})
+            left += width
+        self.grabbed = []
+
+    def grab(self, area):
+        index = self.monitors.index(area) - 1
+        self.grabbed.append(index)
+        screen = self.screens[index]
+        return SimpleNamespace(raw=screen.tobytes(), width=screen.shape[1], height=screen.shape[0])
+
+
+class RectSource(FrameSource):
+    """提供窗口矩形的回退来源，记录回退截图的窗口"""
+
+    def __init__(self, rects):
+        self.rects = rects
+        self.captured = []
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.rects]
+
+    def get_title(self, hwnd):
+        return f"rect-{hwnd}"
+
+    def get_rect(self, hwnd):
+        return self.rects[hwnd]
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        self.captured.append(hwnd)
+        left, top, right, bottom = self.rects[hwnd]
+        return np.zeros((bottom - top, right - left) + (() if gray else (3,)), dtype=np.uint8)
+
+
+def test_desktop_grab_crops_windows_from_one_grab_per_cycle(background):
+    screens = [background(320, 240), background(200, 160)]
+    grabber = FakeGrabber(screens)
+    fallback = RectSource({1: (10, 20, 110, 80), 2: (200, 100, 320, 240), 3: (330, 10, 400, 60)})
+    source = DesktopGrabSource(fallback, grabber=grabber)
+
+    source.begin_cycle()
+    np.testing.assert_array_equal(source.capture(1), screens[0][20:80, 10:110])
+    np.testing.assert_array_equal(source.capture(2), screens[0][100:240, 200:320])
+    # 第二个显示器从 x=320 开始
+    np.testing.assert_array_equal(source.capture(3), screens[1][10:60, 10:80])
+    gray = source.capture(1, gray=True)
+    np.testing.assert_array_equal(
+        gray, cv2.cvtColor(screens[0][20:80, 10:110], cv2.COLOR_BGR2GRAY)
+    )
+    assert source.capture(1, gray=True, scale=0.5).shape == (30, 50)
+    assert grabber.grabbed == [0, 1]  # 每个显示器本轮只截一次
+
+    # 下一轮重新截屏，窗口输出缓冲区复用
+    first = source.capture(1)
+    grabber.screens[0][:] = 0
+    source.begin_cycle()
+    second = source.capture(1)
+    assert second is first
+    assert not second.any()
+    assert grabber.grabbed == [0, 1, 0]
+    assert fallback.captured == []
+    assert source.stats() == {"grabs": 3, "crops": 7, "fallbacks": 0}
+
+
+def test_desktop_grab_falls_back_for_hidden_or_spanning_windows(background):
+    grabber = FakeGrabber([background(320, 240), background(200, 160)])
+    fallback = RectSource(
+        {
+            1: (10, 20, 110, 80),  # 最小化
+            2: (20, 30, 120, 90),  # 被遮挡
+            3: (300, 10, 360, 60),  # 跨两个显示器
+            4: (400, 100, 560, 200),  # 超出显示器范围
+            5: (30, 40, 130, 100),  # 可见
+        }
+    )
+    hidden = {1, 2}
+    source = DesktopGrabSource(
+        fallback, grabber=grabber, visible=lambda hwnd, rect: hwnd not in hidden
+    )
+
+    source.begin_cycle()
+    for hwnd in (1, 2, 3, 4, 5):
+        left, top, right, bottom = fallback.rects[hwnd]
+        assert source.capture(hwnd).shape == (bottom - top, right - left, 3)
+    assert fallback.captured == [1, 2, 3, 4]
+    assert grabber.grabbed == [0]
+    assert source.stats() == {"grabs": 1, "crops": 1, "fallbacks": 4}
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import auto_click_config
+from auto_click_config import CONFIG_VERSION, ConfigWriter, load_config_file, migrate_config
+
+
+@pytest.mark.parametrize("version", [0, 1, CONFIG_VERSION])
+def test_migrate_config_upgrades_old_versions(version):
+    config = {"match_threshold": 0.8, "templates": [{"name": "a", "path": "a.png"}]}
+    if version:
+        config["version"] = version
+    migrated, original = migrate_config(dict(config))
+    assert original == version
+    assert migrated["version"] == CONFIG_VERSION
+    assert migrated["templates"] == config["templates"]
+    assert migrated["match_threshold"] == 0.8
+
+
+def test_migrate_config_keeps_newer_version_and_unknown_fields():
+    migrated, original = migrate_config({"version": CONFIG_VERSION + 1, "future": [1, 2]})
+    assert original == CONFIG_VERSION + 1
+    assert migrated == {"version": CONFIG_VERSION + 1, "future": [1, 2]}
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = ConfigWriter(str(tmp_path / "config.json"), delay=0.05)
+    yield writer
+    writer.close()
+
+
+def read(writer):
+    with open(writer.path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_debounce_coalesces_saves(writer):
+    for value in range(5):
+        writer.save({"value": value})
+    writer.close()
+    assert writer.requests == 5
+    assert writer.writes == 1
+    assert read(writer) == {"value": 4}
+
+
+def test_skips_content_marked_saved(writer):
+    config = {"version": CONFIG_VERSION, "value": 1}
+    text = json.dumps(config, ensure_ascii=False, indent=2)
+    with open(writer.path, "w", encoding="utf-8") as f:
+        f.write(text)
+    writer.mark_saved(text)
+    writer.save(config)
+    writer.flush()
+    assert writer.writes == 0
+    assert writer.skipped == 1
+
+    writer.save({"version": CONFIG_VERSION, "value": 2})
+    writer.flush()
+    assert writer.writes == 1
+    assert read(writer)["value"] == 2
+
+
+def test_close_flushes_pending_save(tmp_path):
+    writer = ConfigWriter(str(tmp_path / "config.json"), delay=60)
+    writer.save({"value": 1})
+    writer.close()
+    assert writer.writes == 1
+    assert read(writer) == {"value": 1}
+
+
+def test_write_goes_through_temp_file(writer, monkeypatch):
+    replaced = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        # 替换前临时文件已写完，原文件尚未改动
+        with open(src, "r", encoding="utf-8") as f:
+            replaced.append((src, dst, json.load(f)))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(auto_click_config.os, "replace", replace)
+    writer.save({"value": 1})
+    writer.flush()
+    assert replaced == [(f"{writer.path}.tmp", writer.path, {"value": 1})]
+    assert not os.path.exists(f"{writer.path}.tmp")
+    assert load_config_file(writer.path)[0] == {"value": 1, "version": CONFIG_VERSION}
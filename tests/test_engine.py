@@ -0,0 +1,187 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from auto_click_actuator import RecordingClickSink
+from auto_click_capture import FrameSource, SyntheticFrameSource, convert_frame
+from auto_click_engine import DetectionEngine
+
+
+def quiet(message, level="info"):
+    pass
+
+
+def make_engine(source, template_paths, **settings):
+    engine = DetectionEngine(source, RecordingClickSink(), log=quiet)
+    engine.templates = [{"name": path, "path": path} for path in template_paths]
+    engine.click_pause = 0
+    for name, value in settings.items():
+        setattr(engine, name, value)
+    return engine
+
+
+def planted_centers(source, hwnd):
+    return [(x + w // 2, y + h // 2) for x, y, w, h in source.planted[hwnd]]
+
+
+def clicked(engine, since=0):
+    return [(hwnd, x, y) for _, hwnd, x, y, _ in engine.sink.clicks[since:]]
+
+
+@pytest.mark.parametrize("settings", [{}, {"workers": 2}, {"match_mode": "fft"}])
+def test_run_cycle_clicks_planted_templates(make_template, settings):
+    paths = [make_template("a.png")[0], make_template("b.png", 30, 30)[0]]
+    source = SyntheticFrameSource(320, 240, paths, windows=2, hit_rate=1.0)
+    engine = make_engine(source, paths, **settings)
+    hwnds = [hwnd for hwnd, _ in source.list_windows()]
+
+    for _ in range(3):
+        before = len(engine.sink.clicks)
+        activity = engine.run_cycle(hwnds)
+        assert activity == {1: True, 2: True}
+        expected = [(hwnd, *planted_centers(source, hwnd)[0]) for hwnd in hwnds]
+        assert clicked(engine, before) == expected
+    assert engine.cycles == 3
+    assert engine.clicks == 6
+    assert engine.sink.activations == [1, 2] * 3
+    engine.shutdown()
+
+
+def test_unchanged_frames_skip_matching(make_template):
+    path, _ = make_template()
+    source = SyntheticFrameSource(320, 240, [path], windows=1, hit_rate=0.0)
+    engine = make_engine(source, [path])
+
+    assert engine.run_cycle([1]) == {1: True}  # 首帧视为有变化
+    assert engine.run_cycle([1]) == {1: False}
+    assert engine.sink.clicks == []
+    stats = engine.frame_tracker.stats()
+    assert stats["frames_unchanged"] == 1
+    assert stats["templates_skipped"] == 1
+
+
+class StillFrameSource(FrameSource):
+    """每个窗口始终返回同一画面"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def list_windows(self):
+        return [(hwnd, self.get_title(hwnd)) for hwnd in self.frames]
+
+    def get_title(self, hwnd):
+        return f"still-{hwnd}"
+
+    def get_rect(self, hwnd):
+        height, width = self.frames[hwnd].shape[:2]
+        return (0, 0, width, height)
+
+    def capture(self, hwnd, gray=False, scale=1.0):
+        return convert_frame(self.frames[hwnd].copy(), gray, scale)
+
+
+def test_repeated_hit_is_found_in_roi(make_template, background):
+    path, template = make_template()
+    frame = background()
+    frame[100:124, 200:240] = template
+    engine = make_engine(StillFrameSource({1: frame}), [path])
+
+    engine.run_cycle([1])
+    engine.frame_tracker.forget(1)  # 画面不变也重新匹配
+    engine.run_cycle([1])
+    assert engine.roi_cache.stats()["hits"] == 1
+    assert clicked(engine) == [(1, 220, 112)] * 2
+
+
+def test_scale_search_clicks_scaled_template(make_template):
+    path, _ = make_template(width=48, height=32)
+    source = SyntheticFrameSource(400, 300, [path], hit_rate=1.0, template_scale=1.25)
+    engine = make_engine(source, [path], scale_search=True)
+
+    for _ in range(2):
+        before = len(engine.sink.clicks)
+        engine.run_cycle([1])
+        (_, x, y), = clicked(engine, before)
+        expected_x, expected_y = planted_centers(source, 1)[0]
+        assert abs(x - expected_x) <= 1 and abs(y - expected_y) <= 1
+    assert engine.scale_cache.scale(1) == pytest.approx(1.25)
+
+
+@pytest.mark.parametrize("fast_scale", [0.5, 0.75])
+def test_fast_scale_maps_clicks_to_window_coordinates(tmp_path, fast_scale):
+    # 纹理较粗的模板缩小后仍能达到阈值（噪声纹理缩小后混叠，分数下降）
+    rng = np.random.default_rng(6)
+    paths = []
+    for name, width, height in [("a.png", 64, 48), ("b.png", 48, 48)]:
+        small = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+        paths.append(str(tmp_path / name))
+        cv2.imwrite(paths[-1], cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR))
+    source = SyntheticFrameSource(640, 480, paths, windows=2, hit_rate=1.0)
+    engine = make_engine(source, paths, fast_mode=True, fast_scale=fast_scale)
+    hwnds = [hwnd for hwnd, _ in source.list_windows()]
+
+    for _ in range(5):
+        before = len(engine.sink.clicks)
+        engine.run_cycle(hwnds)
+        points = clicked(engine, before)
+        assert [hwnd for hwnd, _, _ in points] == hwnds
+        for hwnd, x, y in points:
+            expected_x, expected_y = planted_centers(source, hwnd)[0]
+            assert abs(x - expected_x) <= 1 and abs(y - expected_y) <= 1
+    engine.shutdown()
+
+
+def test_multi_hit_clicks_every_copy(make_template):
+    path, _ = make_template()
+    source = SyntheticFrameSource(320, 240, [path], hit_rate=1.0, copies=3)
+    engine = make_engine(source, [path], max_hits=3)
+
+    engine.run_cycle([1])
+    points = [(x, y) for _, x, y in clicked(engine)]
+    assert sorted(points) == sorted(planted_centers(source, 1))
+    assert [y for _, y in points] == sorted((y for _, y in points), reverse=True)
+    assert engine.multi_hits == 1
+
+
+def test_async_actuator_executes_clicks(make_template):
+    path, _ = make_template()
+    source = SyntheticFrameSource(320, 240, [path], windows=2, hit_rate=1.0)
+    engine = make_engine(source, [path])
+    actuator = engine.create_actuator()
+    actuator.start()
+    try:
+        engine.run_cycle([1, 2])
+        deadline = time.monotonic() + 2
+        while actuator.stats()["executed"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        actuator.stop()
+    assert sorted(clicked(engine)) == sorted(
+        (hwnd, *planted_centers(source, hwnd)[0]) for hwnd in (1, 2)
+    )
+
+
+def test_async_clicks_count_only_executed_clicks(make_template):
+    path, _ = make_template()
+    source = SyntheticFrameSource(320, 240, [path], windows=2, hit_rate=1.0)
+    engine = make_engine(source, [path])
+    actuator = engine.create_actuator()  # 不启动点击线程：提交的点击留在队列中
+
+    engine.run_cycle([1, 2])
+    assert actuator.stats()["queue_depth"] == 2
+    assert engine.clicks == 0
+    actuator.stop()
+    assert actuator.stats()["dropped"] == 2
+    assert engine.clicks == 0
+
+    actuator.start()
+    engine.run_cycle([1, 2])
+    deadline = time.monotonic() + 2
+    while actuator.stats()["executed"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    actuator.stop()
+    assert engine.clicks == 2
+    engine.create_actuator()
+    assert engine.clicks == 2
@@ -0,0 +1,55 @@
+import os
+
+from auto_click_logging import LogFileWriter, LogStore, RepeatFilter
+
+
+def test_log_store_keeps_latest_lines():
+    store = LogStore(max_lines=3)
+    for i in range(5):
+        store.append(f"line {i}")
+    assert store.lines() == ["line 2", "line 3", "line 4"]
+    assert store.drain() == ["line 2", "line 3", "line 4"]
+    assert store.dropped == 2
+    assert store.drain() == []
+
+    store.append("line 5")
+    assert store.drain() == ["line 5"]
+    assert store.lines() == ["line 3", "line 4", "line 5"]
+    store.clear()
+    assert store.lines() == [] and store.drain() == []
+
+
+def test_repeat_filter_reports_omitted_count():
+    repeat = RepeatFilter(interval=10.0)
+    assert repeat.check("a", now=0.0) == (True, 0)
+    assert repeat.check("a", now=1.0) == (False, 0)
+    assert repeat.check("a", now=9.9) == (False, 0)
+    assert repeat.check("b", now=5.0) == (True, 0)  # 其他消息不受影响
+    # 间隔过后再次输出，并报告期间省略的次数
+    assert repeat.check("a", now=10.0) == (True, 2)
+    assert repeat.check("a", now=20.0) == (True, 0)
+    assert repeat.suppressed == 2
+
+
+def test_repeat_filter_prunes_expired_entries():
+    repeat = RepeatFilter(interval=10.0, max_entries=2)
+    repeat.check("a", now=0.0)
+    repeat.check("b", now=8.0)
+    repeat.check("c", now=12.0)  # 已满，清除过期的 "a"
+    assert set(repeat._seen) == {"b", "c"}
+    assert repeat.check("b", now=13.0) == (False, 0)
+
+
+def test_log_file_writer_rotates(tmp_path):
+    path = str(tmp_path / "auto_click.log")
+    writer = LogFileWriter(path, max_bytes=100, backup_count=2)
+    for i in range(30):
+        writer.write(f"message {i:02d} " + "x" * 20)
+    writer.close()
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["auto_click.log", "auto_click.log.1", "auto_click.log.2"]
+    for name in files:
+        assert os.path.getsize(tmp_path / name) <= 100
+    with open(path, "r", encoding="utf-8") as f:
+        assert f.read().splitlines()[-1] == "message 29 " + "x" * 20
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+import pytest
+
+from auto_click_matching import SharedSpectrumMatcher, best_match, build_pyramid, pyramid_match
+
+
+def spectrum_bytes(screen):
+    matcher = SharedSpectrumMatcher()
+    matcher.match(screen, np.eye(8, dtype=np.uint8) * 255, "probe")
+    return matcher._spectra_bytes
+
+
+def test_spectra_cache_does_not_thrash_when_templates_do_not_fit():
+    rng = np.random.default_rng(0)
+    templates = [rng.integers(0, 256, (12, 16), dtype=np.uint8) for _ in range(4)]
+    keys = [f"t{i}" for i in range(4)]
+    size = spectrum_bytes(rng.integers(0, 256, (120, 160), dtype=np.uint8))
+    matcher = SharedSpectrumMatcher(cache_bytes=2 * size)
+
+    for _ in range(5):
+        screen = rng.integers(0, 256, (120, 160), dtype=np.uint8)
+        matcher.match_all(screen, templates, keys)
+        matcher.release()
+
+    # 前两个模板一直缓存，后两个每帧重新计算；LRU 会让 4 个模板每帧都重新计算
+    assert matcher.spectra_computed == 4 + 2 * 4
+    assert matcher.spectra_uncached == 2 * 5
+
+
+def test_spectra_cache_evicts_entries_unused_for_keep_frames():
+    rng = np.random.default_rng(0)
+    old, new = (rng.integers(0, 256, (12, 16), dtype=np.uint8) for _ in range(2))
+    size = spectrum_bytes(rng.integers(0, 256, (120, 160), dtype=np.uint8))
+    matcher = SharedSpectrumMatcher(cache_bytes=size, keep_frames=2)
+
+    screen = rng.integers(0, 256, (120, 160), dtype=np.uint8)
+    matcher.match(screen, old, "old")
+    for _ in range(4):
+        matcher.match(screen.copy(), new, "new")
+
+    # "new" 在 "old" 过期前未缓存，之后替换了 "old"
+    assert [key for key, _, _ in matcher._spectra] == ["new"]
+    assert matcher.spectra_computed == 1 + 3
+
+
+def test_spectra_cache_grows_to_fit_template_count():
+    rng = np.random.default_rng(0)
+    templates = [rng.integers(0, 256, (12, 16), dtype=np.uint8) for _ in range(4)]
+    keys = [f"t{i}" for i in range(4)]
+    size = spectrum_bytes(rng.integers(0, 256, (120, 160), dtype=np.uint8))
+    matcher = SharedSpectrumMatcher(cache_bytes=size, template_count=4)
+
+    for _ in range(3):
+        matcher.match_all(rng.integers(0, 256, (120, 160), dtype=np.uint8), templates, keys)
+        matcher.release()
+
+    assert matcher.cache_bytes == 4 * size
+    assert matcher.spectra_computed == 4
+
+    capped = SharedSpectrumMatcher(cache_bytes=size, template_count=4, max_cache_bytes=3 * size)
+    capped.match_all(rng.integers(0, 256, (120, 160), dtype=np.uint8), templates, keys)
+    assert capped.cache_bytes == 3 * size
+
+
+def test_screen_spectrum_is_keyed_by_frame_not_buffer(background):
+    rng = np.random.default_rng(5)
+    template = rng.integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    buffer = background()  # 截图缓冲池中复用的数组
+    matcher = SharedSpectrumMatcher()
+
+    buffer[10:30, 20:50] = template
+    assert matcher.match(buffer, template, "t", frame=1)[1] == (20, 10)
+    matcher.match(buffer, template, "t", frame=1)
+    assert matcher.screens_prepared == 1
+
+    # 同一数组填入下一帧内容
+    buffer[:] = background()
+    buffer[100:120, 200:230] = template
+    assert matcher.match(buffer, template, "t", frame=2)[1] == (200, 100)
+    buffer[:] = background()
+    buffer[50:70, 60:90] = template
+    assert matcher.match(buffer, template, "t")[1] == (60, 50)
+    assert matcher.screens_prepared == 3
+
+
+@pytest.mark.parametrize("gray", [False, True])
+def test_shared_spectrum_scores_match_cv2(background, gray):
+    rng = np.random.default_rng(3)
+    screen = background()
+    templates = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for h, w in [(20, 30), (31, 17)]]
+    screen[50:70, 100:130] = templates[0]
+    templates.append(screen[120:160, 200:260].copy())  # 取自画面的模板
+    templates.append(rng.integers(0, 256, (20, 30, 3), dtype=np.uint8))  # 画面中不存在
+    if gray:
+        screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+        templates = [cv2.cvtColor(t, cv2.COLOR_BGR2GRAY) for t in templates]
+
+    matcher = SharedSpectrumMatcher()
+    results = matcher.match_all(screen, templates, keys=list(range(len(templates))))
+    assert matcher.screens_prepared == 1
+    for template, (score, location) in zip(templates, results):
+        expected = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+        _, expected_score, _, expected_location = cv2.minMaxLoc(expected)
+        assert score == pytest.approx(expected_score, abs=1e-5)
+        assert location == expected_location
+    assert results[0][1] == (100, 50)
+    assert results[2][1] == (200, 120)
+
+
+@pytest.mark.parametrize("levels", [1, 2])
+def test_pyramid_match_agrees_with_full_resolution(background, levels):
+    rng = np.random.default_rng(4)
+    small = rng.integers(0, 256, (8, 12, 3), dtype=np.uint8)
+    template = cv2.resize(small, (48, 32), interpolation=cv2.INTER_LINEAR)
+    template_pyramid = build_pyramid(template, 0.5, levels)
+    threshold = 0.8
+
+    for x, y in [(0, 0), (101, 57), (271, 207)]:
+        screen = background()
+        screen[y : y + 32, x : x + 48] = template
+        expected_score, expected_location = best_match(screen, template)
+        score, location = pyramid_match(screen, template_pyramid, threshold, 0.5, levels)
+        assert expected_location == (x, y)
+        assert location == expected_location
+        assert score == pytest.approx(expected_score, abs=1e-4)
+
+    miss = background()
+    expected_score, _ = best_match(miss, template)
+    score, _ = pyramid_match(miss, template_pyramid, threshold, 0.5, levels)
+    assert expected_score < threshold
+    assert score < threshold
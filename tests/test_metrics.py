@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from auto_click_metrics import BUCKETS, LatencyHistogram, MetricsFileWriter, StageMetrics
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    for seconds in (0.00001, 0.0003, 0.001, 0.0011, 10.0):
+        histogram.observe(seconds)
+    # 等于上界的值计入该桶，超过最后一个上界的计入 +Inf 桶
+    assert histogram.counts[0] == 1
+    assert histogram.counts[BUCKETS.index(0.0005)] == 1
+    assert histogram.counts[BUCKETS.index(0.001)] == 1
+    assert histogram.counts[BUCKETS.index(0.002)] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.count == 5
+    assert (histogram.min, histogram.max) == (0.00001, 10.0)
+
+
+def test_histogram_quantiles():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) == 0.0
+    for _ in range(50):
+        histogram.observe(0.0015)
+    for _ in range(50):
+        histogram.observe(0.015)
+    # 桶内插值限制在已观测的最小、最大值之间
+    assert histogram.quantile(0.5) == pytest.approx(0.002)
+    assert histogram.quantile(0.99) == pytest.approx(0.01 + 0.005 * 49 / 50)
+    assert histogram.quantile(1.0) == pytest.approx(0.015)
+
+    single = LatencyHistogram()
+    single.observe(0.003)
+    assert single.quantile(0.5) == pytest.approx(0.003)
+
+    merged = LatencyHistogram()
+    merged.merge(histogram)
+    merged.merge(single)
+    assert merged.count == 101
+    assert (merged.min, merged.max) == (0.0015, 0.015)
+
+
+def test_render_prometheus():
+    metrics = StageMetrics(enabled=True)
+    metrics.observe("match", 0.003, window=7, template='a"b')
+    metrics.observe("match", 0.03, window=7, template='a"b')
+    lines = metrics.render_prometheus().splitlines()
+    assert lines[:2] == [
+        "# HELP auto_click_stage_seconds 检测与点击各阶段耗时",
+        "# TYPE auto_click_stage_seconds histogram",
+    ]
+    labels = 'stage="match",window="7",template="a\\"b"'
+    buckets = [line for line in lines if line.startswith("auto_click_stage_seconds_bucket")]
+    assert len(buckets) == len(BUCKETS) + 1
+    assert f'auto_click_stage_seconds_bucket{{{labels},le="0.002"}} 0' in buckets
+    assert f'auto_click_stage_seconds_bucket{{{labels},le="0.005"}} 1' in buckets
+    assert f'auto_click_stage_seconds_bucket{{{labels},le="0.05"}} 2' in buckets
+    assert buckets[-1] == f'auto_click_stage_seconds_bucket{{{labels},le="+Inf"}} 2'
+    assert lines[-1] == f"auto_click_stage_seconds_count{{{labels}}} 2"
+    name, value = lines[-2].rsplit(" ", 1)
+    assert name == f"auto_click_stage_seconds_sum{{{labels}}}"
+    assert float(value) == pytest.approx(0.033)
+
+
+def test_disabled_metrics_use_null_timer():
+    metrics = StageMetrics()
+    first = metrics.time("match")
+    assert first is metrics.time("capture", window=1, template="a")
+    with first:
+        pass
+    metrics.observe("match", 0.1)
+    assert metrics.summary() == {}
+
+    metrics.enabled = True
+    with metrics.time("match"):
+        pass
+    assert metrics.summary()["match"]["count"] == 1
+
+
+def test_file_writer_writes_in_background(tmp_path):
+    metrics = StageMetrics(enabled=True)
+    metrics.observe("click", 0.01)
+    path = tmp_path / "metrics.prom"
+    writer = MetricsFileWriter(metrics, str(path), interval=0.01)
+    deadline = time.monotonic() + 2
+    while writer.writes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.writes > 0
+
+    metrics.observe("click", 0.02)
+    writer.close()
+    assert path.read_text(encoding="utf-8") == metrics.render_prometheus()
+    assert not (tmp_path / "metrics.prom.tmp").exists()
+
+
+def test_file_writer_logs_repeated_error_once(tmp_path):
+    messages = []
+    writer = MetricsFileWriter(
+        StageMetrics(), str(tmp_path / "missing" / "metrics.prom"), interval=60,
+        log=lambda message, level="info": messages.append(message),
+    )
+    writer.write()
+    writer.write()
+    writer.close()
+    assert writer.errors == 3
+    assert writer.writes == 0
+    assert len(messages) == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from auto_click_scheduler import PollScheduler
+
+
+def test_idle_windows_back_off_from_zero_min_interval():
+    scheduler = PollScheduler(min_interval=0.0, max_interval=1.0, backoff=2.0, base_step=0.1)
+    scheduler.sync([1, 2], now=0.0)
+    assert scheduler.due(now=0.0) == [1, 2]
+
+    intervals = []
+    for _ in range(6):
+        scheduler.reschedule(1, active=False, now=0.0)
+        intervals.append(scheduler.interval(1))
+    assert intervals == pytest.approx([0.2, 0.4, 0.8, 1.0, 1.0, 1.0])
+
+    scheduler.reschedule(2, active=True, now=0.0)
+    assert scheduler.interval(2) == 0.0
+    assert scheduler.due(now=0.0) == [2]
+    scheduler.reschedule(1, active=True, now=0.0)
+    assert scheduler.interval(1) == 0.0
+
+
+def test_due_windows_follow_their_own_intervals():
+    scheduler = PollScheduler(min_interval=1.0, max_interval=10.0, backoff=2.0)
+    scheduler.sync([1, 2], now=0.0)
+    assert scheduler.due(now=0.0) == [1, 2]
+    scheduler.reschedule(1, active=True, now=0.0)
+    scheduler.reschedule(2, active=False, now=0.0)
+
+    assert scheduler.wait_time(now=0.0) == pytest.approx(1.0)
+    assert scheduler.due(now=1.0) == [1]
+    assert scheduler.due(now=2.0) == [2]
+
+    scheduler.sync([2], now=2.0)  # 窗口 1 不再监控
+    scheduler.reschedule(1, active=True, now=2.0)
+    assert scheduler.interval(1) is None
+    assert scheduler.stats()["windows"] == 1
+
+
+def test_sync_does_not_requeue_windows_being_scanned():
+    scheduler = PollScheduler(min_interval=1.0)
+    scheduler.sync([1], now=0.0)
+    assert scheduler.due(now=0.0) == [1]
+    scheduler.sync([1], now=0.5)  # 窗口 1 正在检测，尚未重新安排
+    assert scheduler.due(now=0.5) == []
+    scheduler.reschedule(1, active=True, now=0.5)
+    assert scheduler.due(now=1.5) == [1]
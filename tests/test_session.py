@@ -0,0 +1,164 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from auto_click_session import RECORD, RECORD_MAGIC, SessionRecorder, SessionReplaySource
+
+
+@pytest.fixture
+def recorded(tmp_path, background):
+    """录制 2 个窗口共 6 帧（含关键帧、差异帧和重复帧），返回 (路径, [(hwnd, 画面), ...])"""
+    path = str(tmp_path / "session.acs")
+    recorder = SessionRecorder(path, keyframe_interval=3)
+    frames = []
+    base = {1: background(160, 120), 2: background(80, 60)}
+    for i in range(3):
+        for hwnd in (1, 2):
+            frame = base[hwnd].copy()
+            if hwnd == 1:
+                frame[i * 10 : i * 10 + 5] = 255  # 窗口 2 的画面保持不变
+            recorder.record(hwnd, frame, (0, 0, frame.shape[1], frame.shape[0]), f"w{hwnd}")
+            frames.append((hwnd, frame))
+    recorder.close()
+    assert recorder.stats()["frames"] == 6
+    return path, frames
+
+
+def replay(path):
+    source = SessionReplaySource(path, loop=False)
+    try:
+        return [(hwnd, frame.copy()) for hwnd, frame in source.iter_frames()], source.titles
+    finally:
+        source.close()
+
+
+def assert_frames_equal(actual, expected):
+    assert [hwnd for hwnd, _ in actual] == [hwnd for hwnd, _ in expected]
+    for (_, a), (_, b) in zip(actual, expected):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_round_trip(recorded):
+    path, frames = recorded
+    replayed, titles = replay(path)
+    assert_frames_equal(replayed, frames)
+    assert titles == {1: "w1", 2: "w2"}
+
+
+@pytest.mark.parametrize("cut", [40, 1])
+def test_truncated_footer_recovers_only_frame_records(recorded, cut):
+    path, frames = recorded
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - cut)  # 元数据和索引已写入，文件尾不完整
+
+    replayed, titles = replay(path)
+    assert_frames_equal(replayed, frames)
+    assert titles == {}
+
+
+def test_truncated_record_is_dropped(recorded):
+    path, frames = recorded
+    source = SessionReplaySource(path, loop=False)
+    last_offset = int(source.index["offset"][-1])
+    source.close()
+    with open(path, "r+b") as f:
+        f.truncate(last_offset + RECORD.size - 1)  # 最后一条记录头只写入了一部分
+
+    replayed, _ = replay(path)
+    assert_frames_equal(replayed, frames[:-1])
+
+
+def test_scan_stops_at_bytes_that_are_not_records(recorded):
+    path, frames = recorded
+    source = SessionReplaySource(path, loop=False)
+    end = int(source.index["offset"][-1]) + RECORD.size + int(source.index["length"][-1])
+    source.close()
+    with open(path, "r+b") as f:
+        f.truncate(end)
+        f.seek(end)
+        # 形似记录但缺少记录标记的数据，以及类型未知的记录
+        f.write(RECORD.pack(b"XXXX", 1, 0.0, 0, 0, 4, 4, 4, 4, 1, 0, 16) + bytes(16))
+    replayed, _ = replay(path)
+    assert_frames_equal(replayed, frames)
+
+    with open(path, "r+b") as f:
+        f.truncate(end)
+        f.seek(end)
+        f.write(RECORD.pack(RECORD_MAGIC, 1, 0.0, 0, 0, 4, 4, 4, 4, 1, 9, 16) + bytes(16))
+    replayed, _ = replay(path)
+    assert_frames_equal(replayed, frames)
+
+
+class CountingFrame:
+    """记录被复制次数的画面"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.copies = 0
+
+    def __array__(self, dtype=None, copy=None):
+        self.copies += 1
+        return np.array(self.frame, dtype=dtype, copy=True)
+
+
+def test_full_queue_drops_without_copying(tmp_path, background):
+    blocked = threading.Event()
+    release = threading.Event()
+
+    def log(message, level="info"):
+        # 写入线程在记录失败后停在这里，队列不再被取走
+        blocked.set()
+        release.wait(5)
+
+    recorder = SessionRecorder(str(tmp_path / "session.acs"), max_pending=1, log=log)
+    frame = background(80, 60)
+    recorder.record(1, frame, (0, 0))  # 矩形不完整，记录头无法写入
+    assert blocked.wait(5)
+    recorder.record(1, frame, (0, 0, 80, 60))  # 占满队列
+    counting = CountingFrame(frame)
+    for _ in range(3):
+        recorder.record(1, counting, (0, 0, 80, 60))
+    release.set()
+    recorder.close()
+    assert counting.copies == 0
+    assert recorder.stats()["dropped"] == 3
+    assert recorder.stats()["frames"] == 1
+
+
+def test_record_after_close_is_dropped(tmp_path, background):
+    path = str(tmp_path / "session.acs")
+    recorder = SessionRecorder(path)
+    frame = background(80, 60)
+    recorder.record(1, frame, (0, 0, 80, 60))
+    recorder.close()
+    counting = CountingFrame(frame)
+    recorder.record(1, counting, (0, 0, 80, 60))
+    recorder.close()  # 重复关闭不再写入
+    assert counting.copies == 0
+    assert recorder.stats()["dropped"] == 1
+    source = SessionReplaySource(path)
+    assert len(source) == 1
+    source.close()
+
+
+def test_counters_are_consistent_across_threads(tmp_path, background):
+    recorder = SessionRecorder(str(tmp_path / "session.acs"), max_pending=2)
+    frame = background(160, 120)
+
+    def produce(hwnd):
+        for _ in range(50):
+            recorder.record(hwnd, frame, (0, 0, 160, 120))
+
+    threads = [threading.Thread(target=produce, args=(hwnd,)) for hwnd in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.close()
+    stats = recorder.stats()
+    assert stats["frames"] + stats["dropped"] == 200
+    source = SessionReplaySource(str(tmp_path / "session.acs"))
+    assert len(source) == stats["frames"]
+    source.close()
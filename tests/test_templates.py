@@ -0,0 +1,156 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import auto_click_templates
+from auto_click_templates import TemplateStore, read_template_pack, write_template_pack
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """记录每次从磁盘解码的路径"""
+    paths = []
+    decode = auto_click_templates.decode_template
+
+    def counting(path):
+        paths.append(path)
+        return decode(path)
+
+    monkeypatch.setattr(auto_click_templates, "decode_template", counting)
+    return paths
+
+
+def test_store_hits_until_file_changes(make_template, decodes):
+    path, image = make_template()
+    store = TemplateStore()
+    first = store.get(path)
+    np.testing.assert_array_equal(first.image, image)
+    assert store.get(path) is first
+    assert store.get(path) is first
+    assert decodes == [path]
+    assert (store.hits, store.misses) == (2, 1)
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    second = store.get(path)
+    assert second is not first
+    assert decodes == [path, path]
+
+    # 尺寸变化而 mtime 不变
+    st = os.stat(path)
+    cv2.imwrite(path, np.concatenate([image, image]))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    third = store.get(path)
+    assert third.height == 2 * image.shape[0]
+    assert len(decodes) == 3
+    assert store.get(path) is third
+    assert store.stats() == {"entries": 1, "hits": 3, "misses": 3, "pack_loaded": 0}
+
+
+def test_store_drops_deleted_templates(make_template):
+    a, _ = make_template("a.png")
+    b, _ = make_template("b.png")
+    store = TemplateStore()
+    store.sync([{"path": a}, {"path": b}])
+    assert store.stats()["entries"] == 2
+
+    os.remove(a)
+    assert store.get(a) is None
+    assert store.stats()["entries"] == 1
+
+    store.pack_dirty = False
+    store.sync([])
+    assert store.stats()["entries"] == 0
+    assert store.pack_dirty
+
+
+def test_store_decodes_outside_lock(make_template, monkeypatch):
+    path, _ = make_template()
+    store = TemplateStore()
+    decode = auto_click_templates.decode_template
+    locked = []
+
+    def checking(path):
+        locked.append(store._lock.locked())
+        return decode(path)
+
+    monkeypatch.setattr(auto_click_templates, "decode_template", checking)
+    assert store.get(path) is not None
+    assert locked == [False]
+
+
+def test_pack_round_trip(make_template, tmp_path):
+    paths = [make_template("a.png")[0], make_template("b.png", 30, 30)[0]]
+    store = TemplateStore()
+    entries = [store.get(path) for path in paths]
+    pack = str(tmp_path / "templates.pack")
+    write_template_pack(pack, entries, pyramid_scale=0.5, pyramid_levels=2)
+
+    header, planes = read_template_pack(pack)
+    assert (header["pyramid_scale"], header["pyramid_levels"]) == (0.5, 2)
+    assert [t["path"] for t in header["templates"]] == paths
+    for entry, template, arrays in zip(entries, header["templates"], planes):
+        assert set(arrays) == {"image", "gray", "image_1", "image_2", "gray_1", "gray_2"}
+        np.testing.assert_array_equal(arrays["image"], entry.image)
+        np.testing.assert_array_equal(arrays["gray"], entry.gray)
+        np.testing.assert_array_equal(arrays["image_2"], entry.pyramid(0.5, 2)[2])
+        np.testing.assert_array_equal(arrays["gray_1"], entry.pyramid(0.5, 2, gray=True)[1])
+        assert (template["mtime"], template["file_size"]) == (entry.mtime, entry.file_size)
+        assert template["norm"] == entry.norm
+
+    loaded = TemplateStore()
+    assert loaded.load_pack(pack, 0.5, 2) == 2
+    assert not loaded.pack_dirty
+    for entry in entries:
+        cached = loaded.get(entry.path)
+        np.testing.assert_array_equal(cached.image, entry.image)
+        np.testing.assert_array_equal(cached.pyramid(0.5, 2)[1], entry.pyramid(0.5, 2)[1])
+        assert cached.norm == entry.norm
+    assert loaded.stats()["misses"] == 0
+
+
+def test_load_pack_skips_changed_sources(make_template, tmp_path):
+    a, b, c = (make_template(name)[0] for name in ("a.png", "b.png", "c.png"))
+    store = TemplateStore()
+    store.sync([{"path": path} for path in (a, b, c)])
+    pack = str(tmp_path / "templates.pack")
+    store.save_pack(pack)
+
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))  # 仅 mtime 变化
+    image = cv2.imread(b)
+    cv2.imwrite(b, np.concatenate([image, image]))  # 尺寸变化
+    os.remove(c)
+
+    loaded = TemplateStore()
+    assert loaded.load_pack(pack) == 0
+    assert loaded.pack_dirty
+    assert loaded.get(a) is not None and loaded.get(b).height == 2 * image.shape[0]
+    assert loaded.get(c) is None
+    assert loaded.stats()["misses"] == 2
+
+
+def test_load_pack_with_other_pyramid_levels_marks_dirty(make_template, tmp_path):
+    path, _ = make_template(width=64, height=48)
+    store = TemplateStore()
+    entry = store.get(path)
+    pack = str(tmp_path / "templates.pack")
+    store.save_pack(pack, pyramid_scale=0.5, pyramid_levels=1)
+
+    loaded = TemplateStore()
+    assert loaded.load_pack(pack, pyramid_scale=0.5, pyramid_levels=2) == 1
+    assert loaded.pack_dirty
+    cached = loaded.get(path)
+    pyramid = cached.pyramid(0.5, 2)
+    assert len(pyramid) == 3
+    np.testing.assert_array_equal(pyramid[2], entry.pyramid(0.5, 2)[2])
+
+    loaded.save_pack(pack, pyramid_scale=0.5, pyramid_levels=2)
+    assert not loaded.pack_dirty
+    header, _ = read_template_pack(pack)
+    assert header["pyramid_levels"] == 2
+    rebuilt = TemplateStore()
+    assert rebuilt.load_pack(pack, 0.5, 2) == 1
+    assert not rebuilt.pack_dirty
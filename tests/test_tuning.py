@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pytest
+
+from auto_click_config import ConfigWriter
+from auto_click_tuning import apply_thresholds, precision_recall, recommend_threshold
+
+
+@pytest.mark.parametrize(
+    "positive, negative, thresholds, precision, recall, false_positive",
+    [
+        (
+            [0.9, 0.8, 0.6],
+            [0.7, 0.5],
+            [0.55, 0.65, 0.75, 0.95],
+            [0.75, 2 / 3, 1.0, 1.0],  # 没有检出时精确率记为 1
+            [1.0, 2 / 3, 2 / 3, 0.0],
+            [1, 1, 0, 0],
+        ),
+        ([], [0.7], [0.5, 0.8], [0.0, 1.0], [1.0, 1.0], [1, 0]),
+        ([0.9], [], [0.9, 0.91], [1.0, 1.0], [1.0, 0.0], [0, 0]),
+    ],
+)
+def test_precision_recall(positive, negative, thresholds, precision, recall, false_positive):
+    result = precision_recall(
+        np.array(positive, dtype=np.float32), np.array(negative, dtype=np.float32), thresholds
+    )
+    assert result[0] == pytest.approx(precision)
+    assert result[1] == pytest.approx(recall)
+    assert list(result[2]) == false_positive
+
+
+@pytest.mark.parametrize(
+    "positive, negative, min_precision, expected",
+    [
+        # 分数间隔的中点
+        ([0.9, 0.95], [0.6, 0.7], 1.0, 0.8),
+        # 0.7 有误检：接受 0.9，取与其下方最高分 0.8 的中点
+        ([0.7, 0.9], [0.8], 1.0, 0.85),
+        # 允许误检时接受 0.7；下方没有分数，以 floor 0.5 为下界
+        ([0.7, 0.9], [0.8], 0.6, 0.6),
+        # 任何阈值都有误检：取最高的正例分数
+        ([0.8], [0.9], 1.0, 0.65),
+        # 不超过 ceiling
+        ([1.0], [0.99], 1.0, 0.99),
+        # 不低于 floor
+        ([0.52], [0.3], 1.0, 0.51),
+        ([], [0.5], 1.0, None),
+    ],
+)
+def test_recommend_threshold(positive, negative, min_precision, expected):
+    value = recommend_threshold(
+        np.array(positive, dtype=np.float32), np.array(negative, dtype=np.float32), min_precision
+    )
+    assert value == (pytest.approx(expected, abs=1e-3) if expected is not None else None)
+
+
+def test_apply_thresholds_is_picked_up_instead_of_overwritten(tmp_path):
+    path = str(tmp_path / "config.json")
+    config = {
+        "version": 2,
+        "match_threshold": 0.8,
+        "templates": [
+            {"name": "ok", "path": "ok.png"},
+            {"name": "cancel", "path": "cancel.png", "threshold": 0.7},
+            {"name": "other", "path": "other.png", "threshold": 0.75},
+        ],
+    }
+    text = json.dumps(config, ensure_ascii=False, indent=2)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    writer = ConfigWriter(path, delay=60)  # 模拟运行中的界面
+    writer.mark_saved(text)
+
+    assert apply_thresholds(path, {"ok": 0.91, "cancel.png": 0.88, "other": None}) == 2
+    with open(path, encoding="utf-8") as f:
+        applied = json.load(f)
+    assert [t.get("threshold") for t in applied["templates"]] == [0.91, 0.88, 0.75]
+
+    # 界面保存旧的模板列表时不覆盖外部修改
+    config["match_threshold"] = 0.85
+    writer.save(config)
+    writer.flush()
+    assert writer.stats()["conflicts"] == 1
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["templates"][0]["threshold"] == 0.91
+
+    # 读取外部修改后再保存即可写入
+    assert json.loads(writer.changed_on_disk())["templates"][0]["threshold"] == 0.91
+    assert writer.changed_on_disk() is None
+    applied["match_threshold"] = 0.85
+    writer.save(applied)
+    writer.close()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == applied
@@ -0,0 +1,69 @@
+from auto_click_windows import WindowWatcher, diff_windows
+
+
+class FakeEnumerator:
+    """按顺序返回预设的窗口列表"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+
+    def __call__(self):
+        return self.snapshots.pop(0)
+
+
+def test_watcher_reports_only_list_changes():
+    enumerate_windows = FakeEnumerator(
+        [(1, "a"), (2, "b"), (3, "c")],
+        [(1, "a"), (3, "c"), (4, "d"), (5, "e")],  # 移除 2，新增 4、5
+        [(1, "a*"), (3, "c"), (4, "d"), (5, "e")],  # 1 标题变化
+        [(5, "e"), (4, "d"), (3, "c"), (1, "a*")],  # 仅顺序变化
+    )
+    watcher = WindowWatcher(enumerate_windows)
+
+    first = watcher.scan()
+    assert first.added == [(1, "a"), (2, "b"), (3, "c")]
+    assert (first.removed, first.renamed, first.total) == ([], [], 3)
+
+    second = watcher.scan()
+    assert second.added == [(4, "d"), (5, "e")]
+    assert second.removed == [2]
+    assert second.renamed == []
+
+    third = watcher.scan()
+    assert (third.added, third.removed, third.renamed) == ([], [], [(1, "a*")])
+
+    fourth = watcher.scan()
+    assert not fourth
+    assert fourth.total == 4
+    assert watcher.snapshot == {1: "a*", 3: "c", 4: "d", 5: "e"}
+
+    # 无变化的扫描不进入队列
+    assert [bool(diff) for diff in watcher.poll()] == [True, True, True]
+
+
+def test_manual_refresh_is_queued_without_changes():
+    watcher = WindowWatcher(FakeEnumerator([(1, "a")], [(1, "a")]))
+    watcher.scan()
+    diff = watcher.scan(manual=True)
+    assert not diff and diff.manual
+    assert [d.manual for d in watcher.poll()] == [False, True]
+
+
+def test_background_thread_applies_refresh():
+    watcher = WindowWatcher(FakeEnumerator([(1, "a")], [(1, "a"), (2, "b")]))
+    watcher.start()
+    try:
+        watcher.refresh()
+        first = watcher.updates.get(timeout=2)
+        watcher.refresh()
+        second = watcher.updates.get(timeout=2)
+    finally:
+        watcher.close()
+    assert first.added == [(1, "a")] and first.manual
+    assert second.added == [(2, "b")]
+
+
+def test_diff_windows_keeps_enumeration_order_for_added():
+    diff, snapshot = diff_windows({2: "b"}, [(3, "c"), (2, "b"), (1, "a")])
+    assert diff.added == [(3, "c"), (1, "a")]
+    assert snapshot == {3: "c", 2: "b", 1: "a"}